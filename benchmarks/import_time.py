@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark how long it takes to start using the package.
+
+Each scenario runs in a fresh interpreter, as a program would, and is repeated to
+report the best and median wall time together with the heavy dependencies it loaded:
+
+    import        import wmg_feedback_gen
+    filename      import, then gen_filename() for one row (loads Jinja2)
+    validate      import, then validate_row_data() for one row
+    csv           import, then read every row of a small CSV file (no openpyxl)
+    generate      import generate, which loads everything needed to render
+    cli           wmg-feedback --version
+
+With --max-import MS the script exits with status 1 if the best import time is slower
+than MS milliseconds, or if the import scenario loaded any heavy dependency, so it can
+guard against eager imports creeping back in.
+
+Usage:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --repeat 20 --max-import 100
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+HEAVY = ["openpyxl", "docxtpl", "docx", "jinja2", "lxml", "numpy"]
+
+SCENARIOS = {
+    "import": "import wmg_feedback_gen",
+    "filename": "import wmg_feedback_gen as w; w.gen_filename('{{STUDENTID}}.docx', {'STUDENTID': 1234567})",
+    "validate": "import wmg_feedback_gen as w; w.validate_row_data({'STUDENTID': 1234567})",
+    "csv": "import wmg_feedback_gen as w; list(w.process_to_dicts(w.CsvSource(CSV_FILE), ['STUDENTID']))",
+    "generate": "from wmg_feedback_gen import generate",
+    "cli": "from wmg_feedback_gen.cli import main; main(['--version'])",
+}
+
+# run in the child interpreter, timing the scenario and listing the heavy modules it loaded
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+try:
+{code}
+except SystemExit:
+    pass
+seconds = time.perf_counter() - start
+print(json.dumps([seconds, sorted(m for m in {heavy!r} if m in sys.modules)]))
+"""
+
+
+def run_scenario(code, repeat):
+    """Return (best seconds, median seconds, heavy modules loaded) for code in fresh interpreters."""
+    probe = PROBE.format(code="    " + code, heavy=HEAVY)
+    env = dict(os.environ, PYTHONPATH=SRC + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    times = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", probe], env=env, check=True,
+                             capture_output=True, text=True).stdout
+        seconds, loaded = json.loads(out.splitlines()[-1])
+        times.append(seconds)
+    return min(times), statistics.median(times), loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=10,
+                        help="fresh interpreters to run each scenario in")
+    parser.add_argument("--max-import", type=float, metavar="MS",
+                        help="fail if importing the package takes longer or loads a heavy dependency")
+    args = parser.parse_args(argv)
+
+    print(f"{'scenario':<10} {'best ms':>9} {'median ms':>10}  heavy modules loaded")
+    failed = False
+    with tempfile.TemporaryDirectory() as tmpdir:
+        csv_file = os.path.join(tmpdir, "marks.csv")
+        with open(csv_file, "w") as f:
+            f.write("STUDENTID\n1234567\n1234568\n")
+
+        for name, code in SCENARIOS.items():
+            best, median, loaded = run_scenario(code.replace("CSV_FILE", repr(csv_file)), args.repeat)
+            print(f"{name:<10} {best * 1000:>9.1f} {median * 1000:>10.1f}  {', '.join(loaded) or '-'}", flush=True)
+            if name == "import" and args.max_import is not None:
+                failed = best * 1000 > args.max_import or bool(loaded)
+
+    if failed:
+        print(f"Importing the package is slower than {args.max_import} ms or loads heavy dependencies.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
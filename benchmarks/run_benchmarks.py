@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Benchmark the feedback generation pipeline on synthetic cohorts.
+
+Each stage is timed on its own and then run again under tracemalloc to record its
+peak Python memory use:
+
+    load          opening the marks worksheet (read-only)
+    find_columns  locating the header columns
+    process       process_to_dicts, reading and validating every row
+    process_csv   process_to_dicts on the same rows exported as CSV
+    render        rendering and saving documents, without post-processing
+    highlight     default_hightlight on rendered documents
+    generate      end-to-end generate() into a temporary directory
+
+The worksheet stages include opening the workbook, compare them against load.
+Rendering is per document and much slower than reading rows, so the render stages
+use at most --render-rows rows and generate() only runs for cohorts up to
+--generate-max rows.
+
+Usage:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --sizes 100 1000 --columns 10 --json results.json
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import openpyxl
+
+import wmg_feedback_gen.core as core
+from wmg_feedback_gen.compiled_template import CompiledTemplate
+from wmg_feedback_gen.document_generator import default_hightlight, generate
+from wmg_feedback_gen.sources import CsvSource
+from synthetic import build_csv, build_template, build_workbook
+
+
+def measure(func, memory=True):
+    """Return (seconds, peak bytes or None) for calling func."""
+    gc.collect()
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return seconds, peak
+
+
+def expected_columns(template_filename, jinja_env):
+    return CompiledTemplate(template_filename).get_undeclared_template_variables(jinja_env=jinja_env) \
+        | set(core.default_validators)
+
+
+def bench_cohort(tmpdir, rows, columns, args):
+    """Run every stage for one cohort size, returning a list of result dicts."""
+    jinja_env = core.default_jinja_env()
+    xlsx = build_workbook(os.path.join(tmpdir, f"marks_{rows}_{columns}.xlsx"), rows,
+                          outcomes=args.outcomes, extra_columns=columns)
+    csv_file = build_csv(os.path.join(tmpdir, f"marks_{rows}_{columns}.csv"), rows,
+                         outcomes=args.outcomes, extra_columns=columns)
+    template = build_template(os.path.join(tmpdir, "template.docx"), outcomes=args.outcomes)
+    expected = expected_columns(template, jinja_env)
+
+    def with_sheet(func):
+        def run():
+            workbook = openpyxl.load_workbook(xlsx, data_only=True, read_only=True)
+            try:
+                return func(workbook["marks"])
+            finally:
+                workbook.close()
+        return run
+
+    data = with_sheet(lambda sheet: list(core.process_to_dicts(sheet, expected)))()
+    sample = data[:args.render_rows]
+
+    tpl = CompiledTemplate(template)
+
+    def render():
+        for row_data in sample:
+            tpl.render(row_data, jinja_env=jinja_env)
+            tpl.save(BytesIO())
+
+    def highlight():
+        for row_data in sample:
+            tpl.render(row_data, jinja_env=jinja_env)
+            default_hightlight(row_data, tpl.docx)
+
+    def end_to_end():
+        with tempfile.TemporaryDirectory() as outdir:
+            generate(xlsx, template, output_filename=os.path.join(outdir, "feedback_{{STUDENTID}}.docx"),
+                     jobs=args.jobs)
+
+    stages = [
+        ("load", with_sheet(lambda sheet: None), rows),
+        ("find_columns", with_sheet(lambda sheet: core.find_columns(sheet, expected)), rows),
+        ("process", with_sheet(lambda sheet: sum(1 for _ in core.process_to_dicts(sheet, expected))), rows),
+        ("process_csv", lambda: sum(1 for _ in core.process_to_dicts(CsvSource(csv_file), expected)), rows),
+        ("render", render, len(sample)),
+        ("highlight", highlight, len(sample)),
+    ]
+    if rows <= args.generate_max:
+        stages.append(("generate", end_to_end, rows))
+
+    results = []
+    for name, func, count in stages:
+        seconds, peak = measure(func, memory=not args.no_memory)
+        results.append({
+            "rows": rows,
+            "columns": columns,
+            "stage": name,
+            "count": count,
+            "seconds": seconds,
+            "rows_per_sec": count / seconds if seconds else float("inf"),
+            "peak_mb": peak / 2**20 if peak is not None else None,
+        })
+        print_result(results[-1])
+    return results
+
+
+def print_result(result):
+    peak = f"{result['peak_mb']:10.1f}" if result["peak_mb"] is not None else f"{'-':>10}"
+    print(f"{result['rows']:>7} {result['columns']:>7} {result['stage']:<13}"
+          f"{result['count']:>7} {result['seconds']:>10.3f} {result['rows_per_sec']:>12.1f} {peak}",
+          flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000],
+                        help="cohort sizes (rows) to benchmark")
+    parser.add_argument("--columns", type=int, nargs="+", default=[10, 100],
+                        help="numbers of extra, unused columns in the worksheet")
+    parser.add_argument("--outcomes", type=int, default=4,
+                        help="learning outcome rows in the grading table")
+    parser.add_argument("--render-rows", type=int, default=100,
+                        help="maximum rows used for the render and highlight stages")
+    parser.add_argument("--generate-max", type=int, default=1000,
+                        help="largest cohort to run end-to-end generate() on")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="worker processes for generate(), 0 to use all cores")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip the tracemalloc runs used to measure peak memory")
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    # the title and header rows of each sheet are rejected by the validators
+    logging.getLogger().setLevel(logging.ERROR)
+    if args.jobs == 0:
+        args.jobs = None
+
+    print(f"{'rows':>7} {'columns':>7} {'stage':<13}{'count':>7} {'seconds':>10} {'rows/sec':>12} {'peak MB':>10}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for rows in args.sizes:
+            for columns in args.columns:
+                results.extend(bench_cohort(tmpdir, rows, columns, args))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Synthetic mark sheets and feedback templates for benchmarking.
+
+The workbooks mimic an exam board export: a participants sheet, a marks sheet with a
+title row above the header, a STUDENTID column, learning outcome marks, free text
+feedback and any number of extra unrelated columns. The templates mimic the WMG
+feedback form with the 8 or 9 cell grading table default_hightlight expects.
+"""
+
+import csv
+import random
+
+import openpyxl
+from docx import Document
+
+CATEGORIES = ["Outstanding", "Distinction", "Good Pass", "Pass", "Marginal Fail", "Fail"]
+
+FEEDBACK = (
+    "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua. Ut enim ad minim veniam, quis nostrud "
+    "exercitation ullamco laboris nisi ut aliquip ex ea commodo consequat."
+)
+
+
+def learning_outcomes(count):
+    """Names of the learning outcome mark columns, LO1, LO2, ..."""
+    return [f"LO{i + 1}" for i in range(count)]
+
+
+def _marks(rows, outcomes, extra_columns, seed):
+    # the header and (participant, marks row) pairs shared by workbooks and CSV files
+    rng = random.Random(seed)
+    los = learning_outcomes(outcomes)
+    extras = [f"extra {i}" for i in range(extra_columns)]
+    header = ["NAME", "STUDENTID", "FEEDBACK"] + los + ["total"] + extras
+
+    def generate():
+        for i in range(rows):
+            student = 1000000 + i
+            name = f"Student {i}"
+            marks = [rng.randint(0, 100) for _ in los]
+            total = round(sum(marks) / len(marks)) if marks else 0
+            yield [name, student], [name, student, FEEDBACK] + marks + [total] \
+                + [rng.random() for _ in extras]
+
+    return header, generate()
+
+
+def build_workbook(path, rows, outcomes=4, extra_columns=10, worksheet="marks", seed=0):
+    """
+    Write a synthetic marks workbook.
+
+    Args:
+        path: Where to save the workbook.
+        rows: Number of student rows.
+        outcomes: Number of learning outcome mark columns.
+        extra_columns: Number of additional columns not used by the template.
+        worksheet: Name of the marks worksheet.
+        seed: Random seed, so the same arguments give the same workbook.
+    """
+    header, data = _marks(rows, outcomes, extra_columns, seed)
+
+    wb = openpyxl.Workbook(write_only=True)
+    participants = wb.create_sheet("participants")
+    ws = wb.create_sheet(worksheet)
+
+    ws.append(["Synthetic module marks"])
+    ws.append(header)
+
+    for participant, row in data:
+        participants.append(participant)
+        ws.append(row)
+
+    wb.save(path)
+    return path
+
+
+def build_csv(path, rows, outcomes=4, extra_columns=10, seed=0):
+    """Write the marks sheet build_workbook would, with the same arguments, as a CSV file."""
+    header, data = _marks(rows, outcomes, extra_columns, seed)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Synthetic module marks"])
+        writer.writerow(header)
+        for participant, row in data:
+            writer.writerow(row)
+    return path
+
+
+def build_template(path, outcomes=4, ksb=True):
+    """
+    Write a synthetic WMG style feedback template.
+
+    Args:
+        path: Where to save the template.
+        outcomes: Number of learning outcome rows in the grading table.
+        ksb: Include the KSB column, giving 9 cells per row rather than 8.
+    """
+    doc = Document()
+    doc.sections[0].header.paragraphs[0].text = "Feedback for {{STUDENTID}}"
+    doc.add_heading("Assessment feedback", level=1)
+    doc.add_paragraph("Student: {{NAME}} ({{STUDENTID}})")
+    doc.add_paragraph("Overall mark: {{total}} ({{total | mark_category}})")
+
+    prefix = ["KSB"] if ksb else []
+    header = prefix + ["Learning Outcome", "Comments"] + CATEGORIES
+    table = doc.add_table(rows=1 + outcomes, cols=len(header))
+    table.style = "Table Grid"
+    for cell, text in zip(table.rows[0].cells, header):
+        cell.text = text
+
+    offset = len(prefix)
+    for row, lo in zip(table.rows[1:], learning_outcomes(outcomes)):
+        if ksb:
+            row.cells[0].text = "K1, S2"
+        row.cells[offset].text = lo
+        row.cells[offset + 1].text = f"Comments\nMark: {{{{{lo}}}}}\n{{{{{lo} | mark_category}}}}"
+        for cell, category in zip(row.cells[offset + 2:], CATEGORIES):
+            cell.text = f"{category} descriptor for {lo}."
+
+    doc.add_heading("What went well, what could be improved and how", level=2)
+    doc.add_paragraph("{{FEEDBACK}}")
+
+    doc.save(path)
+    return path
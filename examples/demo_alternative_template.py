@@ -14,37 +14,40 @@ from docx import Document
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 import wmg_feedback_gen
-from wmg_feedback_gen.document_generator import highlight_cell
-
-def custom_highlight(row_data, filename):
+from wmg_feedback_gen.document_generator import for_template, in_memory
+from wmg_feedback_gen.grade_scale import GradeScale
+from wmg_feedback_gen.grading import GradingIndex
+
+# The learning outcome mark of each grading column
+LEARNING_OUTCOMES = ['LO2', 'LO3', 'LO4', 'LO5']
+
+# The grade bands of the alternative template and the lowest mark of each, the
+# bands are highlighted in this order from the top of the table
+SCALE = GradeScale([
+    (80, "OUTSTANDING"),
+    (70, "EXCELLENT"),
+    (60, "VERY GOOD"),
+    (50, "GOOD"),
+    (40, "ACCEPTABLE"),
+    (30, "FAIL (30-39)"),
+    (None, "FAIL"),
+])
+
+def index_template(template_file):
     """This alternative template is organised column-wise as opposed to the 
         standard row-wise WMG template and the grade bounds are different.
-        This function transposes the table and then highlights the required cells.
+        The grading columns are located once in the template, one column per
+        learning outcome with a row per grade band.
     """
+    return GradingIndex.from_columns(Document(template_file),
+                                     marks=LEARNING_OUTCOMES,
+                                     categories=SCALE).highlighter()
 
-    docx = Document(filename)
-    for table in docx.tables:
-        # Transpose the table: rows become columns and columns become rows
-        transposed_cells = list(zip(*[row.cells for row in table.rows]))
-        for col in transposed_cells:
-            if len(col) != 9:  # not the correct table
-                continue
-
-    def row_index(mark):
-        if mark >= 80: return 1
-        elif mark >= 70: return 2
-        elif mark >= 60: return 3
-        elif mark >= 50: return 4
-        elif mark >= 40: return 5
-        elif mark >= 30: return 6
-        else: return 7
-
-    highlight_cell(transposed_cells[1][row_index(row_data['LO2'])])
-    highlight_cell(transposed_cells[2][row_index(row_data['LO3'])])
-    highlight_cell(transposed_cells[3][row_index(row_data['LO4'])])
-    highlight_cell(transposed_cells[4][row_index(row_data['LO5'])])
-
-    docx.save(filename)
+@for_template(index_template)
+@in_memory
+def custom_highlight(row_data, document):
+    """Highlight the band of each learning outcome mark, generate() uses index_template instead."""
+    GradingIndex.from_columns(document, LEARNING_OUTCOMES, SCALE).highlight(row_data, document)
 
 
 if __name__ == "__main__":
@@ -71,7 +74,7 @@ if __name__ == "__main__":
     # template file, validators and output filename. But if you are using 
     # a custom post-processing function you may need to adapt them as is the case
     # here.
-    expected_vars = ['LO2', 'LO3', 'LO4', 'LO5']
+    expected_vars = LEARNING_OUTCOMES
 
     wmg_feedback_gen.generate(
         xlsx_filename=xlsx_filename,
@@ -79,6 +82,7 @@ if __name__ == "__main__":
         worksheet=worksheet,
         output_filename=output_filename,
         validators=validators,
+        jinga_env=wmg_feedback_gen.default_jinja_env(SCALE),
         post_processing=custom_highlight,
         expected_vars=expected_vars
     )
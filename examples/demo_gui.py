@@ -1,7 +1,10 @@
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
 import os
+import queue
 import sys
+import threading
+import time
 import openpyxl
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
@@ -12,7 +15,7 @@ class FileSelectorApp(tk.Tk):
     def __init__(self):
         super().__init__()
         self.title("File Selector Demo")
-        self.geometry("500x400")
+        self.geometry("500x480")
         self.resizable(False, False)
         self.xlsx_path = tk.StringVar()
         self.docx_path = tk.StringVar()
@@ -20,7 +23,12 @@ class FileSelectorApp(tk.Tk):
         self.output_filename = tk.StringVar()
         self.sheet_names = []
         self.selected_sheet = tk.StringVar()
+        self.status = tk.StringVar()
+        self.events = queue.Queue() # progress from the worker thread, read by poll()
+        self.cancel_event = None
+        self.running = False
         self.create_widgets()
+        self.protocol("WM_DELETE_WINDOW", self.close)
 
     def create_widgets(self):
         # XLSX file selection
@@ -54,8 +62,18 @@ class FileSelectorApp(tk.Tk):
         self.output_filename.set("feedback_{{STUDENTID}}.docx")
         tk.Entry(self, textvariable=self.output_filename).pack(fill="x", padx=10)
 
-        # Generate button
-        tk.Button(self, text="Generate", command=self.generate).pack(pady=20)
+        # Generate and Cancel buttons
+        buttons = tk.Frame(self)
+        buttons.pack(pady=(20, 5))
+        self.generate_button = tk.Button(buttons, text="Generate", command=self.generate)
+        self.generate_button.pack(side="left", padx=5)
+        self.cancel_button = tk.Button(buttons, text="Cancel", command=self.cancel, state="disabled")
+        self.cancel_button.pack(side="left", padx=5)
+
+        # Progress
+        self.progress = ttk.Progressbar(self, mode="determinate")
+        self.progress.pack(fill="x", padx=10)
+        tk.Label(self, textvariable=self.status).pack(anchor="w", padx=10)
 
     def browse_xlsx(self):
         path = filedialog.askopenfilename(filetypes=[("Excel files", "*.xlsx")])
@@ -65,14 +83,17 @@ class FileSelectorApp(tk.Tk):
 
     def load_worksheet_names(self, path):
         try:
-            wb = openpyxl.load_workbook(path, read_only=True)
-            self.sheet_names = wb.sheetnames
+            # only the names are kept, each Generate reads the workbook as last saved
+            workbook = openpyxl.load_workbook(path, data_only=True, read_only=True)
+            try:
+                self.sheet_names = workbook.sheetnames
+            finally:
+                workbook.close()
             self.sheet_dropdown['values'] = self.sheet_names
             if self.sheet_names:
                 self.selected_sheet.set(self.sheet_names[0])
             else:
                 self.selected_sheet.set('')
-            wb.close()
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load worksheet names: {e}")
             self.sheet_dropdown['values'] = []
@@ -89,7 +110,6 @@ class FileSelectorApp(tk.Tk):
             self.output_dir.set(path)
 
     def generate(self):
-        # Placeholder for actual generation logic
         if not self.xlsx_path.get():
             messagebox.showwarning("Missing Input", "Please select an XLSX file.")
             return
@@ -106,16 +126,98 @@ class FileSelectorApp(tk.Tk):
             messagebox.showwarning("Missing Input", "Please enter an output filename.")
             return
         
+        self.running = True
+        self.cancel_event = threading.Event()
+        self.started = time.monotonic()
+        self.done = 0
+        self.generate_button.config(state="disabled")
+        self.cancel_button.config(state="normal")
+        self.progress.config(value=0, maximum=1)
+        self.status.set("Reading worksheet...")
+
+        worker = threading.Thread(target=self.run_generation, daemon=True,
+                                  args=(self.xlsx_path.get(),
+                                        self.selected_sheet.get(),
+                                        self.docx_path.get(),
+                                        os.path.join(self.output_dir.get(), self.output_filename.get()),
+                                        self.cancel_event))
+        worker.start()
+        self.after(100, self.poll)
+
+    def run_generation(self, xlsx_path, sheet, template, output_filename, cancel_event):
+        """Runs on the worker thread, Tk is only updated from poll() on the main thread."""
         try:
-            wmg_feedback_gen.generate(
-            xlsx_filename=self.xlsx_path.get(),
-            template_filename=self.docx_path.get(),
-            worksheet=self.selected_sheet.get(),
-            output_filename=os.path.join(self.output_dir.get(), self.output_filename.get())
+            # generate() opens the workbook and closes it when done, and with count_first
+            # reports the number of documents as a "total" event before the first one
+            stats = wmg_feedback_gen.generate(
+                xlsx_filename=xlsx_path,
+                worksheet=sheet,
+                template_filename=template,
+                output_filename=output_filename,
+                count_first=True,
+                progress=lambda event, stats, detail: self.events.put((event, detail)),
+                cancel=cancel_event
             )
-            messagebox.showinfo("Success", "Feedback files generated successfully.")
+            self.events.put(("done", stats))
         except Exception as e:
-            messagebox.showerror("Error", f"An error occurred during generation:\n{e}")
+            self.events.put(("error", e))
+
+    def poll(self):
+        while True:
+            try:
+                event, detail = self.events.get_nowait()
+            except queue.Empty:
+                break
+
+            if event == "total":
+                self.started = time.monotonic()
+                self.progress.config(maximum=max(detail, 1))
+                self.status.set(f"0 / {detail} documents")
+            elif event in ("document", "skipped"):
+                self.done += 1
+                self.progress.config(value=self.done)
+                self.status.set(self.describe_progress())
+            elif event == "done":
+                self.finished()
+                if detail.cancelled:
+                    messagebox.showinfo("Cancelled", f"Generation cancelled after {detail.documents_written} documents.")
+                else:
+                    messagebox.showinfo("Success", f"{detail.documents_written} feedback files generated successfully.")
+                return
+            elif event == "error":
+                self.finished()
+                messagebox.showerror("Error", f"An error occurred during generation:\n{detail}")
+                return
+
+        self.after(100, self.poll)
+
+    def describe_progress(self):
+        total = int(self.progress.cget("maximum"))
+        text = f"{self.done} / {total} documents"
+        if self.cancel_event.is_set():
+            return text + ", cancelling after the current document..."
+        elapsed = time.monotonic() - self.started
+        if self.done and total > self.done:
+            remaining = int(elapsed / self.done * (total - self.done))
+            text += f", about {remaining // 60}:{remaining % 60:02d} remaining"
+        return text
+
+    def cancel(self):
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+            self.cancel_button.config(state="disabled")
+            self.status.set("Cancelling after the current document...")
+
+    def finished(self):
+        self.running = False
+        self.generate_button.config(state="normal")
+        self.cancel_button.config(state="disabled")
+        self.status.set("")
+
+    def close(self):
+        if self.running:
+            self.cancel()
+        self.destroy()
 
 if __name__ == "__main__":
     app = FileSelectorApp()
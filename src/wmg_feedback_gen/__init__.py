@@ -1,21 +1,78 @@
 """WMG Feedback Generator
 
 A Python library for generating student feedback documents from Excel data and Word templates.
+
+The names below are imported from their submodules on first use, so importing the
+package stays fast and only the dependencies (openpyxl, docxtpl, python-docx, Jinja2)
+that a program actually uses are loaded.
 """
 
 __version__ = "0.1.0"
 __author__ = "Dr David Croft"
 __email__ = "david.croft@warwick.ac.uk"
 
-# Import main classes/functions for easy access
-from .core import (
-    find_columns,
-    process_to_dicts,
-    validate_row_data,
-    gen_filename,
-    default_validators
-)
-from .document_generator import generate
+import importlib
+
+# Main classes/functions for easy access, by the submodule defining them
+_EXPORTS = {
+    "find_columns": "core",
+    "process_to_dicts": "core",
+    "validate_row_data": "core",
+    "gen_filename": "core",
+    "default_validators": "core",
+    "category": "core",
+    "mark_category": "core",
+    "default_jinja_env": "core",
+    "generate": "document_generator",
+    "default_workers": "document_generator",
+    "in_memory": "document_generator",
+    "body_only": "document_generator",
+    "for_template": "document_generator",
+    "GradeHighlight": "document_generator",
+    "GradeScale": "grade_scale",
+    "WMG_SCALE": "grade_scale",
+    "GradingIndex": "grading",
+    "ShardMerge": "shards",
+    "merge_shards": "shards",
+    "shard_of": "shards",
+    "Watcher": "watch",
+    "BatchEntry": "batch",
+    "BatchReport": "batch",
+    "generate_batch": "batch",
+    "TemplateCache": "cache",
+    "RowSource": "sources",
+    "CsvSource": "sources",
+    "JsonLinesSource": "sources",
+    "open_source": "sources",
+    "CompiledTemplate": "compiled_template",
+    "RunStats": "stats",
+    "Sink": "sinks",
+    "FileSink": "sinks",
+    "ZipSink": "sinks",
+    "CallbackSink": "sinks",
+    "QueuedSink": "sinks",
+    "CombinedSink": "combined",
+    "Columns": "columnar",
+    "read_columns": "columnar",
+    "mark_categories": "columnar",
+}
+
+# preflight is also the name of its submodule, which would shadow the function once
+# imported, so it is imported eagerly. The module itself only imports light dependencies.
+from .preflight import PreflightReport, preflight
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = value # later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
+
 
 __all__ = [
     "find_columns",
@@ -24,5 +81,40 @@ __all__ = [
     "gen_filename",
     "default_validators",
     "generate",
-    "category"
+    "default_workers",
+    "in_memory",
+    "body_only",
+    "for_template",
+    "GradeHighlight",
+    "GradeScale",
+    "WMG_SCALE",
+    "GradingIndex",
+    "PreflightReport",
+    "preflight",
+    "ShardMerge",
+    "merge_shards",
+    "shard_of",
+    "Watcher",
+    "BatchEntry",
+    "BatchReport",
+    "generate_batch",
+    "TemplateCache",
+    "RowSource",
+    "CsvSource",
+    "JsonLinesSource",
+    "open_source",
+    "CompiledTemplate",
+    "RunStats",
+    "Sink",
+    "FileSink",
+    "ZipSink",
+    "CallbackSink",
+    "QueuedSink",
+    "CombinedSink",
+    "Columns",
+    "read_columns",
+    "mark_categories",
+    "category",
+    "mark_category",
+    "default_jinja_env"
 ]
@@ -0,0 +1,7 @@
+"""Allow running the command line interface as python -m wmg_feedback_gen."""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
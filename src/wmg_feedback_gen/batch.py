@@ -0,0 +1,203 @@
+"""Generate feedback for several worksheets, workbooks and templates in one run.
+
+Each module or assessment usually has its own worksheet or workbook, and calling
+generate() for each of them reloads the template, re-derives its variables and
+reopens the workbook every time. generate_batch() takes the list of entries at once:
+every template and workbook is loaded only once however many entries share it, and
+with jobs > 1 the rows of all entries are spread over a single process pool.
+"""
+
+import collections
+import logging
+from dataclasses import dataclass, field
+
+from docxtpl import DocxTemplate
+
+from . import core
+from .compiled_template import CompiledTemplate
+from .document_generator import default_hightlight, default_workers, generate_doc, prepare_post_processing
+from .rendering import (
+    VALIDATION_BATCH_SIZE,
+    expected_variables,
+    load_template,
+    render_parallel,
+    resolve_cache,
+    template_variables
+)
+from .sinks import FileSink, Sink
+from .sources import WorksheetSource, open_source
+from .stats import RunStats
+
+
+@dataclass
+class BatchEntry:
+    """
+    One worksheet to generate feedback for.
+
+    Attributes:
+        xlsx_filename: The workbook, or CSV or JSON-lines file, to read.
+        worksheet: The name of the worksheet within the workbook.
+        template_filename: The Word template for this worksheet.
+        output_filename: The filename pattern for the output documents.
+    """
+    xlsx_filename: str
+    worksheet: str
+    template_filename: str
+    output_filename: str = "feedback/feedback_{{STUDENTID}}.docx"
+
+
+@dataclass
+class BatchReport:
+    """
+    Statistics for a generate_batch() run.
+
+    Attributes:
+        total: The combined RunStats of every entry, including loading the templates.
+        entries: (BatchEntry, RunStats) for each entry, in the order given.
+    """
+    total: RunStats = field(default_factory=RunStats)
+    entries: list = field(default_factory=list)
+
+    def summary(self) -> str:
+        """A human readable summary of the run, with the documents written per entry."""
+        lines = [self.total.summary(), "Documents per entry:"]
+        for entry, stats in self.entries:
+            lines.append(f"  {entry.xlsx_filename} [{entry.worksheet}] -> {entry.output_filename}: "
+                         f"{stats.documents_written} written, {stats.rows_rejected} rejected")
+        return "\n".join(lines)
+
+
+def generate_batch(
+    entries,
+    validators: dict = core.default_validators,
+    jinga_env=None,
+    post_processing=default_hightlight,
+    expected_vars=None,
+    jobs: int = 1,
+    read_only: bool = True,
+    sink: Sink = None,
+    precompile: bool = True,
+    progress=None,
+    cache=False) -> BatchReport:
+    """
+    Generate the feedback documents for several worksheets in one run.
+
+    Args:
+        entries: BatchEntry objects, or (workbook, worksheet, template, output pattern) tuples.
+        validators: A dictionary of validators for the variables.
+        jinga_env: An optional Jinja2 environment to use for rendering.
+        post_processing: A function to call after generating each document.
+        expected_vars: A set of expected variable names to look for in every worksheet.
+        jobs: Number of worker processes to render documents with, None to use default_workers().
+        read_only: Stream the worksheets rather than loading whole workbooks into memory.
+        sink: Where to write the generated documents, defaults to a FileSink.
+        precompile: Compile the templates with CompiledTemplate rather than using DocxTemplate.
+        progress: An optional function called as progress(event, stats, detail) during the run.
+        cache: A TemplateCache for the template analysis, True for the default one, or False (the default) for none.
+
+    Returns:
+        A BatchReport with the RunStats of each entry and of the whole run.
+
+    Details:
+        Entries are processed as for generate(), see its documentation. Each distinct
+        template is loaded, and its variables extracted, once. Entries reading the same
+        workbook share one open copy of it, and each worksheet is read in one pass.
+
+        With jobs > 1 the rows of every entry are collected first and then rendered by
+        one process pool, in which each worker loads every template once.
+
+        The progress function is called with "document" and the filename after each
+        document is written, passing the RunStats of that document's entry, and with
+        "finished" and the combined RunStats at the end of the run.
+    """
+    entries = [e if isinstance(e, BatchEntry) else BatchEntry(*e) for e in entries]
+    report = BatchReport(entries=[(entry, RunStats()) for entry in entries])
+    total = report.total
+
+    def notify(event, stats, detail=None):
+        if progress is not None:
+            progress(event, stats, detail)
+
+    with total.time("template"):
+        template_class = CompiledTemplate if precompile else DocxTemplate
+        template_files = list(dict.fromkeys(entry.template_filename for entry in entries))
+        cache = resolve_cache(cache)
+        templates = [load_template(template_class, f, cache) for f in template_files]
+
+        jinja_env = jinga_env
+        if jinja_env is None:
+            jinja_env = core.default_jinja_env()
+
+        if validators is None:
+            validators = {}
+
+        template_vars = [template_variables(tpl, f, jinja_env, cache) for tpl, f in zip(templates, template_files)]
+
+    if sink is None:
+        sink = FileSink()
+
+    if jobs is None:
+        jobs = default_workers()
+
+    # entries grouped by the file they read, so each workbook is opened once
+    by_file = collections.defaultdict(list)
+    for i, entry in enumerate(entries):
+        by_file[entry.xlsx_filename].append(i)
+
+    hooks = {}
+    work = []
+    for filename, indices in by_file.items():
+        with total.time("load"):
+            source = open_source(filename, entries[indices[0]].worksheet, read_only)
+        try:
+            for i in indices:
+                entry, stats = report.entries[i]
+                template = template_files.index(entry.template_filename)
+                variables = expected_variables(template_vars[template], entry.output_filename,
+                                               validators, expected_vars, jinja_env)
+
+                sheet = source
+                if isinstance(source, WorksheetSource) and entry.worksheet != entries[indices[0]].worksheet:
+                    sheet = source.worksheet(entry.worksheet)
+                rows = core.process_to_dicts(sheet, variables, validators, stats,
+                                             batch_size=VALIDATION_BATCH_SIZE)
+
+                if jobs <= 1:
+                    if template not in hooks:
+                        hooks[template] = prepare_post_processing(post_processing, template_files[template], cache)
+                    for row_data in rows:
+                        with stats.time("filename"):
+                            output_filename = core.gen_filename(entry.output_filename, row_data, jinja_env)
+                        generate_doc(row_data,
+                                     templates[template],
+                                     output_filename,
+                                     jinja_env=jinja_env,
+                                     post_processing=hooks[template],
+                                     sink=sink,
+                                     stats=stats)
+                        notify("document", stats, output_filename)
+                else:
+                    items = []
+                    for row_data in rows:
+                        with stats.time("filename"):
+                            items.append((row_data, core.gen_filename(entry.output_filename, row_data, jinja_env)))
+                    work.append((i, template, items))
+        finally:
+            source.close()
+
+    if any(items for _, _, items in work):
+        tasks = [(template, items) for _, template, items in work]
+        for position, chunk, chunk_stats in render_parallel(tasks, template_class, template_files, jinja_env,
+                                                            post_processing, sink, sink, jobs, cache):
+            entry, stats = report.entries[work[position][0]]
+            stats.merge(chunk_stats)
+            for row_data, filename in chunk:
+                notify("document", stats, filename)
+
+    logging.debug(f"Generated {len(entries)} batch entries from {len(template_files)} templates.")
+
+    for entry, stats in report.entries:
+        total.merge(stats)
+
+    notify("finished", total)
+    return report
@@ -0,0 +1,153 @@
+"""Persistent on-disk cache of template analysis results.
+
+Loading a template for generate() parses the whole document several times: to find
+its template variables, to clean its XML for CompiledTemplate and to locate its
+grading table. The results only depend on the template file (and the versions of this
+library, docxtpl and python-docx doing the analysis), so TemplateCache stores them as
+JSON keyed by a hash of these. Editing the template, or upgrading any of the libraries,
+changes the key and the analysis is redone automatically.
+
+The cache is only used when asked for, e.g. with generate(cache=True), which the
+wmg-feedback command does unless run with --no-cache.
+
+The cache directory is $WMG_FEEDBACK_CACHE if set, otherwise wmg_feedback_gen in the
+user's cache directory ($XDG_CACHE_HOME or ~/.cache).
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+CACHE_ENV = "WMG_FEEDBACK_CACHE"
+
+
+def default_cache_dir() -> str:
+    """The directory used by TemplateCache() when none is given."""
+    if os.environ.get(CACHE_ENV):
+        return os.environ[CACHE_ENV]
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "wmg_feedback_gen")
+
+
+@functools.lru_cache(maxsize=1)
+def _library_versions() -> str:
+    # the cleaned XML is docxtpl's and the documents are parsed by python-docx
+    import docx
+    import docxtpl
+
+    from . import __version__
+
+    return f"{__version__}|{docxtpl.__version__}|{docx.__version__}"
+
+
+def template_key(template_file) -> str:
+    """Hash of a template file's contents and the library versions, identifying its analysis."""
+    digest = hashlib.sha256(_library_versions().encode("utf-8") + b"\0")
+    if hasattr(template_file, "read"):
+        template_file.seek(0)
+        digest.update(template_file.read())
+        template_file.seek(0)
+    else:
+        with open(template_file, "rb") as f:
+            for block in iter(lambda: f.read(1 << 16), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class TemplateCache:
+    """
+    Analysis results for templates, stored as one JSON file per template.
+
+    Use get() to look up a cached value for a template, computing and storing it if
+    it is missing. Values must be JSON serialisable. A cache that can't be read or
+    written is logged and otherwise ignored, so it never stops documents from being
+    generated.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or default_cache_dir()
+        # entries of the templates seen by this process, by key
+        self._entries = {}
+        # keys of template files by (path, modification time, size), to hash each once
+        self._keys = {}
+
+    def __getstate__(self):
+        # pickled for worker processes, which read the entries back from disk
+        return {"directory": self.directory}
+
+    def __setstate__(self, state):
+        self.__init__(state["directory"])
+
+    def key(self, template_file) -> str:
+        """template_key(template_file), only re-hashing files that have changed."""
+        if hasattr(template_file, "read"):
+            return template_key(template_file)
+        st = os.stat(template_file)
+        stamp = (os.fspath(template_file), st.st_mtime_ns, st.st_size)
+        if stamp not in self._keys:
+            self._keys[stamp] = template_key(template_file)
+        return self._keys[stamp]
+
+    def path(self, key) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load(self, key) -> dict:
+        if key not in self._entries:
+            try:
+                with open(self.path(key), encoding="utf-8") as f:
+                    self._entries[key] = json.load(f)
+            except FileNotFoundError:
+                self._entries[key] = {}
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable template cache {self.path(key)}: {e}")
+                self._entries[key] = {}
+        return self._entries[key]
+
+    def _save(self, key):
+        # written to a temporary file and renamed, so readers never see half a file
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._entries[key], f)
+            os.replace(tmp, self.path(key))
+        except OSError as e:
+            logging.warning(f"Could not write template cache {self.path(key)}: {e}")
+
+    def get(self, template_file, name: str, compute):
+        """
+        The cached value called name for a template, or compute() stored under that name.
+
+        Args:
+            template_file: The template's filename or binary file object.
+            name: The name of the value, including anything else it depends on.
+            compute: Function returning the value if it is not cached.
+        """
+        key = self.key(template_file)
+        entries = self._load(key)
+        if name not in entries:
+            logging.debug(f"Template cache miss for {name}.")
+            entries[name] = compute()
+            self._save(key)
+        return entries[name]
+
+    def clear(self):
+        """Remove every cached analysis."""
+        self._entries = {}
+        if not os.path.isdir(self.directory):
+            return
+        for filename in os.listdir(self.directory):
+            if filename.endswith(".json"):
+                os.remove(os.path.join(self.directory, filename))
+
+
+def env_signature(jinja_env) -> str:
+    """The settings of a Jinja2 environment that change which variables a template uses."""
+    if jinja_env is None:
+        return "default"
+    return "|".join([jinja_env.block_start_string, jinja_env.block_end_string,
+                     jinja_env.variable_start_string, jinja_env.variable_end_string,
+                     jinja_env.comment_start_string, jinja_env.comment_end_string])
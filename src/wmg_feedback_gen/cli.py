@@ -0,0 +1,252 @@
+"""Command line interface, installed as the wmg-feedback console script.
+
+Usage:
+    wmg-feedback marks.xlsx template.docx
+    wmg-feedback marks.xlsx template.docx -w exam -o "out/{{STUDENTID}}.docx" -j 0 --profile
+    wmg-feedback marks.csv template.docx --cprofile run.prof
+    wmg-feedback marks.xlsx template.docx --dry-run
+    wmg-feedback marks.xlsx template.docx --shard 0/4      (and 1/4, 2/4, 3/4 on other nodes)
+    wmg-feedback marks.xlsx template.docx --merge-shards 4
+    wmg-feedback marks.xlsx template.docx --watch
+    wmg-feedback marks.xlsx template.docx --combined moderation.docx
+"""
+
+import argparse
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+
+from . import __version__
+
+
+def parse_shard(value):
+    """Parse an I/N shard argument into an (index, count) pair."""
+    from .shards import check_shard
+
+    try:
+        index, count = value.split("/")
+        return check_shard((index, count))
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f"expected I/N with 0 <= I < N, not {value!r}") from e
+
+
+def non_negative(value):
+    """Parse a count that may be 0, e.g. --writers."""
+    try:
+        number = int(value)
+    except ValueError:
+        number = -1
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"expected a whole number >= 0, not {value!r}")
+    return number
+
+
+def positive(value):
+    """Parse a count of at least 1, e.g. --merge-shards."""
+    number = non_negative(value)
+    if number == 0:
+        raise argparse.ArgumentTypeError(f"expected a whole number >= 1, not {value!r}")
+    return number
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="wmg-feedback",
+        description="Generate student feedback documents from a marks workbook and a Word template.")
+    parser.add_argument("workbook", help="the Excel workbook, CSV or JSON-lines file of marks")
+    parser.add_argument("template", help="the Word template (.docx)")
+    parser.add_argument("-w", "--worksheet", default="marks",
+                        help="worksheet to read from the workbook (default: %(default)s)")
+    parser.add_argument("-o", "--output", default="feedback/feedback_{{STUDENTID}}.docx",
+                        help="output filename pattern, a Jinja2 template (default: %(default)s)")
+    parser.add_argument("-j", "--jobs", type=non_negative, default=1,
+                        help="worker processes, 0 to use every available core (default: %(default)s)")
+    parser.add_argument("--writers", type=non_negative, default=0,
+                        help="background threads writing documents (default: %(default)s)")
+    single = parser.add_mutually_exclusive_group()
+    single.add_argument("--zip", metavar="PATH",
+                        help="write every document into this zip archive instead of separate files")
+    single.add_argument("--combined", metavar="PATH",
+                        help="append every document, on a new page, to this one .docx instead of separate files")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only regenerate documents whose row data or template changed")
+    parser.add_argument("--resume", action="store_true",
+                        help="journal each document written and skip those completed by an interrupted run")
+    parser.add_argument("--no-validators", action="store_true",
+                        help="generate a document for every row, without checking STUDENTID")
+    parser.add_argument("--no-highlight", action="store_true",
+                        help="don't highlight the grading table")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="don't use the on-disk template analysis cache, which generate() only uses when asked")
+    parser.add_argument("--shard", type=parse_shard, metavar="I/N",
+                        help="only generate shard I (from 0) of N, for splitting a run across machines")
+    parser.add_argument("--merge-shards", type=positive, metavar="N",
+                        help="check that the N shards of a run produced every document exactly once")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running, regenerating the documents of students whose rows change on each save")
+    parser.add_argument("--interval", type=float, default=0.5,
+                        help="seconds between checks for changes when watching (default: %(default)s)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="check the columns, rows and output filenames without generating anything")
+    parser.add_argument("--profile", action="store_true",
+                        help="print the time spent in each stage")
+    parser.add_argument("--cprofile", metavar="PATH",
+                        help="run under cProfile, save the profile to PATH and print the top functions")
+    parser.add_argument("-v", "--verbose", action="count", default=0,
+                        help="log more detail, repeat for debug output")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="only print errors")
+    parser.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
+    return parser
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.combined and args.writers:
+        # the combined document is built in memory from the rendering thread
+        parser.error("argument --writers: not allowed with argument --combined")
+
+    level = logging.ERROR if args.quiet else [logging.WARNING, logging.INFO, logging.DEBUG][min(args.verbose, 2)]
+    logging.basicConfig(level=level, format="%(levelname)s: %(message)s")
+
+    if args.dry_run:
+        return dry_run(args)
+    if args.merge_shards is not None:
+        return merge(args)
+    if args.watch:
+        return watch(args)
+
+    # imported once the arguments are parsed, so --help and --version start quickly
+    from .core import default_validators
+    from .document_generator import default_hightlight, generate
+    from .sinks import ZipSink
+
+    if args.zip:
+        sink = ZipSink(args.zip)
+    elif args.combined:
+        from .combined import CombinedSink
+        sink = CombinedSink(args.combined)
+    else:
+        sink = None
+    options = dict(
+        xlsx_filename=args.workbook,
+        template_filename=args.template,
+        worksheet=args.worksheet,
+        output_filename=args.output,
+        validators=None if args.no_validators else default_validators,
+        post_processing=None if args.no_highlight else default_hightlight,
+        jobs=args.jobs or None,
+        writers=args.writers,
+        incremental=args.incremental,
+        sink=sink,
+        cache=not args.no_cache,
+        shard=args.shard,
+        resume=args.resume,
+    )
+
+    profiler = cProfile.Profile() if args.cprofile else None
+    try:
+        if profiler is not None:
+            profiler.enable()
+        try:
+            stats = generate(**options)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            if sink is not None:
+                sink.close()
+    except Exception as e:
+        logging.debug("Generation failed", exc_info=True)
+        print(f"wmg-feedback: error: {e}", file=sys.stderr)
+        return 1
+
+    if not args.quiet:
+        print(f"Generated {stats.documents_written} documents, {stats.rows_rejected} rows rejected.")
+    if args.profile:
+        print(stats.summary())
+    if profiler is not None:
+        profiler.dump_stats(args.cprofile)
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(25)
+        print(out.getvalue())
+    return 0
+
+
+def dry_run(args) -> int:
+    """Run preflight() for the arguments, returning 2 if it found problems."""
+    from .core import default_validators
+    from .preflight import preflight
+
+    try:
+        report = preflight(args.workbook, args.template,
+                           worksheet=args.worksheet,
+                           output_filename=args.output,
+                           validators=None if args.no_validators else default_validators,
+                           cache=not args.no_cache)
+    except Exception as e:
+        logging.debug("Preflight failed", exc_info=True)
+        print(f"wmg-feedback: error: {e}", file=sys.stderr)
+        return 1
+
+    if not args.quiet or not report.ok:
+        print(report.summary())
+    if args.profile:
+        print(report.stats.summary())
+    return 0 if report.ok else 2
+
+
+def merge(args) -> int:
+    """Check the shards of a run against preflight() for the arguments, returning 2 if they don't match."""
+    from .core import default_validators
+    from .preflight import preflight
+    from .shards import merge_shards
+
+    try:
+        report = preflight(args.workbook, args.template,
+                           worksheet=args.worksheet,
+                           output_filename=args.output,
+                           validators=None if args.no_validators else default_validators,
+                           cache=not args.no_cache)
+        result = merge_shards(os.path.dirname(args.output) or ".", args.merge_shards, expected=report.outputs)
+    except Exception as e:
+        logging.debug("Merging shards failed", exc_info=True)
+        print(f"wmg-feedback: error: {e}", file=sys.stderr)
+        return 1
+
+    if not args.quiet or not result.ok:
+        print(result.summary())
+    return 0 if result.ok else 2
+
+
+def watch(args) -> int:
+    """Regenerate the documents of changed rows whenever the workbook or template is saved, until Ctrl-C."""
+    from .core import default_validators
+    from .document_generator import default_hightlight
+    from .watch import Watcher
+
+    def progress(event, stats, detail):
+        if event == "updated" and not args.quiet:
+            print(f"Updated {stats.documents_written} documents, removed {stats.removed}, "
+                  f"{stats.skipped} unchanged, in {sum(stats.timings.values()):.2f}s.")
+            if args.profile:
+                print(stats.summary())
+
+    watcher = Watcher(args.workbook, args.template,
+                      worksheet=args.worksheet,
+                      output_filename=args.output,
+                      validators=None if args.no_validators else default_validators,
+                      post_processing=None if args.no_highlight else default_hightlight,
+                      progress=progress,
+                      cache=not args.no_cache)
+    if not args.quiet:
+        print(f"Watching {args.workbook} and {args.template}, press Ctrl-C to stop.")
+    watcher.run(args.interval)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""Columnar, NumPy backed worksheet data with precomputed grade categories.
+
+process_to_dicts builds one dict per student and templates call the mark_category
+filter for every mark of every document they render. Columns reads the validated
+rows into one typed array per column instead, and computes the grade category of
+every mark in a column in a single vectorised pass. Templates can then use the
+precomputed field, e.g. {{LO2_category}}, rather than {{LO2 | mark_category}}.
+
+NumPy is an optional dependency, install it with the "columnar" extra.
+"""
+
+import logging
+
+from . import core
+from .grade_scale import WMG_SCALE
+from .stats import timed
+
+try:
+    import numpy as np
+except ImportError: # pragma: no cover - optional dependency
+    np = None
+
+# suffix of the derived grade category fields, e.g. LO2_category
+CATEGORY_SUFFIX = "_category"
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("Columnar data needs NumPy, install it with: pip install wmg-feedback-gen[columnar]")
+
+
+def to_array(values):
+    """
+    Convert a list of cell values to a typed array.
+
+    Columns of only integers become int64 arrays and columns of only floats float64
+    arrays. Anything else, including text, blank cells and columns mixing integers
+    and floats, is kept as an object array so every value renders exactly as before.
+    """
+    _require_numpy()
+    types = set(map(type, values))
+    if types == {int}:
+        try:
+            return np.array(values, dtype=np.int64)
+        except OverflowError:
+            pass
+    elif types == {float}:
+        return np.array(values, dtype=np.float64)
+
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def mark_categories(marks, scale=WMG_SCALE):
+    """
+    The grade category of every mark in an array, vectorised version of core.mark_category.
+
+    Args:
+        marks: An array or list of marks. Values that are not numbers give "".
+        scale: The GradeScale to look the marks up in.
+
+    Returns:
+        An array of category names.
+    """
+    _require_numpy()
+    return scale.categorise(np.asarray(marks))
+
+
+def category_columns(variables):
+    """
+    Split template variables into columns and derived category fields.
+
+    Args:
+        variables: The variable names the template uses.
+
+    Returns:
+        A tuple of the column names to read from the worksheet, and a dict mapping each
+        derived category field (e.g. LO2_category) to its mark column (LO2).
+
+    Details:
+        Every variable ending in _category is treated as derived, so a worksheet column
+        with such a name is replaced by the computed categories.
+    """
+    derived = {var: var[:-len(CATEGORY_SUFFIX)] for var in variables
+               if var.endswith(CATEGORY_SUFFIX) and len(var) > len(CATEGORY_SUFFIX)}
+    columns = (set(variables) - set(derived)) | set(derived.values())
+    return columns, derived
+
+
+class Columns:
+    """
+    Validated worksheet rows stored as one array per column.
+
+    Attributes:
+        data: Dict mapping each column name to its array, see to_array.
+    """
+
+    def __init__(self, data: dict):
+        _require_numpy()
+        self.data = data
+
+    def __len__(self):
+        return len(next(iter(self.data.values()))) if self.data else 0
+
+    def __getitem__(self, name):
+        return self.data[name]
+
+    def __contains__(self, name):
+        return name in self.data
+
+    def add_categories(self, columns, suffix=CATEGORY_SUFFIX, scale=WMG_SCALE):
+        """Add a category field, e.g. LO2_category, for each of the given mark columns."""
+        for column in columns:
+            self.data[column + suffix] = mark_categories(self.data[column], scale)
+
+    def rows(self):
+        """Yield one dict of plain Python values per row, as process_to_dicts does."""
+        names = list(self.data)
+        values = [self.data[name].tolist() for name in names]
+        for row in zip(*values):
+            yield dict(zip(names, row))
+
+
+def read_columns(rows, expected, validators=core.default_validators, stats=None):
+    """
+    Read validated worksheet rows into Columns.
+
+    Args:
+        rows: An iterable of row value tuples, e.g. sheet.iter_rows(values_only=True).
+        expected: List of expected column names.
+        validators: A dictionary of validators for the variables.
+        stats: An optional RunStats to record rows read, rejected and timings in.
+
+    Returns:
+        A Columns with an array for each expected column found, holding only the
+        rows that passed validation.
+
+    Details:
+        The header is found as for process_rows. Every remaining row is split into
+        per-column lists, validated column-wise (see core.validate_columns) and the
+        accepted rows converted to typed arrays.
+    """
+    _require_numpy()
+    columns, rows = core.find_header(rows, expected, stats)
+    found = {var: idx for var, idx in columns.items() if idx is not None}
+
+    with timed(stats, "validation"):
+        data = {var: [] for var in found}
+        pairs = list(found.items())
+        count = 0
+        for row in rows:
+            count += 1
+            for var, idx in pairs:
+                data[var].append(row[idx] if idx < len(row) else None)
+
+        reasons = core.validate_columns(data, validators, count)
+        keep = [reason is None for reason in reasons]
+        for i, reason in enumerate(reasons):
+            if reason is not None:
+                row_data = {var: values[i] for var, values in data.items()}
+                logging.warning(f"Row data did not pass validation: {row_data}")
+                if stats is not None:
+                    stats.reject(row_data, reason)
+
+        arrays = {var: to_array([v for v, k in zip(values, keep) if k])
+                  for var, values in data.items()}
+
+    return Columns(arrays)
@@ -0,0 +1,306 @@
+"""Render every student into one combined document, e.g. for printing or moderation.
+
+Merging the separate feedback files afterwards means saving, re-opening and parsing
+every one of them, and each copy brings its own styles, numbering and media along.
+CombinedSink instead appends each rendered document to a single python-docx Document
+as it is generated, each student in a section of their own, and saves it once when
+closed.
+
+The first document rendered provides the combined document's styles, numbering and
+media. Every document contributes the content of its body and its section properties:
+the page setup, and its own rendered headers and footers, so e.g. {{STUDENTID}} in a
+header shows each student's ID. Headers and footers that come out the same for every
+student are stored once. Page numbers restart at 1 for each student, and NUMPAGES
+fields ("Page N of M") are changed to SECTIONPAGES, so count the student's pages.
+
+With a CompiledTemplate the rendered body XML is parsed on its own, without building
+a package per student, and its relationships, e.g. to the template's images, are the
+ones the combined document already has. Documents from other sources have their
+relationships mapped onto the combined document, with each image stored once however
+many students it appears in.
+
+    with CombinedSink("feedback/all.docx") as sink:
+        generate("marks.xlsx", "template.docx", sink=sink)
+"""
+
+import copy
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from io import BytesIO
+
+from docx import Document
+from docx.document import Document as DocumentObject
+from docx.enum.section import WD_SECTION
+from docx.opc.constants import CONTENT_TYPE as CT
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml import OxmlElement, parse_xml
+from docx.oxml.ns import nsdecls, nsmap, qn
+from docx.parts.hdrftr import FooterPart, HeaderPart
+
+from .compiled_template import CompiledTemplate
+from .sinks import Sink, atomic_path
+from .stats import timed
+
+# relationship id attributes, e.g. r:embed of an image or r:id of a hyperlink
+R_NAMESPACE = "{%s}" % nsmap["r"]
+
+# header and footer parts by relationship type: part class, content type and partname
+STORY_PARTS = {
+    RT.HEADER: (HeaderPart, CT.WML_HEADER, "/word/header%d.xml"),
+    RT.FOOTER: (FooterPart, CT.WML_FOOTER, "/word/footer%d.xml"),
+}
+
+# the elements that follow w:pgNumType in w:sectPr
+PGNUMTYPE_SUCCESSORS = ("w:cols", "w:formProt", "w:vAlign", "w:noEndnote", "w:titlePg", "w:textDirection",
+                        "w:bidi", "w:rtlGutter", "w:docGrid", "w:printerSettings", "w:sectPrChange")
+
+
+def _page_break():
+    # the paragraph python-docx's Document.add_page_break() adds
+    return parse_xml(f'<w:p {nsdecls("w")}><w:r><w:br w:type="page"/></w:r></w:p>')
+
+
+def _start_section(sectPr):
+    # each student starts on a new page, numbered from 1
+    if sectPr.start_type in (WD_SECTION.CONTINUOUS, WD_SECTION.NEW_COLUMN):
+        sectPr.start_type = WD_SECTION.NEW_PAGE
+    pgNumType = sectPr.find(qn("w:pgNumType"))
+    if pgNumType is None:
+        pgNumType = OxmlElement("w:pgNumType")
+        sectPr.insert_element_before(pgNumType, *PGNUMTYPE_SUCCESSORS)
+    pgNumType.set(qn("w:start"), "1")
+
+
+def _section_pages(element):
+    # "of M" in a header or footer counts the pages of the student's section, not the document
+    for e in element.iter(qn("w:instrText")):
+        if e.text:
+            e.text = re.sub(r"\bNUMPAGES\b", "SECTIONPAGES", e.text)
+    for e in element.iter(qn("w:fldSimple")):
+        e.set(qn("w:instr"), re.sub(r"\bNUMPAGES\b", "SECTIONPAGES", e.get(qn("w:instr"), "")))
+
+
+def _digest(blob):
+    return hashlib.sha1(blob).hexdigest()
+
+
+class CombinedSink(Sink):
+    """
+    Append every document to one combined .docx, one after another on new pages.
+
+    The filenames of the documents are ignored. generate_doc() renders straight into
+    the combined document, applying in_memory post-processing to each student's body
+    as it is appended, see append(). Documents written as bytes, e.g. by worker
+    processes with jobs > 1, are parsed and appended in the order they arrive, and
+    write() can be called from several threads. generate() never gives the sink
+    writer threads, so students rendered in order are appended in order. Each document is a section of the combined document, starting
+    on a new page with its own headers and footers.
+
+    The combined document is saved to path, atomically like FileSink, when the sink is
+    closed. Nothing is saved if no document was added.
+
+    Attributes:
+        document: The combined python-docx Document, None until the first document is added.
+        documents: The number of documents added.
+    """
+
+    def __init__(self, path, fsync: bool = False):
+        self.path = path
+        self.fsync = fsync
+        self.document = None
+        self.documents = 0
+        self._docpr_id = 0
+        self._stories = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def append(self, template, row_data: dict = None, post_processing=None, stats=None):
+        """
+        Append a rendered DocxTemplate or CompiledTemplate, post-processing it first.
+
+        Args:
+            template: The rendered template.
+            row_data: The row data it was rendered from, passed to post_processing.
+            post_processing: An optional post-processing function, see generate_doc.
+                In-memory functions are called with a Document holding just this
+                student's body, others with the filename of the saved document.
+            stats: An optional RunStats to record timings in.
+        """
+        if post_processing is not None and not getattr(post_processing, 'in_memory', False):
+            # filename based post-processing needs the saved document
+            with tempfile.TemporaryDirectory() as tmpdir:
+                filename = os.path.join(tmpdir, "document.docx")
+                with timed(stats, "save"):
+                    template.save(filename)
+                with timed(stats, "post_processing"):
+                    post_processing(row_data, filename)
+                with timed(stats, "save"):
+                    document = Document(filename)
+            with timed(stats, "save"):
+                self._add(document.element, document)
+            return
+
+        if self.document is not None and isinstance(template, CompiledTemplate):
+            # only the rendered body is needed, its relationships are the template's
+            element, document = template.document_element(), None
+        else:
+            document = template.docx
+            element = document.element
+
+        if post_processing is not None:
+            with timed(stats, "post_processing"):
+                post_processing(row_data, document or DocumentObject(element, self.document.part))
+        with timed(stats, "save"):
+            self._add(element, document, template)
+
+    def save(self, filename, template):
+        self.append(template)
+
+    def write(self, filename, data: bytes):
+        document = Document(BytesIO(data))
+        self._add(document.element, document)
+
+    def _add(self, element, document, template=None):
+        # document is the python-docx Document element belongs to, None if element's
+        # relationship ids are already those of the combined document, with its
+        # headers and footers rendered by the CompiledTemplate template
+        with self._lock: # write() may be called from several threads
+            self._append(element, document, template)
+
+    def _append(self, element, document, template):
+        self.documents += 1
+        if self.document is None:
+            self._start(element, document)
+            return
+
+        body = self.document.element.body
+        previous = body.sectPr
+        if previous is None:
+            # no section properties to give each student their own
+            body.append(_page_break())
+        else:
+            # the previous student's section properties move to the end of their last paragraph
+            last = previous.getprevious()
+            if last is None or last.tag != qn("w:p") or last.xpath("./w:pPr/w:sectPr"):
+                last = OxmlElement("w:p")
+                previous.addprevious(last)
+            body.remove(previous)
+            last.set_sectPr(previous)
+
+        rels = document.part.rels if document is not None else None
+        rel_ids = {}
+        section = None
+        for child in list(element.body):
+            if child.tag == qn("w:sectPr"):
+                section = child
+                continue
+            for e in child.iter():
+                self._import(e, rels, rel_ids)
+            body.append(child)
+
+        if previous is None:
+            return
+        if section is None:
+            section = copy.deepcopy(previous)
+        else:
+            self._relate_stories(section, document, template)
+        _start_section(section)
+        body.append(section)
+
+    def _start(self, element, document):
+        # the first document is the base of the combined document, its section the first
+        self.document = document
+        stories = [rel for rel in document.part.rels.values()
+                   if not rel.is_external and rel.reltype in STORY_PARTS]
+        roots = [element.body] + [rel.target_part.element for rel in stories]
+        self._docpr_id = max((int(e.get("id")) for root in roots for e in root.iter(qn("wp:docPr"))
+                              if e.get("id", "").isdigit()), default=0)
+        for rel in stories:
+            self._stories.setdefault((rel.reltype, _digest(rel.target_part.blob)), rel.rId)
+            _section_pages(rel.target_part.element)
+        if element.body.sectPr is not None:
+            _start_section(element.body.sectPr)
+
+    def _import(self, e, rels, rel_ids, part=None):
+        # point e's relationship ids (from rels, None if already the combined
+        # document's) at the same targets from part, and make drawing ids unique
+        if rels is not None:
+            for attr, rId in e.attrib.items():
+                if attr.startswith(R_NAMESPACE) and rId in rels:
+                    if rId not in rel_ids:
+                        rel_ids[rId] = self._relate(rels[rId], part)
+                    e.set(attr, rel_ids[rId])
+        if e.tag == qn("wp:docPr"):
+            self._docpr_id += 1
+            e.set("id", str(self._docpr_id))
+
+    def _relate_stories(self, section, document, template):
+        # point the header and footer references of a document's section at its own headers and footers
+        for reference in section.iterchildren(qn("w:headerReference"), qn("w:footerReference")):
+            rId = reference.get(qn("r:id"))
+            if document is not None:
+                rel = document.part.rels.get(rId)
+                if rel is None:
+                    continue
+                blob, rels = rel.target_part.blob, rel.target_part.rels
+            else:
+                # the template's relationship, as the combined document has it
+                rel = self.document.part.rels.get(rId)
+                blob = None
+                if rel is not None and isinstance(template, CompiledTemplate):
+                    blob = template.rendered_part(rel.target_part.partname.lstrip("/"))
+                if blob is None: # the same for every student
+                    continue
+                rels = rel.target_part.rels
+            reference.set(qn("r:id"), self._story(rel.reltype, blob, rels))
+
+    def _story(self, reltype, blob, rels) -> str:
+        # the id of the combined document's relationship to a header or footer with the XML blob
+        key = (reltype, _digest(blob))
+        if key not in self._stories:
+            part_class, content_type, partname = STORY_PARTS[reltype]
+            package = self.document.part.package
+            element = parse_xml(blob)
+            part = part_class(package.next_partname(partname), content_type, element, package)
+            rel_ids = {}
+            for e in element.iter():
+                self._import(e, rels, rel_ids, part)
+            _section_pages(element)
+            self._stories[key] = self.document.part.relate_to(part, reltype)
+        return self._stories[key]
+
+    def _relate(self, rel, part=None) -> str:
+        # the id of the relationship from part, by default the combined document's, to the target of rel
+        part = part or self.document.part
+        if rel.is_external:
+            return part.relate_to(rel.target_ref, rel.reltype, is_external=True)
+        if rel.reltype == RT.IMAGE:
+            # image parts are shared by content, so each image is stored once
+            rId, _ = part.get_or_add_image(BytesIO(rel.target_part.blob))
+            return rId
+
+        existing = part.rels.get(rel.rId)
+        if existing is not None and not existing.is_external and existing.reltype == rel.reltype \
+                and existing.target_part.partname == rel.target_part.partname:
+            return rel.rId
+        raise ValueError(f"Can't combine documents with a {rel.reltype} relationship "
+                         f"to {rel.target_part.partname} not in the first document.")
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self.document is None:
+            return
+        if not isinstance(self.path, (str, os.PathLike)): # writable file object
+            self.document.save(self.path)
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with atomic_path(self.path, self.fsync) as tmp:
+            self.document.save(tmp)
+        self.bytes_written += os.path.getsize(self.path)
@@ -0,0 +1,279 @@
+"""Pre-compiled Word templates for rendering many documents from one template.
+
+DocxTemplate reloads the .docx, cleans the XML and compiles the Jinja source on every
+call to render(). CompiledTemplate does that work once per template (and Jinja
+environment), then each render only runs the compiled Jinja templates for the parts
+that contain template tags. Saving writes the rendered parts and copies every other
+member of the template archive (media, styles, settings, ...) across unchanged.
+"""
+
+import copy
+import re
+import zipfile
+from io import BytesIO
+
+from docx import Document
+from docx.document import Document as DocumentObject
+from docx.opc.constants import RELATIONSHIP_TYPE as REL_TYPE
+from docx.oxml import parse_xml
+from docxtpl import DocxTemplate
+from jinja2 import Environment
+from lxml import etree
+
+FOOTNOTES_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.footnotes+xml"
+
+# core properties that DocxTemplate renders as templates, and their element names in core.xml
+CORE_PROPERTIES = {
+    "author": "creator",
+    "comments": "description",
+    "identifier": "identifier",
+    "language": "language",
+    "subject": "subject",
+    "title": "title",
+}
+
+
+class CompiledTemplate(DocxTemplate):
+    """
+    A DocxTemplate that compiles the template once and reuses it for every render.
+
+    Can be used anywhere a DocxTemplate is rendered and saved repeatedly, as generate()
+    does. Accessing .docx after render() (e.g. for in_memory post-processing) loads the
+    rendered document with python-docx, and save() then writes that document instead.
+    body_document() only parses the rendered document XML, for post-processing that
+    just changes the body, and save() writes the changed XML into the package.
+
+    Warning:
+        Features that modify the document package while rendering, such as InlineImage,
+        Subdoc and replace_pic(), need the full DocxTemplate.
+    """
+
+    # class level defaults, DocxTemplate.__getattr__ delegates unknown attributes to docx
+    _docx = None
+    _parts = None
+    _element = None
+    _template_part = None
+
+    def __init__(self, template_file, cache=None):
+        super().__init__(template_file)
+
+        if hasattr(template_file, "read"):
+            template_file.seek(0)
+            data = template_file.read()
+            template_file.seek(0)
+        else:
+            with open(template_file, "rb") as f:
+                data = f.read()
+
+        self._data = data
+        with zipfile.ZipFile(BytesIO(data)) as archive:
+            self.members = [(info, archive.read(info.filename)) for info in archive.infolist()]
+
+        # the cleaned XML only depends on the template file, so can come from a TemplateCache
+        if cache is None:
+            analysis = self._analyse(data)
+        else:
+            analysis = cache.get(template_file, "compiled_template", lambda: self._analyse(data))
+
+        self.document_name = analysis["document_name"]
+        self.document_head = analysis["document_head"]
+        self.document_tail = analysis["document_tail"]
+        self.body_xml = analysis["body_xml"]
+        self.part_xml = {name: tuple(part) for name, part in analysis["part_xml"].items()}
+        self.core_templates = analysis["core_templates"]
+        self.core_name = analysis["core_name"]
+        self.core_xml = dict((info.filename, blob) for info, blob in self.members).get(self.core_name)
+
+        self._compiled = {}
+
+    def _analyse(self, data):
+        # Clean the template XML, returning a JSON serialisable dict for TemplateCache
+        members = {info.filename: blob for info, blob in self.members}
+
+        # the body of the main document is rendered, the rest of the XML is kept as is
+        document = Document(BytesIO(data))
+        document_name = document.part.partname.lstrip("/")
+        document_xml = members[document_name].decode("utf-8")
+        start = document_xml.index("<w:body")
+        end = document_xml.index("</w:body>") + len("</w:body>")
+
+        # headers, footers and footnotes are only rendered if they contain template tags
+        part_xml = {}
+        for rel in document.part.rels.values():
+            if rel.is_external or rel.reltype not in (REL_TYPE.HEADER, REL_TYPE.FOOTER):
+                continue
+            self._add_part(part_xml, rel.target_part)
+        for part in document.part.package.parts:
+            if part.content_type == FOOTNOTES_CONTENT_TYPE:
+                self._add_part(part_xml, part)
+
+        # core properties containing template tags
+        core = document.core_properties
+        return {
+            "document_name": document_name,
+            "document_head": document_xml[:start],
+            "document_tail": document_xml[end:],
+            "body_xml": self.patch_xml(self.xml_to_string(document.element.body)),
+            "part_xml": part_xml,
+            "core_templates": {p: getattr(core, p) for p in CORE_PROPERTIES
+                               if "{" in (getattr(core, p) or "")},
+            "core_name": document.part.package._core_properties_part.partname.lstrip("/"),
+        }
+
+    def _add_part(self, part_xml, part):
+        name = part.partname.lstrip("/")
+        if name in part_xml or not part.blob:
+            return
+        xml = self.patch_xml(self.xml_to_string(etree.fromstring(part.blob)))
+        if "{" in xml:
+            encoding = self.get_headers_footers_encoding(xml)
+            part_xml[name] = (xml, encoding)
+
+    def compile(self, jinja_env=None):
+        """
+        Compile the template for the given Jinja2 environment, cached per environment.
+        """
+        if jinja_env in self._compiled:
+            return self._compiled[jinja_env]
+
+        env = jinja_env or Environment()
+
+        def from_string(xml):
+            # DocxTemplate renders with a newline before every paragraph
+            return env.from_string(re.sub(r"<w:p([ >])", r"\n<w:p\1", xml))
+
+        compiled = {
+            "body": from_string(self.body_xml),
+            "parts": {name: (from_string(xml), encoding)
+                      for name, (xml, encoding) in self.part_xml.items()},
+            "core": {prop: env.from_string(value) for prop, value in self.core_templates.items()},
+        }
+        self._compiled[jinja_env] = compiled
+        return compiled
+
+    @property
+    def docx(self):
+        if self._docx is None and self._parts is not None:
+            self._docx = Document(BytesIO(self._build()))
+        return self._docx
+
+    @docx.setter
+    def docx(self, value):
+        self._docx = value
+
+    def document_element(self):
+        """
+        The rendered <w:document> element of the main document part.
+
+        Unlike .docx this only parses the rendered document XML, not the whole package,
+        e.g. for copying the body into another document. Its relationship ids are
+        those of the template. It is parsed once per render, and save() writes any
+        changes made to it.
+        """
+        if self._docx is not None:
+            return self._docx.element
+        if self._parts is None:
+            raise RuntimeError("CompiledTemplate.document_element() called before render().")
+        if self._element is None:
+            self._element = parse_xml(self._parts[self.document_name])
+        return self._element
+
+    def rendered_part(self, name):
+        """
+        The rendered XML of the part name, e.g. "word/header2.xml", as bytes.
+
+        None if the part has no template tags, so is the same as in the template.
+        Changes to the document_element() of the main document are not included.
+        """
+        if self._parts is None:
+            raise RuntimeError("CompiledTemplate.rendered_part() called before render().")
+        return self._parts.get(name)
+
+    def body_document(self):
+        """
+        The rendered document as a python-docx Document, without loading the package.
+
+        Wraps document_element() with the template's main document part, loaded once,
+        so only the rendered document XML is parsed. Changes to its body are saved,
+        anything needing the document's own part (headers, styles, images, ...) isn't.
+        Returns .docx instead if that has already been loaded.
+        """
+        if self._docx is not None:
+            return self._docx
+        element = self.document_element()
+        if self._template_part is None:
+            self._template_part = Document(BytesIO(self._data)).part
+        return DocumentObject(element, self._template_part)
+
+    def _finish_xml(self, xml):
+        # the same clean up DocxTemplate.render_xml_part does after rendering
+        xml = re.sub(r"\n<w:p([ >])", r"<w:p\1", xml)
+        xml = xml.replace("{_{", "{{").replace("}_}", "}}").replace("{_%", "{%").replace("%_}", "%}")
+        return self.resolve_listing(xml)
+
+    def render(self, context, jinja_env=None, autoescape=False):
+        """Render the compiled template with context, see DocxTemplate.render."""
+        if autoescape:
+            if not jinja_env:
+                jinja_env = Environment(autoescape=autoescape)
+            else:
+                jinja_env.autoescape = autoescape
+
+        compiled = self.compile(jinja_env)
+        self.docx_ids_index = 1000
+        self.is_saved = False
+
+        parts = {}
+
+        body = self.fix_tables(self._finish_xml(compiled["body"].render(context)))
+        self.fix_docpr_ids(body)
+        parts[self.document_name] = (self.document_head
+                                     + etree.tostring(body, encoding="unicode")
+                                     + self.document_tail).encode("utf-8")
+
+        for name, (template, encoding) in compiled["parts"].items():
+            parts[name] = self._finish_xml(template.render(context)).encode(encoding)
+
+        if compiled["core"]:
+            core = etree.fromstring(self.core_xml)
+            for prop, template in compiled["core"].items():
+                for element in core.iter():
+                    if etree.QName(element).localname == CORE_PROPERTIES[prop]:
+                        element.text = template.render(context)
+            parts[self.core_name] = etree.tostring(core, xml_declaration=True,
+                                                   encoding="UTF-8", standalone=True)
+
+        self._parts = parts
+        self._docx = None
+        self._element = None
+        self.is_rendered = True
+
+    def _build(self):
+        buffer = BytesIO()
+        self._write(buffer)
+        return buffer.getvalue()
+
+    def _write(self, target):
+        parts = self._parts
+        if self._element is not None: # parsed by document_element(), may have been modified
+            parts = dict(parts)
+            parts[self.document_name] = etree.tostring(self._element, xml_declaration=True,
+                                                       encoding="UTF-8", standalone=True)
+        with zipfile.ZipFile(target, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for info, blob in self.members:
+                # writestr updates the ZipInfo, so give it a copy of the template's
+                archive.writestr(copy.copy(info), parts.get(info.filename, blob))
+
+    def save(self, filename, *args, **kwargs):
+        """Save the rendered document to a filename or writable binary file object."""
+        if self._parts is None:
+            raise RuntimeError("CompiledTemplate.save() called before render().")
+
+        if self._docx is not None: # loaded for post-processing, may have been modified
+            self._docx.save(filename, *args, **kwargs)
+        else:
+            self._write(filename)
+
+        # media/embedded/zipname replacements, same as DocxTemplate
+        self.post_processing(filename)
+        self.is_saved = True
@@ -4,28 +4,43 @@ This module contains the main functions for processing Excel data
 and generating feedback documents.
 """
 
+import functools
+import itertools
 import re
-import jinja2
-import openpyxl
-from docxtpl import DocxTemplate
+import time
 import logging
+from typing import TYPE_CHECKING
+from .grade_scale import WMG_SCALE
+from .stats import timed
+
+if TYPE_CHECKING: # only imported when used, see default_jinja_env
+    import jinja2
+
+_student_id = re.compile(r"[0-9]{7}")
 
 default_validators = {
-    'STUDENTID': lambda x: bool(re.match(r"[0-9]{7}", str(x).strip()))
+    'STUDENTID': lambda x: bool(_student_id.match(str(x).strip()))
 }
 
 def mark_category( mark ):
-    try:
-        mark = float(mark)
-    except (TypeError, ValueError):
-        logging.warning(f"Invalid mark value: {mark}")
-        return ""
-    if mark >= 80: return "OUTSTANDING"
-    if mark >= 70: return "DISTINCTION"
-    if mark >= 60: return "GOOD"
-    if mark >= 50: return "PASS"
-    if mark >= 40: return "MARGINAL"
-    return "FAIL"
+    """The WMG grade category of a mark, see grade_scale.WMG_SCALE."""
+    return WMG_SCALE.category(mark)
+
+# Public name for the mark to category conversion
+category = mark_category
+
+def default_jinja_env(scale=None):
+    """
+    Create the default Jinja2 environment, with the mark_category filter registered.
+
+    Args:
+        scale: An optional GradeScale for the mark_category filter, instead of the WMG bands.
+    """
+    import jinja2
+
+    jinja_env = jinja2.Environment()
+    jinja_env.filters['mark_category'] = mark_category if scale is None else scale
+    return jinja_env
 
 def find_columns(sheet, expected):
     """
@@ -67,31 +82,156 @@ def find_columns(sheet, expected):
     return columns
 
 
-def process_to_dicts(sheet, expected, validators=default_validators):
+def process_to_dicts(sheet, expected, validators=default_validators, stats=None, batch_size=None):
     """
     Process worksheet rows and yield validated row data as dictionaries.
 
     Args:
-        sheet: The openpyxl worksheet object to process.
+        sheet: The openpyxl worksheet object, or other RowSource (see sources.py), to process.
         expected: List of expected column names.
         validators: Dictionary of validation functions for each column.
+        stats: An optional RunStats to record rows read, rejections and timings in.
+        batch_size: Validate this many rows at a time column by column, see process_rows.
 
     Yields:
         Dictionary containing row data for each valid row.
+
+    Details:
+        The worksheet is read in a single forward pass, see process_rows, so this works
+        with read-only (streaming) worksheets as well as normal ones.
     """
-    columns = find_columns(sheet, expected)
+    yield from process_rows(sheet.iter_rows(values_only=True), expected, validators, stats, batch_size)
 
-    for row in sheet.iter_rows(values_only=True):
-        row_data = {var: row[idx] for var, idx in columns.items() if idx is not None}
-        if validate_row_data(row_data, validators):
-            yield row_data
-        else:
-            logging.warning(f"Row data did not pass validation: {row_data}")
+
+def _timed_rows(rows, stats):
+    # reading is lazy for read-only worksheets, so time each row as part of the load
+    rows = iter(rows)
+    while True:
+        start = time.perf_counter()
+        row = next(rows, None)
+        stats.add_time("load", time.perf_counter() - start)
+        if row is None:
+            return
+        stats.rows_read += 1
+        yield row
+
+
+def find_header(rows, expected, stats=None):
+    """
+    Find the expected columns at the start of an iterable of row tuples.
+
+    Args:
+        rows: An iterable of row value tuples, e.g. sheet.iter_rows(values_only=True).
+        expected: List of expected column names.
+        stats: An optional RunStats to record rows read and timings in.
+
+    Returns:
+        A tuple of the column mapping, as returned by find_columns, and an iterator
+        over all of the rows including the ones read while searching.
+
+    Details:
+        Rows are buffered only until every expected column has been found, so memory
+        use stays flat for large worksheets. If some expected columns are never found
+        the whole input is buffered.
+    """
+    columns = {i: None for i in expected}
+    buffered = []
+    rows = iter(rows) if stats is None else _timed_rows(rows, stats)
+
+    for row in rows:
+        buffered.append(row)
+
+        # if all columns are found, we can stop
+        if None not in columns.values():
+            break
+
+        # check all cells in row to find matches for missing variables. Only the
+        # search is timed, reading the rows counts towards "load"
+        with timed(stats, "columns"):
+            for idx, cell in enumerate(row):
+                c = str(cell).strip()
+                if c in columns and columns[c] is None:
+                    columns[c] = idx
+
+    logging.debug(f"Found columns: {columns}")
+
+    return columns, itertools.chain(buffered, rows)
+
+
+def process_rows(rows, expected, validators=default_validators, stats=None, batch_size=None, columns=None):
+    """
+    Find the header and yield validated row data from an iterable of row tuples in one pass.
+
+    Args:
+        rows: An iterable of row value tuples, e.g. sheet.iter_rows(values_only=True).
+        expected: List of expected column names.
+        validators: Dictionary of validation functions for each column.
+        stats: An optional RunStats to record rows read, rejections and timings in.
+        batch_size: Validate this many rows at a time column by column, see validate_columns.
+        columns: The column mapping if the header has already been found by find_header,
+            in which case rows are the rows it returned.
+
+    Yields:
+        Dictionary containing row data for each valid row.
+
+    Raises:
+        ValueError: If a validator's column is not in the worksheet or it is not callable.
+
+    Details:
+        Gives the same results as find_columns followed by a second pass over the rows,
+        but reads the rows only once, see find_header.
+
+        Without a batch size each rejected row is logged as a warning as it is found.
+        In batch mode the rejected rows of each batch are logged together.
+    """
+    if columns is None:
+        columns, rows = find_header(rows, expected, stats)
+
+    found = [var for var, idx in columns.items() if idx is not None]
+    check = compile_validators(validators, found)
+
+    if not batch_size:
+        for row in rows:
+            with timed(stats, "validation"):
+                row_data = extract_row_data(row, columns)
+                reason = check(row_data)
+
+            if reason is None:
+                yield row_data
+            else:
+                logging.warning(f"Row data did not pass validation: {row_data}")
+                if stats is not None:
+                    stats.reject(row_data, reason)
+        return
+
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return
+
+        with timed(stats, "validation"):
+            batch = [extract_row_data(row, columns) for row in batch]
+            reasons = validate_columns({var: [row_data[var] for row_data in batch] for var in validators},
+                                       count=len(batch), check=check)
+
+        rejected = [(row_data, reason) for row_data, reason in zip(batch, reasons) if reason is not None]
+        if rejected:
+            logging.warning(f"{len(rejected)} rows did not pass validation:\n"
+                            + "\n".join(f"  {reason}: {row_data}" for row_data, reason in rejected))
+            if stats is not None:
+                for row_data, reason in rejected:
+                    stats.reject(row_data, reason)
+
+        for row_data, reason in zip(batch, reasons):
+            if reason is None:
+                yield row_data
 
 
 def extract_row_data(row, columns):
     """Extract row data based on column mapping."""
-    return {var: row[idx] for var, idx in columns.items() if idx is not None}
+    # rows from read-only worksheets can be shorter than the header
+    return {var: row[idx] if idx < len(row) else None
+            for var, idx in columns.items() if idx is not None}
 
 
 def validate_row_data(row_data, validators=default_validators):
@@ -105,6 +245,23 @@ def validate_row_data(row_data, validators=default_validators):
     Returns:
         True if all validations pass, False otherwise.
 
+    Raises:
+        ValueError: If validator is missing or not callable.
+    """
+    return rejection_reason(row_data, validators) is None
+
+
+def rejection_reason(row_data, validators=default_validators):
+    """
+    Check row data using provided validators and explain why it was rejected.
+
+    Args:
+        row_data: Dictionary containing row data.
+        validators: Dictionary of validation functions.
+
+    Returns:
+        None if all validations pass, otherwise a message naming the failed column.
+
     Raises:
         ValueError: If validator is missing or not callable.
     """
@@ -116,21 +273,139 @@ def validate_row_data(row_data, validators=default_validators):
             raise ValueError(f"Validator for '{var}' is not callable.")
         
         if func(row_data[var]) != True:
-            return False
+            return f"Invalid {var}: {row_data[var]!r}"
         
-    return True
+    return None
+
+
+def compile_validators(validators, columns):
+    """
+    Check validators once and combine them into a single row check.
+
+    Args:
+        validators: Dictionary of validation functions.
+        columns: The column names that will be present in the row data.
+
+    Returns:
+        A function taking row data and returning None if all validations pass,
+        otherwise a message naming the failed column, as rejection_reason does.
+        It can also be passed to validate_columns, see its check argument.
+
+    Raises:
+        ValueError: If validator is missing or not callable.
+    """
+    for var, func in validators.items():
+        if var not in columns:
+            raise ValueError(f"Validator '{var}' not found in columns.")
+
+        if not callable(func):
+            raise ValueError(f"Validator for '{var}' is not callable.")
+
+    checks = tuple(validators.items())
+
+    def check(row_data):
+        for var, func in checks:
+            if func(row_data[var]) != True:
+                return f"Invalid {var}: {row_data[var]!r}"
+        return None
+
+    check.checks = checks
+    return check
+
+
+def validate_columns(data, validators=default_validators, count=None, check=None):
+    """
+    Validate whole columns at once.
+
+    Args:
+        data: Dictionary mapping column names to lists of values, one per row.
+        validators: Dictionary of validation functions.
+        count: Number of rows, needed if there are no validators to take it from data.
+        check: The validators already compiled by compile_validators, e.g. when
+            validating a worksheet batch by batch, in which case validators is ignored.
+
+    Returns:
+        A list with one entry per row, None if the row passes validation otherwise a
+        message naming the failed column, as rejection_reason does.
+
+    Raises:
+        ValueError: If validator is missing or not callable.
+
+    Details:
+        Each validator is applied down its column in turn. As with validate_row_data, a
+        row's later validators are not run once it has failed one.
+    """
+    if check is None:
+        check = compile_validators(validators, data) # raises if a validator is missing or not callable
+    if count is None:
+        count = len(next(iter(data.values()), []))
+
+    reasons = [None] * count
+    pending = range(count)
+    for var, func in check.checks:
+        column = data[var]
+        passed = []
+        for i in pending:
+            if func(column[i]) == True:
+                passed.append(i)
+            else:
+                reasons[i] = f"Invalid {var}: {column[i]!r}"
+        pending = passed
+
+    return reasons
+
+
+@functools.lru_cache(maxsize=32)
+def compile_filename(template: str, jinja_env=None) -> "jinja2.Template":
+    """
+    Compile a filename template, caching the result.
+
+    Args:
+        template: Jinja2 template string for filename.
+        jinja_env: An optional Jinja2 environment to compile the template with.
+
+    Returns:
+        The compiled Jinja2 template.
+
+    Details:
+        Compiled templates are kept in a small cache keyed by the template string and
+        environment, so each filename pattern is only parsed once per run.
+    """
+    if jinja_env is None:
+        import jinja2
+        return jinja2.Template(template)
+    return jinja_env.from_string(template)
+
+
+@functools.lru_cache(maxsize=32)
+def filename_variables(template: str, jinja_env=None) -> frozenset:
+    """
+    The variables used by a filename template, caching the result.
+
+    Args:
+        template: Jinja2 template string for filename.
+        jinja_env: An optional Jinja2 environment to parse the template with.
+
+    Returns:
+        The names of the undeclared variables in the template.
+    """
+    import jinja2
+    import jinja2.meta
+
+    env = jinja_env or jinja2.Environment()
+    return frozenset(jinja2.meta.find_undeclared_variables(env.parse(template)))
 
 
-def gen_filename(template: str, row_data: dict) -> str:
+def gen_filename(template: str, row_data: dict, jinja_env=None) -> str:
     """
     Generate filename using Jinja2 template and row data.
 
     Args:
         template: Jinja2 template string for filename.
         row_data: Dictionary containing template variables.
+        jinja_env: An optional Jinja2 environment, needed to use custom filters in the filename.
 
     Returns:
         Generated filename string.
     """
-    template = jinja2.Template(str(template))
-    return template.render(**row_data)
+    return compile_filename(str(template), jinja_env).render(**row_data)
@@ -1,76 +1,254 @@
 import wmg_feedback_gen.core as core
+from wmg_feedback_gen.manifest import Manifest, MANIFEST_NAME
+from wmg_feedback_gen.sinks import Sink, FileSink, QueuedSink
+from wmg_feedback_gen.compiled_template import CompiledTemplate
+from wmg_feedback_gen.stats import RunStats, timed
+# highlight_cell moved to grading, re-exported for callers importing it from here
+from wmg_feedback_gen.grading import GradingIndex, highlight_cell  # noqa: F401
+from wmg_feedback_gen.grade_scale import WMG_SCALE, GradeScale
+from wmg_feedback_gen.sources import open_source
+from wmg_feedback_gen.rendering import (
+    VALIDATION_BATCH_SIZE,
+    cancelled,
+    expected_variables,
+    load_template,
+    render_parallel,
+    resolve_cache,
+    template_variables
+)
 from docxtpl import DocxTemplate
-import openpyxl
-import jinja2
 from docx import Document
 from io import BytesIO
-from jinja2 import meta
+import inspect
 import logging
 import os
-import docx.table
-import docx.enum.text
-
-def highlight_cell(cell: docx.table._Cell, color=docx.enum.text.WD_COLOR_INDEX.YELLOW):
-    for p in cell.paragraphs:
-        for run in p.runs:
-            run.font.highlight_color = color
-
-def default_hightlight(row_data: dict, filename: str):
-    logger = logging.getLogger(__name__)
-
-    logger.debug(f"Post-processing file: {filename}")
-
-    docx = Document(filename)
-    for table in docx.tables:
-        logger.debug(f"Processing table with {len(table.rows)} rows.")
-        for row in table.rows:
-            logger.debug(f"Processing row with {len(row.cells)} cells.")
-            if len(row.cells) not in (9,8): # not the correct table
-                continue
-
-            logger.debug(f"Row cells: {[cell.text for cell in row.cells]}")
-
-            categories = ["OUTSTANDING", "DISTINCTION", "GOOD", "PASS", "MARGINAL", "FAIL"]
-
-            if len(row.cells) == 9: # has the KSB column
-                logger.debug("Detected KSB column in the table.")
-                lookup = dict(zip(categories, row.cells[3:9]))
-                comments = row.cells[2]
-            else: # no KSB column
-                lookup = dict(zip(categories, row.cells[2:8]))
-                comments = row.cells[1]
-
-            category = comments.text.strip().split()[-1]
-            logger.debug(f"Identified category: {category}")
-            
-            # Highlight the category in the document
-            try:
-                highlight_cell(lookup[category])
-                logger.debug(f"Highlighting {category} in {filename}")
-            except KeyError:
-                continue
-
-    # Save the modified document to the output file
-    docx.save(filename)
+import tempfile
+
+def in_memory(func):
+    """
+    Mark a post-processing function as working on the rendered document in memory.
+
+    Marked functions are called with the row data and the rendered python-docx Document
+    before it is saved, so each output file is only written once. Unmarked functions are
+    called with the row data and the filename after the document has been saved.
+    """
+    func.in_memory = True
+    return func
+
+def body_only(func):
+    """
+    Mark an in_memory post-processing function as only changing the document body.
+
+    With a CompiledTemplate marked functions are called with a Document wrapping just
+    the rendered document XML (see CompiledTemplate.body_document), rather than the
+    whole rendered package, which is not built until the document is saved.
+    """
+    func.in_memory = True
+    func.body_only = True
+    return func
+
+def for_template(factory):
+    """
+    Give a post-processing function a factory that prepares it for a template.
+
+    generate() calls factory(template_file) once per template (and worker process) and
+    uses the function it returns for every document, so work that only depends on the
+    template, like locating the grading table, is not repeated for each document.
+    """
+    def decorator(func):
+        func.for_template = factory
+        return func
+    return decorator
+
+def prepare_post_processing(post_processing, template_file, cache=None):
+    """
+    The post-processing function to use for documents rendered from template_file.
+
+    Factories with a cache parameter are also passed the TemplateCache, if any.
+    """
+    factory = getattr(post_processing, 'for_template', None)
+    if factory is None:
+        return post_processing
+    if hasattr(template_file, 'seek'):
+        template_file.seek(0)
+    if cache is not None and 'cache' in inspect.signature(factory).parameters:
+        return factory(template_file, cache=cache)
+    return factory(template_file)
+
+def _index_template(template_file, cache=None, scale=WMG_SCALE):
+    def index(document):
+        return GradingIndex.from_rows(document, scale)
+
+    if cache is None:
+        return index(Document(template_file)).highlighter()
+
+    # the cached positions are keyed by category, so depend on the scale's bands
+    name = "grading_rows" if scale == WMG_SCALE else f"grading_rows {'|'.join(scale.categories)}"
+    data = cache.get(template_file, name, lambda: index(Document(template_file)).to_dict())
+    return GradingIndex.from_dict(data, scale=scale, rebuild=index).highlighter()
+
+@for_template(_index_template)
+@body_only
+def default_hightlight(row_data: dict, document):
+    """
+    Highlight the grading table cell matching the category at the end of each comments cell.
+
+    Args:
+        row_data: Dictionary containing the row data for this document.
+        document: The rendered python-docx Document, or the filename of a saved document.
+
+    Details:
+        Grading rows are the table rows with 9 (with a KSB column) or 8 cells, see
+        GradingIndex.from_rows. Called directly this scans the document for them,
+        generate() instead locates them once in the template, see for_template.
+    """
+    if isinstance(document, (str, os.PathLike)):
+        # compatibility with callers that pass a saved file
+        filename = document
+        document = Document(filename)
+        default_hightlight(row_data, document)
+        document.save(filename)
+        return
+
+    GradingIndex.from_rows(document).highlight(row_data, document)
+
+class GradeHighlight:
+    """
+    Post-processing highlighting the WMG style grading table with the bands of a GradeScale.
+
+    default_hightlight for a custom scale: the comments cell of each grading row ends
+    with the category, e.g. from {{LO2 | mark_category}} rendered with
+    default_jinja_env(scale), and the row has one cell per band of the scale.
+    """
+
+    in_memory = True
+    body_only = True
+
+    def __init__(self, scale: GradeScale = WMG_SCALE):
+        self.scale = scale
+
+    @property
+    def identity(self):
+        # identifies the scale for incremental runs, see manifest.callable_identity
+        return f"GradeHighlight({self.scale!r})"
+
+    def for_template(self, template_file, cache=None):
+        return _index_template(template_file, cache, self.scale)
+
+    def __call__(self, row_data: dict, document):
+        GradingIndex.from_rows(document, self.scale).highlight(row_data, document)
+
+def _grade_scale(jinja_env):
+    # the GradeScale of an environment from default_jinja_env(scale), for columnar categories
+    scale = jinja_env.filters.get('mark_category')
+    return scale if isinstance(scale, GradeScale) else WMG_SCALE
+
+def _rendered_document(post_processing, template):
+    # the Document an in_memory post-processing function is called with
+    if getattr(post_processing, 'body_only', False) and isinstance(template, CompiledTemplate):
+        return template.body_document()
+    return template.docx
+
+def _takes_row_and_document(func):
+    # post-processing functions are called with (row_data, document)
+    try:
+        parameters = inspect.signature(func).parameters.values()
+    except (TypeError, ValueError):
+        return False
+    return len([p for p in parameters if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD)]) == 2
 
 def generate_doc(row_data: dict, 
                  template: DocxTemplate, 
                  output_filename: str,
                  jinja_env=None,
-                 post_processing=default_hightlight):
-    template.reset_replacements()
-    template.render(row_data, jinja_env=jinja_env)
+                 post_processing=default_hightlight,
+                 sink: Sink = None,
+                 stats: RunStats = None):
+    """
+    Render a single document and save it to output_filename.
 
-    # Save to an in-memory file
-    template.save(output_filename)
+    Args:
+        row_data: Dictionary containing the template variables.
+        template: The DocxTemplate to render.
+        output_filename: The filename, or writable binary file object, to save to.
+        jinja_env: An optional Jinja2 environment to use for rendering.
+        post_processing: A function to call with the row data and the generated document.
+        sink: Where to save the document, defaults to a FileSink.
+        stats: An optional RunStats to record timings and the document written in.
 
-    # Call post_processing after saving the document if it's a function
-    if callable(post_processing) and post_processing.__code__.co_argcount == 2:
-        post_processing(row_data, output_filename)
-    else:
+    Details:
+        Post-processing functions marked with in_memory are applied to the rendered
+        document before it is saved, so the output is written in a single pass. Those
+        marked with body_only only get the rendered body, see body_only.
+        Other post-processing functions are called with the filename of the saved
+        document, a temporary file that only replaces output_filename once they return.
+        Sinks with an append() method, like CombinedSink (see combined.py), are handed
+        the rendered template and post-processing function instead.
+    """
+    if sink is None:
+        sink = FileSink()
+
+    bytes_before = sink.bytes_written
+
+    with timed(stats, "render"):
+        template.reset_replacements()
+        template.render(row_data, jinja_env=jinja_env)
+
+    if not callable(post_processing) or not _takes_row_and_document(post_processing):
         logging.debug("Post-processing function absent or does not match expected signature.")
+        post_processing = None
+
+    if hasattr(sink, 'append'):
+        # a sink building its output from the rendered template itself, e.g. CombinedSink
+        sink.append(template, row_data, post_processing, stats)
+    elif post_processing is None:
+        with timed(stats, "save"):
+            sink.save(output_filename, template)
+    elif getattr(post_processing, 'in_memory', False):
+        with timed(stats, "post_processing"):
+            post_processing(row_data, _rendered_document(post_processing, template))
+        with timed(stats, "save"):
+            sink.save(output_filename, template)
+    elif isinstance(sink, FileSink) and isinstance(output_filename, (str, os.PathLike)):
+        # filename based post-processing, has to reopen the saved file. Both happen on a
+        # temporary file renamed into place after, so a crash in between leaves no
+        # unprocessed document behind
+        with sink.replacing(output_filename) as filename:
+            with timed(stats, "save"):
+                template.save(filename)
+            with timed(stats, "post_processing"):
+                post_processing(row_data, filename)
+    elif isinstance(sink, FileSink):
+        with timed(stats, "save"):
+            sink.save(output_filename, template)
+        with timed(stats, "post_processing"):
+            post_processing(row_data, output_filename)
+    else:
+        # filename based post-processing needs a real file, go via a temporary one
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, os.path.basename(str(output_filename)))
+            with timed(stats, "save"):
+                template.save(filename)
+            with timed(stats, "post_processing"):
+                post_processing(row_data, filename)
+            with timed(stats, "save"):
+                with open(filename, 'rb') as f:
+                    sink.write(output_filename, f.read())
+
+    if stats is not None:
+        stats.documents_written += 1
+        stats.bytes_written += sink.bytes_written - bytes_before
 
 
+def default_workers() -> int:
+    """
+    Pick a worker count for parallel generation from the number of usable CPU cores.
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError: # not available on Windows/macOS
+        return os.cpu_count() or 1
+
 def generate( 
     xlsx_filename: str,
     template_filename: str,
@@ -79,12 +257,25 @@ def generate(
     validators: dict = core.default_validators,
     jinga_env=None,
     post_processing=default_hightlight,
-    expected_vars=None):
+    expected_vars=None,
+    jobs: int = 1,
+    read_only: bool = True,
+    incremental: bool = False,
+    sink: Sink = None,
+    precompile: bool = True,
+    progress=None,
+    writers: int = 0,
+    columnar_data: bool = False,
+    cache=False,
+    cancel=None,
+    shard=None,
+    resume: bool = False,
+    count_first: bool = False) -> RunStats:
     """
     Find the columns in the given worksheet that match the expected variable names.
 
     Args:
-        xlsx_filename: The Excel worksbook to open.
+        xlsx_filename: The Excel worksbook to open, or a CSV or JSON-lines file, see Details.
         template_filename: The filename of the Word document to use as template.
         worksheet: The name of the worksheet to process in the Excel workbook.
         output_filename: The filename pattern for the output documents. 
@@ -92,9 +283,23 @@ def generate(
         jinga_env: An optional Jinja2 environment to use for rendering.
         post_processing: A function to call after generating each document.
         expected_vars: A set of expected variable names to look for in the worksheet.
+        jobs: Number of worker processes to render documents with, None to use default_workers().
+        read_only: Stream the worksheet rather than loading the whole workbook into memory.
+        incremental: Only regenerate documents whose row data has changed since the last run.
+        sink: Where to write the generated documents, defaults to a FileSink.
+        precompile: Compile the template once with CompiledTemplate rather than using DocxTemplate.
+        progress: An optional function called as progress(event, stats, detail) during the run.
+        writers: Number of background threads writing documents, 0 to write from the rendering thread.
+        columnar_data: Read the worksheet into NumPy arrays and precompute grade category fields.
+        cache: A TemplateCache for the template analysis, True for the default one, or False (the default) for none.
+        cancel: An optional threading.Event (or anything with is_set()) to stop the run early.
+        shard: An (index, count) pair to only generate this node's share of the documents.
+        resume: Keep a journal of the documents written so an interrupted run can be restarted.
+        count_first: Validate every row before rendering, so progress gets the "total" first.
 
     Returns:
-        
+        A RunStats with the number of rows read and rejected (with reasons), documents
+        written, skipped and removed, bytes written and the time spent in each stage.
 
     Details:
         Validators are functions that are run against the relevant column name to test
@@ -102,45 +307,308 @@ def generate(
 
         Post-processing is a function that can be used to modify generated documents
         after they have been created. It is called with the row data and the filename
-        of the generated document.
+        of the generated document, or with the rendered Document object if it is
+        decorated with in_memory (as default_hightlight is) which avoids re-reading
+        and re-writing every output file. Decorated with body_only (as default_hightlight
+        is) it only gets the rendered body, so no package is built until the document is
+        saved. A post-processing function decorated with
+        for_template (as default_hightlight is) is first prepared for the template, e.g.
+        to locate its grading table once rather than in every document.
 
         Expected variables are the set of column names that are expected to be present in the worksheet.
         For the most part these will be automatically extracted from the Word template, output filename, 
         and validators. 
         However, if using the post_processing function, it may be necessary to specify additional variables
+
+        With jobs > 1 the validated rows are split across a process pool. Each worker loads
+        its own copy of the template once, so the post_processing function and jinja
+        environment must be picklable (i.e. module level functions, not lambdas).
+        The generated files are the same as for a serial run.
+
+        The student data can also be read from a CSV (.csv) or JSON-lines (.jsonl, .ndjson)
+        file, or any RowSource, see sources.py. Their rows are treated exactly as
+        worksheet rows, the header row is found wherever it is and worksheet is ignored.
+
+        By default the workbook is opened in openpyxl's read-only mode, only the requested
+        worksheet is parsed and its rows are streamed in a single pass. Set read_only=False
+        to load the full workbook instead.
+
+        Incremental generation keeps a manifest (see manifest.py) in the output directory
+        recording a hash of each document's row data, the template file and the
+        post-processing function. Documents are skipped if their row data is unchanged and
+        the file still exists. If the template or post-processing function changes every
+        document is rebuilt. Documents from the previous run that are no longer produced,
+        e.g. a student removed from the worksheet, are deleted.
+
+        The sink decides where documents are written, see sinks.py. The generated filenames
+        are used as paths by FileSink, as names within the archive by ZipSink, and passed to
+        the callback by CallbackSink. CombinedSink ignores them and appends every
+        document, with page breaks, to a single .docx for printing or moderation,
+        sharing the template's styles and media rather than copying them per student.
+        Sinks passed in are not closed by generate(), so the same sink can collect
+        documents from several runs.
+
+        By default the template is loaded as a CompiledTemplate, which cleans and compiles
+        the template XML once rather than for every document. Set precompile=False to
+        render with docxtpl's DocxTemplate instead.
+
+        The progress function is called with the event name, the RunStats so far and a
+        detail value: "total" with the number of documents the run will write or skip,
+        once every row has been read and validated, "document" with the filename after
+        each document is written, "skipped" with the filename of each up to date
+        document in incremental runs, and "finished" with None at the end of the run.
+        With jobs=1 rows are streamed, rendered as they are validated, so "total" is
+        only sent with count_first=True, which keeps the validated rows in memory
+        until they are rendered. With jobs > 1 the rows are always read first. Stage timings from worker processes
+        are added as each chunk of documents completes, so they are cumulative CPU time
+        rather than elapsed time.
+
+        With writers > 0 rendering and writing are pipelined: each rendered document is
+        put on a bounded queue (see QueuedSink) and written by a pool of writer threads,
+        so a slow network drive doesn't stall rendering. Any write error is raised from
+        generate(). Documents written by worker processes (jobs > 1 with files) are
+        always written by the workers themselves, and sinks with an append() method,
+        like CombinedSink, are always appended to in order, so writers is ignored.
+
+        With columnar_data=True the worksheet is read into one array per column (see
+        columnar.py, needs NumPy) and every template variable ending in _category,
+        e.g. {{LO2_category}}, is filled with the grade category of its mark column,
+        computed for the whole column at once rather than by the mark_category filter
+        in every render. The whole worksheet is read before the first document is
+        rendered.
+
+        Grade categories come from a GradeScale, see grade_scale.py, the WMG bands by
+        default. For another scheme pass jinga_env=default_jinja_env(scale), which the
+        mark_category filter and columnar category fields then use, and
+        post_processing=GradeHighlight(scale) to highlight its bands.
+
+        With cache=True, or a TemplateCache, the results of analysing the template (its
+        variables, cleaned XML and grading table) are kept on disk, see cache.py, keyed
+        by a hash of the template file and the library versions. Later runs with the
+        same template skip the analysis, and editing the template invalidates the
+        cached results. Nothing is written to disk by default.
+
+        Setting the cancel event, e.g. from another thread, stops the run cleanly once
+        the document being generated has been written (with jobs > 1, once the chunks
+        already handed to the workers are done). The documents written so far are kept,
+        stats.cancelled is set and incremental runs keep the rest of the previous
+        manifest rather than removing documents that were not reached.
+
+        With shard=(index, count) the run is one of count runs, e.g. on different
+        machines sharing the output directory, with the same arguments. Each document
+        is generated by the shard its output filename hashes to, see shards.py, and
+        the shard saves a completion manifest next to the documents. Check that the
+        shards together produced every document exactly once with
+        shards.merge_shards(). Incremental runs keep a manifest per shard.
+
+        Documents are written to a temporary file in the output directory and renamed
+        into place once complete, including any filename based post-processing, so an
+        interrupted run never leaves a truncated document. With resume=True each
+        document is also recorded in a journal (see journal.py) as soon as it is
+        written. Running again with resume=True after a crash or cancel skips the
+        documents already completed; the journal is removed once a run finishes.
     """
 
-    tpl = DocxTemplate(template_filename)
+    stats = RunStats()
+
+    def notify(event, detail=None):
+        if progress is not None:
+            progress(event, stats, detail)
+
+    with stats.time("template"):
+        template_class = CompiledTemplate if precompile else DocxTemplate
+        cache = resolve_cache(cache)
+        tpl = load_template(template_class, template_filename, cache)
+
+        jinja_env = jinga_env
+        if jinja_env is None:
+            # Create a new Jinja2 environment if not provided
+            jinja_env = core.default_jinja_env()
+
+        if validators is None:
+            validators = {}
+
+        # Extract undeclared template variables from the template
+        template_vars = template_variables(tpl, template_filename, jinja_env, cache)
+        variables = expected_variables(template_vars, output_filename, validators, expected_vars, jinja_env)
+
+        derived = {}
+        if columnar_data:
+            # only imported when used, as it loads NumPy
+            import wmg_feedback_gen.columnar as columnar
+
+            # category fields are computed from their mark columns, not read
+            variables, derived = columnar.category_columns(variables)
+
+    if sink is None:
+        sink = FileSink()
+
+    if jobs is None:
+        jobs = default_workers()
+
+    shards = None
+    manifest_name, journal_name = MANIFEST_NAME, None
+    if shard is not None:
+        from wmg_feedback_gen.shards import ShardManifest, check_shard
+
+        index, count = check_shard(shard)
+        shards = ShardManifest.for_output(output_filename, (index, count))
+        # each shard skips and removes only its own documents
+        manifest_name = f".wmg_feedback_manifest_{index}_of_{count}.json"
+        journal_name = f".wmg_feedback_journal_{index}_of_{count}.jsonl"
+
+    manifest = None
+    if incremental:
+        if not isinstance(sink, FileSink):
+            raise ValueError("Incremental generation is only supported when writing to files.")
+
+        # create feedback directory if it does not exist
+        os.makedirs(os.path.dirname(output_filename) or ".", exist_ok=True)
+        manifest = Manifest.load(os.path.join(os.path.dirname(output_filename), manifest_name),
+                                 template_filename, post_processing)
+
+    journal = None
+    if resume:
+        if not isinstance(sink, FileSink):
+            raise ValueError("Resuming a run is only supported when writing to files.")
+        from wmg_feedback_gen.journal import Journal, JOURNAL_NAME
+
+        journal = Journal.open(os.path.join(os.path.dirname(output_filename) or ".", journal_name or JOURNAL_NAME),
+                               template_filename, post_processing)
+
+    def up_to_date(filename, row_data):
+        # completed by an interrupted run, or unchanged since the last incremental run
+        if journal is not None and journal.is_complete(filename, row_data):
+            if manifest is not None:
+                manifest.record(filename, row_data)
+        elif manifest is None or not manifest.is_current(filename, row_data):
+            return False
+        if shards is not None:
+            shards.record(filename)
+        return True
+
+    # documents queued for the writer threads, journalled once actually written
+    queued = {}
+
+    def written(filename):
+        journal.record(filename, queued.pop(str(filename)))
+
+    # with writer threads documents are written while the next one is rendered
+    # sinks building their output from the rendered template, like CombinedSink, are
+    # appended to in order from this thread, so never have writer threads
+    writer = None
+    if writers and not hasattr(sink, 'append'):
+        writer = QueuedSink(sink, writers, written=written if journal is not None else None)
+    output = writer or sink
+
+    finished = False
+    try:
+        with stats.time("load"):
+            # a RowSource passed in is read as is and left open, like a sink
+            source = xlsx_filename if hasattr(xlsx_filename, 'iter_rows') \
+                else open_source(xlsx_filename, worksheet, read_only)
+        try:
+            if columnar_data:
+                data = columnar.read_columns(source.iter_rows(values_only=True),
+                                             variables, validators, stats)
+                data.add_categories({column for column in derived.values() if column in data},
+                                    scale=_grade_scale(jinja_env))
+                rows = data.rows()
+            else:
+                rows = core.process_to_dicts(source, variables, validators, stats,
+                                             batch_size=VALIDATION_BATCH_SIZE)
 
-    if jinga_env is None:
-        # Create a new Jinja2 environment if not provided
-        jinja_env = jinja2.Environment()
-        jinja_env.filters['mark_category'] = core.mark_category
+            def named(rows):
+                # (row_data, filename) for the rows this run, or shard, generates
+                for row_data in rows:
+                    with stats.time("filename"):
+                        filename = core.gen_filename(output_filename, row_data, jinja_env)
+                    if shards is None or shards.assign(filename):
+                        yield row_data, filename
 
-    if validators is None:
-        validators = {}
+            if jobs <= 1:
+                items = named(rows)
+                if count_first:
+                    # the total is only known once every row has been validated
+                    items = list(items)
+                    notify("total", len(items))
+                hook = prepare_post_processing(post_processing, template_filename, cache)
+                for row_data, filename in items:
+                    if cancelled(cancel):
+                        stats.cancelled = True
+                        break
+                    #logging.debug(f"Processing row data: {row_data}")
+                    if up_to_date(filename, row_data):
+                        notify("skipped", filename)
+                        continue
 
-    # Extract Jinja variables from the output_filename string
-    output_filename_ast = jinja_env.parse(output_filename)
-    output_filename_vars = meta.find_undeclared_variables(output_filename_ast)
+                    if journal is not None and writer is not None:
+                        queued[str(filename)] = row_data
+                    generate_doc(row_data,
+                                 tpl,
+                                 filename,
+                                 jinja_env=jinja_env,
+                                 post_processing=hook,
+                                 sink=output,
+                                 stats=stats)
 
-    # Extract undeclared template variables from the template
-    template_vars = tpl.get_undeclared_template_variables(jinja_env=jinja_env)
+                    if manifest is not None:
+                        manifest.record(filename, row_data)
+                    if journal is not None and writer is None:
+                        journal.record(filename, row_data)
+                    if shards is not None:
+                        shards.record(filename)
+                    notify("document", filename)
+                work = []
+            else:
+                work = list(named(rows))
+                notify("total", len(work))
+                pending = []
+                for row_data, filename in work:
+                    if up_to_date(filename, row_data):
+                        notify("skipped", filename)
+                    else:
+                        pending.append((row_data, filename))
+                work = pending
+        finally:
+            if source is not xlsx_filename:
+                source.close()
 
-    variables = template_vars.union(output_filename_vars).union(validators.keys())
-    if expected_vars is not None:
-        for var in expected_vars: variables.add(var)
+        if work:
+            done = 0
+            for _, chunk, chunk_stats in render_parallel([(0, work)], template_class, [template_filename], jinja_env,
+                                                         post_processing, sink, output, jobs, cache, cancel):
+                stats.merge(chunk_stats)
+                for row_data, filename in chunk:
+                    if manifest is not None:
+                        manifest.record(filename, row_data)
+                    if journal is not None:
+                        journal.record(filename, row_data)
+                    if shards is not None:
+                        shards.record(filename)
+                    notify("document", filename)
+                done += len(chunk)
+            stats.cancelled = done < len(work)
 
-    workbook = openpyxl.load_workbook(xlsx_filename, data_only=True)
+        if writer is not None:
+            with stats.time("save"):
+                writer.close()
+        finished = True
+    finally:
+        if writer is not None:
+            writer.abort()
+        if journal is not None:
+            # kept for the next run to resume from unless every document was written
+            journal.close(complete=finished and not stats.cancelled)
+            stats.resumed = journal.resumed
 
-    # create feedback directory if it does not exist
-    os.makedirs(os.path.dirname(output_filename), exist_ok=True)
+    if manifest is not None:
+        manifest.finish(remove=not stats.cancelled)
+        stats.skipped = manifest.skipped
+        stats.removed = manifest.removed
 
-    for row_data in core.process_to_dicts(workbook[worksheet], variables, validators):
-        #logging.debug(f"Processing row data: {row_data}")
-        generate_doc(row_data,
-                     tpl,
-                     core.gen_filename(output_filename, row_data),
-                     jinja_env=jinja_env,
-                     post_processing=post_processing)
+    if shards is not None:
+        shards.finish(complete=not stats.cancelled)
 
+    notify("finished")
+    return stats
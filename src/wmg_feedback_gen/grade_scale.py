@@ -0,0 +1,135 @@
+"""Grade scales: the category of each band of marks.
+
+A GradeScale is built once from a boundary table, the lowest mark of each band and
+its category, and looks marks up with a binary search of the sorted boundaries. The
+same scale gives the mark_category filter of the Jinja2 environment, the highlighted
+band of the grading table and the precomputed category fields of columnar data, so a
+custom scheme is defined in one place:
+
+    scale = GradeScale([(70, "FIRST"), (60, "2:1"), (50, "2:2"), (40, "THIRD"), (None, "FAIL")])
+    jinja_env = default_jinja_env(scale)
+    generate(..., jinga_env=jinja_env, post_processing=GradeHighlight(scale))
+"""
+
+import bisect
+import logging
+import math
+import sys
+
+
+class GradeScale:
+    """
+    The categories of a grading scheme and the marks they start at.
+
+    Attributes:
+        boundaries: The lowest mark of each band, ascending, excluding a catch-all lowest band.
+        categories: The category of every band in table order, highest band first.
+    """
+
+    def __init__(self, table):
+        """
+        Args:
+            table: (lowest mark, category) pairs, in any order. A lowest mark of None
+                makes that the category of every mark below the other bands, otherwise
+                such marks have no category ("").
+        """
+        bands = sorted((mark, category) for mark, category in table if mark is not None)
+        lowest = [category for mark, category in table if mark is None]
+        if len(lowest) > 1:
+            raise ValueError("Only one band of a grade scale can have no lowest mark.")
+        if len({mark for mark, _ in bands}) != len(bands):
+            raise ValueError("The bands of a grade scale must start at different marks.")
+
+        self.boundaries = [float(mark) for mark, _ in bands]
+        # indexed by bisect_right(boundaries, mark), so entry 0 is below every boundary
+        self._lookup = (lowest or [""]) + [category for _, category in bands]
+        self.categories = [category for category in reversed(self._lookup) if category]
+
+    def __repr__(self):
+        table = [(mark, category) for mark, category in zip(self.boundaries, self._lookup[1:])]
+        if self._lookup[0]:
+            table.insert(0, (None, self._lookup[0]))
+        return f"GradeScale({list(reversed(table))!r})"
+
+    def __eq__(self, other):
+        return isinstance(other, GradeScale) and \
+            (self.boundaries, self._lookup) == (other.boundaries, other._lookup)
+
+    def __hash__(self):
+        return hash((tuple(self.boundaries), tuple(self._lookup)))
+
+    def category(self, mark) -> str:
+        """
+        The category of a single mark.
+
+        Marks that are not numbers, e.g. blank cells, are logged and give "".
+        """
+        try:
+            mark = float(mark)
+        except (TypeError, ValueError):
+            logging.warning(f"Invalid mark value: {mark}")
+            return ""
+        if math.isnan(mark):
+            return ""
+        return self._lookup[bisect.bisect_right(self.boundaries, mark)]
+
+    # a scale can be used wherever a function of a mark is expected, e.g. as a filter
+    __call__ = category
+
+    def categorise(self, marks):
+        """
+        The category of every mark in a column, in one sorted search.
+
+        Args:
+            marks: A list or NumPy array of marks. Values that are not numbers give "".
+
+        Returns:
+            A NumPy object array of categories for a NumPy array, otherwise a list.
+        """
+        np = sys.modules.get("numpy")
+        if np is not None and isinstance(marks, np.ndarray):
+            return self._categorise_array(np, marks)
+
+        lookup, boundaries, find = self._lookup, self.boundaries, bisect.bisect_right
+        categories = []
+        for mark in marks:
+            try:
+                mark = float(mark)
+            except (TypeError, ValueError):
+                categories.append("")
+                continue
+            categories.append("" if mark != mark else lookup[find(boundaries, mark)])
+        return categories
+
+    def _categorise_array(self, np, marks):
+        if marks.dtype.kind not in "biuf": # text, blanks or a mix of types
+            marks = np.fromiter((_to_float(m) for m in marks), dtype=np.float64, count=len(marks))
+        else:
+            marks = marks.astype(np.float64)
+
+        categories = np.array(self._lookup + [""], dtype=object)
+        index = np.searchsorted(self.boundaries, marks, side="right")
+        invalid = np.isnan(marks)
+        index[invalid] = len(self._lookup)
+
+        if invalid.any():
+            logging.debug(f"{int(invalid.sum())} marks are not numbers and have no category.")
+        return categories[index]
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return math.nan
+
+
+# The WMG grade bands, used by mark_category and the default highlighting
+WMG_SCALE = GradeScale([
+    (80, "OUTSTANDING"),
+    (70, "DISTINCTION"),
+    (60, "GOOD"),
+    (50, "PASS"),
+    (40, "MARGINAL"),
+    (None, "FAIL"),
+])
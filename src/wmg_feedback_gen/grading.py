@@ -0,0 +1,241 @@
+"""Locate the grading table of a template once and highlight it in every document.
+
+The grading table layout is fixed by the template, so rather than scanning every
+table, row and cell of each generated document, GradingIndex records where the
+grading cells are when the template is loaded. Highlighting a rendered document then
+only reads the cells that decide each category and goes straight to the cell to
+highlight.
+
+Two layouts are supported:
+
+    from_rows     the WMG form, one row per learning outcome with a comments cell
+                  ending in the category followed by one cell per category.
+    from_columns  one column per mark with one row per category band, the category
+                  given by a GradeScale, or other function, of the mark in the row data.
+
+Both take the categories of the bands as a list in table order or as a GradeScale.
+"""
+
+import logging
+from dataclasses import dataclass
+
+import docx.enum.text
+import docx.table
+
+from .grade_scale import WMG_SCALE, GradeScale
+
+# Category bands of the WMG grading table, in table order
+CATEGORIES = WMG_SCALE.categories
+
+
+def highlight_cell(cell: docx.table._Cell, color=docx.enum.text.WD_COLOR_INDEX.YELLOW):
+    for p in cell.paragraphs:
+        for run in p.runs:
+            run.font.highlight_color = color
+
+
+def _locate(table, cell):
+    # (row, cell) position of a cell's <w:tc> element within the table XML, which
+    # unlike row.cells is not affected by horizontally or vertically merged cells
+    tc = cell._tc
+    tr = tc.getparent()
+    return table._tbl.tr_lst.index(tr), tr.tc_lst.index(tc)
+
+
+def _ending(text, categories):
+    # the longest category the text ends with as whole words, e.g. "VERY GOOD" rather than "GOOD"
+    text = " ".join(text.split())
+    for category in sorted(categories, key=len, reverse=True):
+        if text.endswith(category) and (len(text) == len(category) or text[-len(category) - 1] == " "):
+            return category
+    return None
+
+
+@dataclass
+class GradedItem:
+    """
+    One graded item in the grading table, e.g. a learning outcome.
+
+    Attributes:
+        table: Index of the table in document.tables.
+        cells: Dict mapping each category to the (row, cell) position of its cell.
+        comments: (row, cell) position of the cell whose text ends with the category.
+        mark: Or, the row data column whose mark gives the category.
+    """
+    table: int
+    cells: dict
+    comments: tuple = None
+    mark: str = None
+
+
+class GradingIndex:
+    """
+    The positions of the grading cells of a template.
+
+    Attributes:
+        items: The GradedItems found.
+        scale: GradeScale, or function, giving the category of a mark, for items with a mark column.
+    """
+
+    def __init__(self, items, scale=WMG_SCALE, shape=None, rebuild=None):
+        self.items = items
+        self.scale = scale
+        # rows per table and cells per indexed row, to check documents match the template
+        self.shape = shape
+        # builds a new index for a document that doesn't match, e.g. a different template
+        self.rebuild = rebuild
+
+    @classmethod
+    def from_rows(cls, document, categories=CATEGORIES, sizes=(9, 8)):
+        """
+        Index a row-wise grading table such as the WMG feedback form.
+
+        Args:
+            document: The template, or a rendered document, as a python-docx Document.
+            categories: The category of each band, in table order, or a GradeScale.
+            sizes: Cells per grading row. The category cells are the last cells of the
+                row and the comments cell comes immediately before them.
+        """
+        if isinstance(categories, GradeScale):
+            categories = categories.categories
+        items = []
+        tables = document.tables
+        for t, table in enumerate(tables):
+            for row in table.rows:
+                cells = row.cells
+                if len(cells) not in sizes: # not the correct table
+                    continue
+                bands = cells[len(cells) - len(categories):]
+                comments = cells[len(cells) - len(categories) - 1]
+                items.append(GradedItem(table=t,
+                                        cells={c: _locate(table, cell) for c, cell in zip(categories, bands)},
+                                        comments=_locate(table, comments)))
+
+        def rebuild(document):
+            return cls.from_rows(document, categories, sizes)
+
+        return cls(items, shape=cls._shape(tables, items), rebuild=rebuild)
+
+    @classmethod
+    def from_columns(cls, document, marks, categories, scale=None,
+                     table=0, first_row=1, first_column=1):
+        """
+        Index a column-wise grading table, one column per mark.
+
+        Args:
+            document: The template, or a rendered document, as a python-docx Document.
+            marks: The row data column of the mark for each grading column, in order.
+            categories: The category of each band, in table order from first_row down,
+                or a GradeScale giving both the bands and the category of each mark.
+            scale: Function giving the category of a mark, defaults to the GradeScale
+                given as categories or else WMG_SCALE.
+            table: Index of the grading table in document.tables.
+            first_row: Row of the first category band.
+            first_column: Column of the first mark.
+        """
+        if scale is None:
+            scale = categories if isinstance(categories, GradeScale) else WMG_SCALE
+        if isinstance(categories, GradeScale):
+            categories = categories.categories
+        tables = document.tables
+        rows = tables[table].rows[first_row:first_row + len(categories)]
+        grid = [row.cells for row in rows]
+
+        items = []
+        for j, mark in enumerate(marks):
+            cells = {c: _locate(tables[table], row[first_column + j]) for c, row in zip(categories, grid)}
+            items.append(GradedItem(table=table, cells=cells, mark=mark))
+
+        def rebuild(document):
+            return cls.from_columns(document, marks, categories, scale, table, first_row, first_column)
+
+        return cls(items, scale=scale, shape=cls._shape(tables, items), rebuild=rebuild)
+
+    def to_dict(self) -> dict:
+        """The positions in the index as JSON serialisable data, e.g. for TemplateCache."""
+        counts, rows = self.shape
+        return {
+            "items": [{"table": item.table, "cells": item.cells, "comments": item.comments, "mark": item.mark}
+                      for item in self.items],
+            "shape": [counts, [[t, r, n] for (t, r), n in rows.items()]],
+        }
+
+    @classmethod
+    def from_dict(cls, data, scale=WMG_SCALE, rebuild=None):
+        """An index from the data returned by to_dict()."""
+        items = [GradedItem(table=item["table"],
+                            cells={c: tuple(position) for c, position in item["cells"].items()},
+                            comments=tuple(item["comments"]) if item["comments"] else None,
+                            mark=item["mark"])
+                 for item in data["items"]]
+        counts, rows = data["shape"]
+        return cls(items, scale=scale, shape=(counts, {(t, r): n for t, r, n in rows}), rebuild=rebuild)
+
+    @staticmethod
+    def _shape(tables, items):
+        rows = set()
+        for item in items:
+            positions = list(item.cells.values()) + ([item.comments] if item.comments else [])
+            rows.update((item.table, r) for r, _ in positions)
+        return ([len(table._tbl.tr_lst) for table in tables],
+                {(t, r): len(tables[t]._tbl.tr_lst[r].tc_lst) for t, r in rows})
+
+    def matches(self, tables) -> bool:
+        """Whether the given document.tables have the same rows as the template, and cells in the indexed rows."""
+        counts, rows = self.shape
+        if [len(table._tbl.tr_lst) for table in tables] != counts:
+            return False
+        return all(len(tables[t]._tbl.tr_lst[r].tc_lst) == n for (t, r), n in rows.items())
+
+    def cells(self, row_data: dict, document):
+        """
+        Yield the cell to highlight for each graded item of a rendered document.
+
+        Falls back to indexing the document itself, with rebuild, if a template tag
+        added or removed tables or rows so it no longer matches the template.
+        """
+        tables = document.tables
+        if not self.matches(tables):
+            logging.debug("Document does not match the grading index, re-indexing it.")
+            if self.rebuild is None:
+                return
+            yield from self.rebuild(document).cells(row_data, document)
+            return
+
+        def cell(table, position):
+            r, c = position
+            return docx.table._Cell(table._tbl.tr_lst[r].tc_lst[c], table)
+
+        for item in self.items:
+            table = tables[item.table]
+            if item.mark is not None:
+                if item.mark not in row_data:
+                    continue
+                category = self.scale(row_data[item.mark])
+            else:
+                category = _ending(cell(table, item.comments).text, item.cells)
+
+            if category in item.cells:
+                yield cell(table, item.cells[category])
+
+    def highlight(self, row_data: dict, document, color=docx.enum.text.WD_COLOR_INDEX.YELLOW):
+        """Highlight the category cell of every graded item in a rendered document."""
+        for cell in self.cells(row_data, document):
+            highlight_cell(cell, color)
+
+    def highlighter(self):
+        """An in_memory post-processing function highlighting with this index."""
+        return Highlighter(self)
+
+
+class Highlighter:
+    """Post-processing function highlighting rendered documents using a GradingIndex."""
+
+    in_memory = True
+    body_only = True
+
+    def __init__(self, index: GradingIndex):
+        self.index = index
+
+    def __call__(self, row_data, document):
+        self.index.highlight(row_data, document)
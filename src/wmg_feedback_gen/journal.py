@@ -0,0 +1,133 @@
+"""Journal of the documents completed by a run, so a restarted run can resume.
+
+A long run that dies part way through, e.g. out of memory or on Ctrl-C, would
+otherwise start again from the first row. With generate(resume=True) every document
+is recorded in a journal next to the documents as soon as it has been written. The
+journal is a JSON-lines file appended to, and flushed, one line per document, so it
+is never more than a line behind the documents on disk and a line cut short by a
+crash is simply ignored. A restarted run skips every document in the journal whose
+row data is unchanged and whose file exists, and the journal is removed once a run
+completes.
+
+Like the incremental manifest, the journal is only used if the template contents and
+post-processing function are the same as when it was written.
+"""
+
+import json
+import logging
+import os
+import threading
+
+from .manifest import callable_identity, file_hash, row_hash
+
+JOURNAL_NAME = ".wmg_feedback_journal.jsonl"
+
+
+class Journal:
+    """
+    Append-only record of the documents a run has completed.
+
+    Use Journal.open() to read the journal left by an interrupted run and continue
+    it, is_complete() to check whether a document can be skipped, record() for every
+    document written and close() at the end of the run.
+
+    Attributes:
+        completed: Row data hash of each document recorded by earlier runs, by filename.
+        resumed: Number of documents skipped because an earlier run completed them.
+    """
+
+    def __init__(self, path, settings: dict, completed: dict = None):
+        self.path = path
+        self.settings = settings
+        self.completed = completed or {}
+        self.resumed = 0
+        self._file = None
+        # record() may be called from writer threads, see QueuedSink
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path, template_filename, post_processing):
+        """
+        Open the journal at path for a run with the given template and post-processing.
+
+        Documents recorded by an earlier run with a different template or post-processing
+        function are not reused, and the journal is started afresh.
+        """
+        settings = {
+            "template": file_hash(template_filename),
+            "post_processing": callable_identity(post_processing),
+        }
+
+        completed = {}
+        try:
+            with open(path, encoding="utf-8") as f:
+                lines = iter(f)
+                header = _parse(next(lines, ""))
+                if header is not None and header.get("settings") == settings:
+                    for line in lines:
+                        entry = _parse(line)
+                        if entry is not None and "file" in entry:
+                            completed[entry["file"]] = entry["row"]
+                else:
+                    logging.info("Template or post-processing changed, not resuming the previous run.")
+        except FileNotFoundError:
+            pass
+
+        journal = cls(path, settings, completed)
+        if completed:
+            logging.info(f"Resuming run, {len(completed)} documents already completed.")
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if completed:
+            journal._file = open(path, "a", encoding="utf-8")
+            # a crash may have cut the last line short, start on a fresh line
+            journal._file.write("\n")
+        else:
+            journal._file = open(path, "w", encoding="utf-8")
+            journal._append({"settings": settings})
+        return journal
+
+    def _append(self, entry):
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def is_complete(self, filename, row_data: dict) -> bool:
+        """
+        Check if an earlier run completed filename for row_data, if so it is counted as resumed.
+        """
+        filename = str(filename)
+        if self.completed.get(filename) == row_hash(row_data) and os.path.exists(filename):
+            self.resumed += 1
+            return True
+        return False
+
+    def record(self, filename, row_data: dict):
+        """Record that filename has been written for row_data."""
+        self._append({"file": str(filename), "row": row_hash(row_data)})
+
+    def close(self, complete: bool = True):
+        """
+        Close the journal.
+
+        Args:
+            complete: True if the run finished, which removes the journal. Otherwise
+                it is kept so that the next run resumes from it.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if complete:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+def _parse(line):
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return None
+    return entry if isinstance(entry, dict) else None
@@ -0,0 +1,139 @@
+"""Manifest of generated documents, used for incremental regeneration.
+
+The manifest is stored as JSON next to the generated documents and records a hash of
+the row data each document was generated from, along with the template file hash and
+the post-processing function used.
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+MANIFEST_NAME = ".wmg_feedback_manifest.json"
+
+
+def file_hash(filename) -> str:
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def row_hash(row_data: dict) -> str:
+    """Return a stable hash of a row's data."""
+    # default=str covers dates and other non-JSON cell values
+    encoded = json.dumps(row_data, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def callable_identity(func) -> str:
+    """
+    Return a name identifying a post-processing function, or None if there is none.
+
+    Callable objects whose behaviour depends on their settings can provide an identity
+    attribute, used in place of their qualified name, so a change of settings is noticed.
+    """
+    if not callable(func):
+        return None
+    module = getattr(func, "__module__", None)
+    name = getattr(func, "identity", None) or getattr(func, "__qualname__", type(func).__qualname__)
+    return f"{module}.{name}"
+
+
+class Manifest:
+    """
+    Record of which documents were generated from which inputs.
+
+    Use Manifest.load() to read the manifest left by a previous run, is_current() to
+    check whether a document can be skipped, record() for every document produced by
+    this run, and finish() to remove documents that are no longer produced and save.
+    """
+
+    def __init__(self, path, settings: dict, previous: dict = None):
+        self.path = path
+        self.settings = settings
+        self.previous = previous or {}
+        self.valid = False
+        self.outputs = {}
+        self.skipped = 0
+        self.rebuilt = 0
+        self.removed = 0
+
+    @classmethod
+    def load(cls, path, template_filename, post_processing):
+        """
+        Load the manifest at path, if any, for a run with the given template and post-processing.
+
+        Previous results are only reused if the template contents and post-processing
+        function are the same as for the previous run.
+        """
+        settings = {
+            "template": file_hash(template_filename),
+            "post_processing": callable_identity(post_processing),
+        }
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls(path, settings)
+        except ValueError:
+            logging.warning(f"Ignoring unreadable manifest: {path}")
+            return cls(path, settings)
+
+        manifest = cls(path, settings, data.get("outputs", {}))
+        manifest.valid = data.get("settings") == settings
+        if not manifest.valid:
+            logging.info("Template or post-processing changed, regenerating all documents.")
+        return manifest
+
+    def is_current(self, filename, row_data: dict) -> bool:
+        """
+        Check if filename is up to date for row_data, if so it is recorded as skipped.
+        """
+        filename = str(filename)
+        digest = row_hash(row_data)
+        if self.valid and self.previous.get(filename) == digest and os.path.exists(filename):
+            self.outputs[filename] = digest
+            self.skipped += 1
+            return True
+        return False
+
+    def record(self, filename, row_data: dict):
+        """Record that filename has been generated from row_data."""
+        self.outputs[str(filename)] = row_hash(row_data)
+        self.rebuilt += 1
+
+    def finish(self, remove: bool = True) -> dict:
+        """
+        Remove documents from the previous run that were not produced by this one and save.
+
+        Args:
+            remove: False to keep the previous documents not reached by this run, and
+                their manifest entries, e.g. when the run was cancelled part way through.
+
+        Returns:
+            A dictionary with the number of documents skipped, rebuilt and removed.
+        """
+        for filename in self.previous:
+            if filename in self.outputs:
+                continue
+            if not remove:
+                if self.valid:
+                    self.outputs[filename] = self.previous[filename]
+                continue
+            try:
+                os.remove(filename)
+                self.removed += 1
+            except FileNotFoundError:
+                pass
+
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"settings": self.settings, "outputs": self.outputs}, f, indent=1)
+
+        report = {"skipped": self.skipped, "rebuilt": self.rebuilt, "removed": self.removed}
+        logging.info(f"Incremental generation: {report}")
+        return report
@@ -0,0 +1,136 @@
+"""Check a generate() run before rendering anything.
+
+A missing column, a bad student ID or two students mapping to the same output file
+otherwise only show up part way through a long run, after many documents have been
+written. preflight() goes through the same steps as generate(), extracting the
+variables, finding the columns, validating the rows and rendering the output
+filenames, but never renders a document, so it takes about as long as reading the
+worksheet.
+"""
+
+import collections
+from dataclasses import dataclass, field
+
+from . import core
+from .sources import open_source
+from .stats import RunStats
+
+
+@dataclass
+class PreflightReport:
+    """
+    What a generate() run with the same arguments would do.
+
+    Attributes:
+        variables: The columns the run looks for in the worksheet.
+        missing: Expected columns that are not in the worksheet. Missing template
+            variables render as blanks, missing validator columns stop generate().
+        stats: RunStats with the rows read and rejected (with reasons) and timings.
+        outputs: The output filename of each document, in worksheet order.
+        collisions: Output filenames produced by more than one row, mapped to those rows.
+    """
+    variables: set = field(default_factory=set)
+    missing: list = field(default_factory=list)
+    stats: RunStats = field(default_factory=RunStats)
+    outputs: list = field(default_factory=list)
+    collisions: dict = field(default_factory=dict)
+
+    @property
+    def planned(self) -> int:
+        """The number of documents the run would write."""
+        return len(self.outputs)
+
+    @property
+    def ok(self) -> bool:
+        """True if no columns are missing and every document has its own output file."""
+        return not self.missing and not self.collisions
+
+    def summary(self) -> str:
+        """A human readable report of the problems found."""
+        lines = [f"Documents planned: {self.planned}",
+                 f"Rows read:         {self.stats.rows_read}",
+                 f"Rows rejected:     {self.stats.rows_rejected}"]
+        for row_data, reason in self.stats.rejected:
+            lines.append(f"  {reason}: {row_data}")
+        if self.missing:
+            lines.append(f"Missing columns: {', '.join(self.missing)}")
+        for filename, rows in self.collisions.items():
+            lines.append(f"Output {filename} would be written by {len(rows)} rows:")
+            lines.extend(f"  {row_data}" for row_data in rows)
+        lines.append("Preflight passed." if self.ok else "Preflight found problems.")
+        return "\n".join(lines)
+
+
+def preflight(
+    xlsx_filename: str,
+    template_filename: str,
+    worksheet: str = "marks",
+    output_filename: str = "feedback/feedback_{{STUDENTID}}.docx",
+    validators: dict = core.default_validators,
+    jinga_env=None,
+    expected_vars=None,
+    read_only: bool = True,
+    cache=False) -> PreflightReport:
+    """
+    Check the inputs of a generate() run without rendering any documents.
+
+    Args:
+        xlsx_filename: The Excel workbook, CSV or JSON-lines file, or a RowSource.
+        template_filename: The filename of the Word document to use as template.
+        worksheet: The name of the worksheet to process in the Excel workbook.
+        output_filename: The filename pattern for the output documents.
+        validators: A dictionary of validators for the variables.
+        jinga_env: An optional Jinja2 environment, as passed to generate().
+        expected_vars: A set of expected variable names to look for in the worksheet.
+        read_only: Stream the worksheet rather than loading the whole workbook into memory.
+        cache: A TemplateCache for the template analysis, True for the default one, or False (the default) for none.
+
+    Returns:
+        A PreflightReport.
+
+    Details:
+        The arguments mean the same as for generate(). Validators whose column is
+        missing are reported rather than raising ValueError, and the rows are
+        validated with the remaining validators.
+    """
+    # imported here, as the package imports this module eagerly, see __init__
+    from docxtpl import DocxTemplate
+    from .rendering import VALIDATION_BATCH_SIZE, expected_variables, resolve_cache, template_variables
+
+    report = PreflightReport()
+    stats = report.stats
+
+    with stats.time("template"):
+        jinja_env = jinga_env
+        if jinja_env is None:
+            jinja_env = core.default_jinja_env()
+
+        if validators is None:
+            validators = {}
+
+        # only the variables are needed, which DocxTemplate extracts without compiling
+        template_vars = template_variables(DocxTemplate(template_filename), template_filename,
+                                           jinja_env, resolve_cache(cache))
+        report.variables = expected_variables(template_vars, output_filename, validators, expected_vars, jinja_env)
+
+    with stats.time("load"):
+        source = xlsx_filename if hasattr(xlsx_filename, 'iter_rows') \
+            else open_source(xlsx_filename, worksheet, read_only)
+    try:
+        columns, rows = core.find_header(source.iter_rows(values_only=True), report.variables, stats)
+        report.missing = sorted(var for var, idx in columns.items() if idx is None)
+
+        found = {var: func for var, func in validators.items() if var not in report.missing}
+        targets = collections.defaultdict(list)
+        for row_data in core.process_rows(rows, report.variables, found, stats,
+                                          batch_size=VALIDATION_BATCH_SIZE, columns=columns):
+            with stats.time("filename"):
+                filename = core.gen_filename(output_filename, row_data, jinja_env)
+            targets[filename].append(row_data)
+            report.outputs.append(filename)
+    finally:
+        if source is not xlsx_filename:
+            source.close()
+
+    report.collisions = {filename: rows for filename, rows in targets.items() if len(rows) > 1}
+    return report
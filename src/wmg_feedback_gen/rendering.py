@@ -0,0 +1,148 @@
+"""Template loading and parallel rendering shared by the ways of generating documents.
+
+generate(), generate_batch(), preflight() and Watcher all load templates, work out
+which columns to look for and, for the first two, spread rows over a process pool in
+the same way. The helpers doing so live here rather than in any one of them. They are
+internal to the package, not part of its exported API.
+
+Only light dependencies are imported at module level, so preflight can use this
+module without loading docxtpl until a template is actually opened.
+"""
+
+import collections
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from . import core
+from .cache import TemplateCache, env_signature
+from .sinks import CallbackSink, FileSink
+from .stats import RunStats
+
+# Rows validated together, column by column, see core.process_rows
+VALIDATION_BATCH_SIZE = 256
+
+
+def resolve_cache(cache):
+    """The TemplateCache for a cache= option: True uses the default directory, False or None (the default) none."""
+    if cache is True:
+        return TemplateCache()
+    return cache or None
+
+
+def load_template(template_class, template_file, cache=None):
+    """Load template_file as a template_class, a DocxTemplate or CompiledTemplate."""
+    from .compiled_template import CompiledTemplate
+
+    # only CompiledTemplate has analysis worth caching
+    if cache is not None and issubclass(template_class, CompiledTemplate):
+        return template_class(template_file, cache=cache)
+    return template_class(template_file)
+
+
+def template_variables(tpl, template_file, jinja_env, cache=None):
+    """The undeclared variables of a loaded template, from the cache if given."""
+    # get_undeclared_template_variables reloads and walks the whole template, so is cached
+    if cache is None:
+        return tpl.get_undeclared_template_variables(jinja_env=jinja_env)
+    return set(cache.get(template_file, f"variables {env_signature(jinja_env)}",
+                         lambda: sorted(tpl.get_undeclared_template_variables(jinja_env=jinja_env))))
+
+
+def expected_variables(template_vars, output_filename, validators, expected_vars, jinja_env):
+    """The columns to look for: the template's variables, the output filename's and the validators'."""
+    output_filename_vars = core.filename_variables(str(output_filename), jinja_env)
+
+    variables = set(template_vars).union(output_filename_vars).union(validators.keys())
+    if expected_vars is not None:
+        for var in expected_vars: variables.add(var)
+    return variables
+
+
+def cancelled(cancel) -> bool:
+    """Whether a cancel= option, a threading.Event or None, has been set."""
+    return cancel is not None and cancel.is_set()
+
+
+# Per-process state for parallel generation, populated by _init_worker
+_worker = {}
+
+def _init_worker(template_class, template_filenames, jinja_env, post_processing, sink, cache=None):
+    # Each worker loads every template once and reuses them for all of its rows
+    from .document_generator import generate_doc, prepare_post_processing
+
+    _worker['generate_doc'] = generate_doc
+    _worker['templates'] = [load_template(template_class, f, cache) for f in template_filenames]
+    _worker['jinja_env'] = jinja_env
+    _worker['post_processing'] = [prepare_post_processing(post_processing, f, cache) for f in template_filenames]
+    _worker['sink'] = sink
+
+def _generate_chunk(task):
+    # Without a sink of its own the worker hands the documents back to the parent
+    template, chunk = task
+    documents = []
+    sink = _worker['sink'] or CallbackSink(lambda filename, data: documents.append((filename, data)))
+    stats = RunStats()
+
+    for row_data, filename in chunk:
+        _worker['generate_doc'](row_data,
+                                _worker['templates'][template],
+                                filename,
+                                jinja_env=_worker['jinja_env'],
+                                post_processing=_worker['post_processing'][template],
+                                sink=sink,
+                                stats=stats)
+    return documents, stats
+
+def _chunks(items, jobs, max_size=None, total=None):
+    # A few chunks per worker keeps the load balanced when some rows render slower
+    size = max(1, -(-(total or len(items)) // (jobs * 4)))
+    if max_size is not None:
+        size = min(size, max_size)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def _bounded_map(pool, func, items, window, cancel=None):
+    # Like pool.map, but with at most window tasks in flight so results can't pile up.
+    # Once cancelled no more tasks are submitted, but those in flight are finished.
+    pending = collections.deque()
+    for item in items:
+        if len(pending) >= window:
+            yield pending.popleft().result()
+        if cancelled(cancel):
+            break
+        pending.append(pool.submit(func, item))
+    while pending:
+        yield pending.popleft().result()
+
+
+def render_parallel(work, template_class, template_filenames, jinja_env, post_processing,
+                    sink, output, jobs, cache=None, cancel=None):
+    """
+    Render (row_data, filename) work items for several templates on one process pool.
+
+    Args:
+        work: A list of (template index, work items) pairs, indexing template_filenames.
+        sink: The sink documents are written to, FileSinks are written by the workers.
+        output: Where to write documents returned by the workers, sink or a QueuedSink.
+        cancel: Stop submitting chunks once cancel.is_set(), see generate().
+
+    Yields:
+        (index into work, chunk, RunStats) for each chunk of work items as it completes.
+    """
+    total = sum(len(items) for _, items in work)
+    jobs = min(jobs, total)
+
+    # workers can write files themselves, other sinks are written to from this process
+    worker_sink, max_size = (sink, None) if isinstance(sink, FileSink) else (None, 16)
+    tasks = [(i, (template, chunk)) for i, (template, items) in enumerate(work)
+             for chunk in _chunks(items, jobs, max_size, total)]
+
+    with ProcessPoolExecutor(max_workers=jobs,
+                             initializer=_init_worker,
+                             initargs=(template_class, template_filenames, jinja_env, post_processing, worker_sink, cache)) as pool:
+        results = _bounded_map(pool, _generate_chunk, [task for _, task in tasks], jobs * 2, cancel)
+        for (i, (template, chunk)), (documents, chunk_stats) in zip(tasks, results):
+            for filename, data in documents:
+                output.write(filename, data)
+            yield i, chunk, chunk_stats
+
+    logging.debug(f"Generated {total} documents using {jobs} workers.")
@@ -0,0 +1,209 @@
+"""Split one generate() run across several machines sharing the output directory.
+
+Every node runs generate() with the same arguments and its own shard=(index, count).
+Each node reads and validates the whole worksheet and renders every output filename,
+but only generates the documents whose filename hashes to its shard, so no two nodes
+write the same file whatever order the rows are in. The assignment depends only on
+the filename, not on Python's per-process hash() or the number of rows.
+
+Each shard writes a small completion manifest next to the documents, listing the
+documents it produced and a digest of every output the whole run expects.
+merge_shards() reads the manifests of all shards and checks that together they cover
+every expected output exactly once.
+"""
+
+import collections
+import hashlib
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+
+
+def shard_name(index: int, count: int) -> str:
+    """The filename of the completion manifest of shard index of count."""
+    return f".wmg_feedback_shard_{index}_of_{count}.json"
+
+
+def check_shard(shard) -> tuple:
+    """
+    Validate a shard=(index, count) option.
+
+    Raises:
+        ValueError: If count is not positive or index is not in range(count).
+    """
+    try:
+        index, count = (int(n) for n in shard)
+    except (TypeError, ValueError):
+        raise ValueError(f"A shard is an (index, count) pair, not {shard!r}.") from None
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard {index} of {count}, the index must be from 0 to count - 1.")
+    return index, count
+
+
+def shard_of(filename, count: int) -> int:
+    """The shard, from 0 to count - 1, generating the document saved as filename."""
+    digest = hashlib.sha256(str(filename).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count
+
+
+def _digest(filenames) -> str:
+    digest = hashlib.sha256()
+    for filename in sorted(filenames):
+        digest.update(filename.encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+class ShardManifest:
+    """
+    The outputs of one shard of a run, saved as its completion manifest.
+
+    Use assign() for the output filename of every validated row, in any shard, to find
+    the rows this shard generates, record() for each document it produces (or finds up
+    to date), and finish() to save the manifest.
+    """
+
+    def __init__(self, path, shard):
+        self.path = path
+        self.index, self.count = check_shard(shard)
+        self.expected = []
+        self.outputs = []
+
+    @classmethod
+    def for_output(cls, output_filename, shard):
+        """The manifest of a shard writing documents named by the output_filename pattern."""
+        index, count = check_shard(shard)
+        return cls(os.path.join(os.path.dirname(str(output_filename)) or ".", shard_name(index, count)),
+                   (index, count))
+
+    def assign(self, filename) -> bool:
+        """Note an output of the whole run and return True if this shard generates it."""
+        filename = str(filename)
+        self.expected.append(filename)
+        return shard_of(filename, self.count) == self.index
+
+    def record(self, filename):
+        """Record that this shard produced filename."""
+        self.outputs.append(str(filename))
+
+    def finish(self, complete: bool = True):
+        """
+        Save the manifest.
+
+        Args:
+            complete: False if the run stopped before generating all of its documents.
+        """
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"shard": [self.index, self.count],
+                       "complete": complete,
+                       "expected": {"count": len(self.expected), "digest": _digest(self.expected)},
+                       "outputs": self.outputs}, f, indent=1)
+        logging.info(f"Shard {self.index} of {self.count} produced {len(self.outputs)} "
+                     f"of {len(self.expected)} documents.")
+
+
+@dataclass
+class ShardMerge:
+    """
+    Whether the shards of a run together produced every document exactly once.
+
+    Attributes:
+        count: The number of shards.
+        outputs: Every document produced, from all shards.
+        expected: The number of documents the run should produce.
+        missing_shards: Shards with no manifest, i.e. that never finished.
+        incomplete: Shards that were cancelled part way through.
+        mismatched: Shards that expected a different set of outputs, e.g. run with other arguments.
+        duplicates: Documents produced more than once, mapped to the shards producing them.
+        missing: Expected documents no shard produced, if the expected outputs were given.
+        unexpected: Documents produced that were not expected, if the expected outputs were given.
+    """
+    count: int
+    outputs: list = field(default_factory=list)
+    expected: int = 0
+    missing_shards: list = field(default_factory=list)
+    incomplete: list = field(default_factory=list)
+    mismatched: list = field(default_factory=list)
+    duplicates: dict = field(default_factory=dict)
+    missing: list = field(default_factory=list)
+    unexpected: list = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        """True if every expected document was produced by exactly one shard."""
+        return not (self.missing_shards or self.incomplete or self.mismatched or self.duplicates
+                    or self.missing or self.unexpected) and len(self.outputs) == self.expected
+
+    def summary(self) -> str:
+        """A human readable report of the merge."""
+        lines = [f"Shards:            {self.count}",
+                 f"Documents:         {len(self.outputs)} of {self.expected} expected"]
+        if self.missing_shards:
+            lines.append(f"Shards not finished: {', '.join(map(str, self.missing_shards))}")
+        if self.incomplete:
+            lines.append(f"Shards cancelled: {', '.join(map(str, self.incomplete))}")
+        if self.mismatched:
+            lines.append(f"Shards run with different inputs: {', '.join(map(str, self.mismatched))}")
+        for filename, shards in self.duplicates.items():
+            lines.append(f"  {filename} produced by shards {', '.join(map(str, shards))}")
+        lines.extend(f"  missing {filename}" for filename in self.missing)
+        lines.extend(f"  unexpected {filename}" for filename in self.unexpected)
+        lines.append("All shards merged." if self.ok else "Shards do not cover the run exactly once.")
+        return "\n".join(lines)
+
+
+def merge_shards(directory, count: int, expected=None) -> ShardMerge:
+    """
+    Check the completion manifests of every shard of a run.
+
+    Args:
+        directory: The directory the shards wrote their manifests to, that of the output filenames.
+        count: The number of shards the run was split into.
+        expected: Optionally, every output filename the run should produce, e.g.
+            preflight(...).outputs, to check against rather than the digest recorded
+            by the shards.
+
+    Returns:
+        A ShardMerge, whose ok property is True if the shards produced every expected
+        document exactly once.
+    """
+    merge = ShardMerge(count=count)
+    producers = collections.defaultdict(list)
+    digests = {}
+
+    for index in range(count):
+        path = os.path.join(directory, shard_name(index, count))
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            merge.missing_shards.append(index)
+            continue
+        except ValueError:
+            logging.warning(f"Ignoring unreadable shard manifest: {path}")
+            merge.missing_shards.append(index)
+            continue
+
+        if not data.get("complete"):
+            merge.incomplete.append(index)
+        digests[index] = (data["expected"]["count"], data["expected"]["digest"])
+        for filename in data["outputs"]:
+            producers[filename].append(index)
+            merge.outputs.append(filename)
+
+    if expected is not None:
+        expected = [str(filename) for filename in expected]
+        reference = (len(expected), _digest(expected))
+    else:
+        # the shards should agree on the outputs of the whole run
+        reference = collections.Counter(digests.values()).most_common(1)[0][0] if digests else (0, None)
+    merge.expected = reference[0]
+    merge.mismatched = [index for index, digest in digests.items() if digest != reference]
+
+    merge.duplicates = {filename: shards for filename, shards in producers.items() if len(shards) > 1}
+    if expected is not None:
+        produced = set(producers)
+        merge.missing = sorted(set(expected) - produced)
+        merge.unexpected = sorted(produced - set(expected))
+    return merge
@@ -0,0 +1,266 @@
+"""Output sinks for generated documents.
+
+A sink decides where each generated document ends up. FileSink writes one file per
+document (the default), ZipSink streams every document into a single zip archive and
+CallbackSink hands the bytes of each document to a function, e.g. to upload them.
+QueuedSink wraps any of these to write from background threads while the next
+document is rendered.
+
+Documents are passed to the sink one at a time as they are generated, so memory use
+does not grow with the size of the cohort.
+
+Files are written under a temporary name in their final directory and renamed into
+place once complete, so a run that dies part way through never leaves a truncated
+document or archive behind, only complete ones and perhaps a hidden temporary file,
+e.g. .feedback_1234567.1f2e3d4c.docx.
+"""
+
+import abc
+import contextlib
+import os
+import queue
+import secrets
+import threading
+import zipfile
+from io import BytesIO
+
+
+def _temporary_name(filename) -> str:
+    # hidden, in the same directory so the final rename is atomic, unique per writer,
+    # and with the same extension, e.g. for post-processing that goes by it
+    directory, name = os.path.split(os.fspath(filename))
+    stem, ext = os.path.splitext(name)
+    return os.path.join(directory, f".{stem}.{secrets.token_hex(4)}{ext}")
+
+
+@contextlib.contextmanager
+def atomic_path(filename, fsync: bool = False):
+    """
+    Yield a temporary filename to write filename's contents to, renamed to filename after the block.
+
+    The temporary file is in the same directory, so the rename replaces filename in
+    one step: readers, and a later run after a crash, see either the old file or the
+    complete new one. If the block raises the temporary file is removed instead.
+
+    Args:
+        filename: The file to write.
+        fsync: Flush the file to disk before renaming it, so it also survives a power cut.
+    """
+    tmp = _temporary_name(filename)
+    try:
+        yield tmp
+        if fsync:
+            fd = os.open(tmp, os.O_RDWR)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        os.replace(tmp, filename)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp)
+        raise
+
+
+class Sink(abc.ABC):
+    """
+    Base class for output sinks.
+
+    Subclasses must implement write(), and can override save() if they can save a rendered
+    template more directly than via its bytes. A sink that builds its output from the
+    rendered template itself can also provide append(template, row_data,
+    post_processing, stats), which generate_doc() then calls instead of post-processing
+    and saving the document, see CombinedSink. Sinks can be used as context managers
+    to make sure they are closed. bytes_written counts the size of everything written.
+    """
+
+    bytes_written = 0
+
+    def save(self, filename, template):
+        """Save a rendered DocxTemplate (or python-docx Document) as filename."""
+        buffer = BytesIO()
+        template.save(buffer)
+        self.write(filename, buffer.getvalue())
+
+    @abc.abstractmethod
+    def write(self, filename, data: bytes):
+        """Store the bytes of a generated document as filename."""
+
+    def close(self):
+        """Finish writing, called once all documents have been saved."""
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class FileSink(Sink):
+    """
+    Write each document to its own file, creating directories as needed.
+
+    Each file is written atomically, see atomic_path. With fsync=True every document
+    is also flushed to disk before it is renamed into place, which is slower.
+    """
+
+    def __init__(self, fsync: bool = False):
+        self.fsync = fsync
+        self._created = set()
+        self._lock = threading.Lock() # documents may be written from QueuedSink threads
+
+    def __getstate__(self):
+        # worker processes get their own sink, and lock
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _makedirs(self, filename):
+        if not isinstance(filename, (str, os.PathLike)): # writable file object
+            return
+        directory = os.path.dirname(filename)
+        if directory and directory not in self._created:
+            os.makedirs(directory, exist_ok=True)
+            self._created.add(directory)
+
+    @contextlib.contextmanager
+    def replacing(self, filename):
+        """Yield a temporary filename whose contents become filename after the block, see atomic_path."""
+        self._makedirs(filename)
+        with atomic_path(filename, self.fsync) as tmp:
+            yield tmp
+        size = os.path.getsize(filename)
+        with self._lock:
+            self.bytes_written += size
+
+    def save(self, filename, template):
+        if not isinstance(filename, (str, os.PathLike)): # writable file object
+            template.save(filename)
+            return
+        with self.replacing(filename) as tmp:
+            template.save(tmp)
+
+    def write(self, filename, data: bytes):
+        with self.replacing(filename) as tmp:
+            with open(tmp, "wb") as f:
+                f.write(data)
+
+
+class ZipSink(Sink):
+    """
+    Stream every document into a single zip archive.
+
+    The generated filename is used as the name within the archive. Documents are stored
+    without further compression by default, as .docx files are already compressed.
+    The archive is written under a temporary name and renamed to path when the sink
+    is closed.
+    """
+
+    def __init__(self, path, compression=zipfile.ZIP_STORED):
+        self.path = path
+        self._tmp = _temporary_name(path) if isinstance(path, (str, os.PathLike)) else None
+        self._zip = zipfile.ZipFile(self._tmp or path, "w", compression=compression)
+
+    def write(self, filename, data: bytes):
+        self._zip.writestr(str(filename).replace(os.sep, "/"), data)
+        self.bytes_written += len(data)
+
+    def close(self):
+        if self._zip.fp is None: # already closed
+            return
+        self._zip.close()
+        if self._tmp is not None:
+            os.replace(self._tmp, self.path)
+
+
+class CallbackSink(Sink):
+    """Pass the filename and bytes of each document to callback(filename, data)."""
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def write(self, filename, data: bytes):
+        self.callback(filename, data)
+        self.bytes_written += len(data)
+
+
+class QueuedSink(Sink):
+    """
+    Write documents to another sink from a pool of writer threads.
+
+    save() renders the document to bytes in the calling thread and puts them on a
+    bounded queue, which the writer threads drain into the wrapped sink. Rendering the
+    next document then overlaps with writing the previous ones, and the queue bound
+    caps the memory used by documents waiting to be written.
+
+    Errors raised by the wrapped sink are re-raised by the next save() or write(), and
+    by close(). Closing a QueuedSink waits for all queued documents to be written but
+    does not close the wrapped sink.
+
+    The optional written function is called with each filename once the wrapped sink
+    has written it, from the writer thread.
+    """
+
+    def __init__(self, sink: Sink, writers: int = 4, queue_size: int = None, written=None):
+        self.sink = sink
+        self.written = written
+        self._queue = queue.Queue(maxsize=queue_size or writers * 4)
+        # only FileSink can be written to from several threads at once
+        self._lock = None if isinstance(sink, FileSink) else threading.Lock()
+        self._error = None
+        self._closed = False
+        self._threads = [threading.Thread(target=self._writer, daemon=True) for _ in range(writers)]
+        for thread in self._threads:
+            thread.start()
+
+    def _writer(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self._error is not None: # keep draining so save() never blocks
+                continue
+            try:
+                if self._lock is None:
+                    self.sink.write(*item)
+                else:
+                    with self._lock:
+                        self.sink.write(*item)
+                if self.written is not None:
+                    self.written(item[0])
+            except BaseException as e:
+                self._error = e
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def write(self, filename, data: bytes):
+        self._raise_error()
+        if self._closed:
+            raise ValueError("write to closed QueuedSink")
+        self._queue.put((filename, data))
+        self.bytes_written += len(data)
+
+    def _stop(self):
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def close(self):
+        """Wait for every queued document to be written, re-raising any write error."""
+        self._stop()
+        self._raise_error()
+
+    def abort(self):
+        """Stop the writer threads without reporting errors, e.g. when already handling one."""
+        self._stop()
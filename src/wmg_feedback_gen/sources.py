@@ -0,0 +1,168 @@
+"""Row sources: the worksheet, CSV file or JSON-lines file student data is read from.
+
+process_to_dicts and find_columns only need an object with an openpyxl style
+iter_rows(values_only=True) method yielding a tuple of values per row. Besides
+openpyxl worksheets, CsvSource and JsonLinesSource stream rows from exports that
+don't need a spreadsheet parser at all, which is much faster to start up for large
+cohorts. open_source picks the reader from the file extension.
+
+The header can be anywhere in the file, as for worksheets, and rows are validated and
+rendered exactly as worksheet rows are.
+"""
+
+import abc
+import csv
+import json
+import os
+import re
+
+CSV_EXTENSIONS = (".csv",)
+JSON_LINES_EXTENSIONS = (".jsonl", ".ndjson")
+
+_integer = re.compile(r"[-+]?(0|[1-9][0-9]*)$")
+_decimal = re.compile(r"[-+]?(([0-9]+\.[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?|[0-9]+[eE][-+]?[0-9]+)$")
+
+
+def convert_value(value: str):
+    """
+    Convert a CSV field to the value a worksheet cell would hold.
+
+    Empty fields become None and numbers become int or float, as they do when the
+    same data is typed into Excel. Numbers with leading zeros, like some student IDs,
+    are kept as text.
+    """
+    if not value:
+        return None
+    if value[0] in "0123456789+-.":
+        if _integer.match(value):
+            return int(value)
+        if _decimal.match(value):
+            return float(value)
+    return value
+
+
+class RowSource(abc.ABC):
+    """
+    Base class for row sources.
+
+    Subclasses must implement iter_rows(). Sources can be used as context managers to make
+    sure they are closed.
+    """
+
+    @abc.abstractmethod
+    def iter_rows(self, values_only=True):
+        """Yield a tuple of cell values for each row, like openpyxl's Worksheet.iter_rows."""
+
+    def close(self):
+        """Release any open files."""
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class WorksheetSource(RowSource):
+    """A worksheet of an Excel workbook, read with openpyxl."""
+
+    def __init__(self, filename, worksheet="marks", read_only=True):
+        import openpyxl
+
+        self.workbook = openpyxl.load_workbook(filename, data_only=True, read_only=read_only)
+        try:
+            self.sheet = self.workbook[worksheet]
+        except KeyError:
+            self.workbook.close()
+            raise
+
+    def iter_rows(self, values_only=True):
+        return self.sheet.iter_rows(values_only=values_only)
+
+    def worksheet(self, name):
+        """Another worksheet of the same, already open, workbook."""
+        return self.workbook[name]
+
+    def close(self):
+        # read-only workbooks keep the file open until closed
+        self.workbook.close()
+
+
+class CsvSource(RowSource):
+    """
+    Stream rows from a CSV file.
+
+    Args:
+        filename: The CSV file to read.
+        encoding: Text encoding, the default also removes the byte order mark Excel adds.
+        convert: Convert fields to None, int or float as a worksheet would, see convert_value.
+        **fmtparams: Passed to csv.reader, e.g. delimiter=";".
+    """
+
+    def __init__(self, filename, encoding="utf-8-sig", convert=True, **fmtparams):
+        self.filename = filename
+        self.encoding = encoding
+        self.convert = convert
+        self.fmtparams = fmtparams
+
+    def iter_rows(self, values_only=True):
+        with open(self.filename, newline="", encoding=self.encoding) as f:
+            for row in csv.reader(f, **self.fmtparams):
+                if self.convert:
+                    yield tuple(map(convert_value, row))
+                else:
+                    yield tuple(row)
+
+
+class JsonLinesSource(RowSource):
+    """
+    Stream rows from a JSON-lines file, one JSON value per line.
+
+    Lines holding arrays are rows of cell values, like the rows of a CSV file. Lines
+    holding objects are records: the keys of the first record become a header row and
+    each record is a row of its values in that order, with None for missing keys.
+    Blank lines are skipped.
+    """
+
+    def __init__(self, filename, encoding="utf-8"):
+        self.filename = filename
+        self.encoding = encoding
+
+    def iter_rows(self, values_only=True):
+        header = None
+        with open(self.filename, encoding=self.encoding) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                value = json.loads(line)
+                if isinstance(value, dict):
+                    if header is None:
+                        header = tuple(value)
+                        yield header
+                    yield tuple(value.get(key) for key in header)
+                elif isinstance(value, list):
+                    yield tuple(value)
+                else:
+                    yield (value,)
+
+
+def open_source(filename, worksheet="marks", read_only=True) -> RowSource:
+    """
+    Open the rows of a workbook worksheet, CSV or JSON-lines file.
+
+    Args:
+        filename: The file to read. .csv files are read with CsvSource, .jsonl and
+            .ndjson with JsonLinesSource and anything else as an Excel workbook.
+        worksheet: The worksheet to read from a workbook, ignored for other files.
+        read_only: Stream the worksheet rather than loading the whole workbook.
+
+    Returns:
+        A RowSource, to be closed once its rows have been read.
+    """
+    extension = os.path.splitext(str(filename))[1].lower()
+    if extension in CSV_EXTENSIONS:
+        return CsvSource(filename)
+    if extension in JSON_LINES_EXTENSIONS:
+        return JsonLinesSource(filename)
+    return WorksheetSource(filename, worksheet, read_only)
@@ -0,0 +1,106 @@
+"""Run statistics and per-stage timing for feedback generation."""
+
+import contextlib
+import time
+from dataclasses import dataclass, field
+
+# Stages timed by generate(), in pipeline order
+STAGES = [
+    "load",             # opening the workbook
+    "template",         # loading the template and extracting its variables
+    "columns",          # finding the header columns
+    "validation",       # extracting and validating row data
+    "filename",         # rendering output filenames
+    "render",           # rendering the template
+    "post_processing",  # post-processing the rendered document
+    "save",             # writing the document to the sink
+]
+
+
+@dataclass
+class RunStats:
+    """
+    Statistics for a generate() run.
+
+    Attributes:
+        rows_read: Rows read from the worksheet, including header and rejected rows.
+        rows_rejected: Rows that did not pass validation.
+        rejected: (row_data, reason) for each rejected row.
+        documents_written: Documents generated and written to the sink.
+        bytes_written: Total size of the documents written.
+        skipped: Documents that were up to date, for incremental runs.
+        removed: Documents from a previous run that were removed, for incremental runs.
+        resumed: Documents already completed by an interrupted run, for resumed runs.
+        cancelled: Whether the run was cancelled before every document was generated.
+        timings: Cumulative seconds spent in each stage, see STAGES.
+    """
+    rows_read: int = 0
+    rows_rejected: int = 0
+    rejected: list = field(default_factory=list)
+    documents_written: int = 0
+    bytes_written: int = 0
+    skipped: int = 0
+    removed: int = 0
+    resumed: int = 0
+    cancelled: bool = False
+    timings: dict = field(default_factory=dict)
+
+    @contextlib.contextmanager
+    def time(self, stage: str):
+        """Context manager adding the time spent inside it to the given stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def add_time(self, stage: str, seconds: float):
+        """Add seconds to the cumulative time for stage."""
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def reject(self, row_data: dict, reason: str):
+        """Record a rejected row."""
+        self.rows_rejected += 1
+        self.rejected.append((row_data, reason))
+
+    def merge(self, other: "RunStats"):
+        """Add the counts and timings from another RunStats, e.g. from a worker process."""
+        self.rows_read += other.rows_read
+        self.rows_rejected += other.rows_rejected
+        self.rejected.extend(other.rejected)
+        self.documents_written += other.documents_written
+        self.bytes_written += other.bytes_written
+        self.skipped += other.skipped
+        self.removed += other.removed
+        self.resumed += other.resumed
+        self.cancelled = self.cancelled or other.cancelled
+        for stage, seconds in other.timings.items():
+            self.add_time(stage, seconds)
+
+    def summary(self) -> str:
+        """A human readable summary of the run."""
+        lines = [
+            f"Rows read:         {self.rows_read}",
+            f"Rows rejected:     {self.rows_rejected}",
+            f"Documents written: {self.documents_written} ({self.bytes_written / 2**20:.1f} MB)",
+        ]
+        if self.skipped or self.removed:
+            lines.append(f"Documents skipped: {self.skipped}, removed: {self.removed}")
+        if self.resumed:
+            lines.append(f"Documents resumed: {self.resumed}")
+        if self.cancelled:
+            lines.append("Run cancelled before all documents were generated.")
+
+        lines.append("Time per stage (cumulative across workers):")
+        stages = STAGES + [s for s in self.timings if s not in STAGES]
+        for stage in stages:
+            if stage in self.timings:
+                lines.append(f"  {stage:<16} {self.timings[stage]:9.3f}s")
+        return "\n".join(lines)
+
+
+def timed(stats, stage: str):
+    """stats.time(stage), or a context manager that does nothing if stats is None."""
+    if stats is None:
+        return contextlib.nullcontext()
+    return stats.time(stage)
@@ -0,0 +1,251 @@
+"""Regenerate feedback as the marks workbook is edited.
+
+During marking the workbook is saved over and over, and running generate() after each
+save reloads the template and renders every student again. A Watcher keeps the
+template, its variables, the post-processing function and the column mapping loaded,
+polls the workbook and template for changes, and on each save re-reads only the
+worksheet. The rows are compared by student ID with those of the previous read, and
+only the students whose row data changed are rendered again, so a save that touches a
+few students is reflected in well under a second.
+
+    watcher = Watcher("marks.xlsx", "template.docx")
+    watcher.run()   # until Ctrl-C, or cancel.set() from another thread
+"""
+
+import logging
+import os
+import time
+
+from docxtpl import DocxTemplate
+
+from . import core
+from .compiled_template import CompiledTemplate
+from .document_generator import default_hightlight, generate_doc, prepare_post_processing
+from .manifest import row_hash
+from .rendering import (
+    VALIDATION_BATCH_SIZE,
+    expected_variables,
+    load_template,
+    resolve_cache,
+    template_variables
+)
+from .sinks import FileSink, Sink
+from .sources import open_source
+from .stats import RunStats
+
+
+def _stamp(filename):
+    # changes whenever the file is saved, None while it is missing, e.g. mid-save
+    try:
+        st = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _is_header(row, columns) -> bool:
+    # whether row is the header row the column mapping was found in
+    return all(idx < len(row) and str(row[idx]).strip() == var
+               for var, idx in columns.items() if idx is not None)
+
+
+class Watcher:
+    """
+    Keep a generate() run loaded and regenerate the students whose rows change.
+
+    The arguments are those of generate(), plus key, the column identifying each
+    student. Call update() to bring the documents up to date once, poll() to update
+    if the workbook or template has been saved since, or run() to keep polling.
+
+    Attributes:
+        snapshot: (row data hash, output filename) of each student from the last read, by
+            key. The filename is None for a student whose document couldn't be generated.
+    """
+
+    def __init__(self,
+                 xlsx_filename: str,
+                 template_filename: str,
+                 worksheet: str = "marks",
+                 output_filename: str = "feedback/feedback_{{STUDENTID}}.docx",
+                 validators: dict = core.default_validators,
+                 jinga_env=None,
+                 post_processing=default_hightlight,
+                 expected_vars=None,
+                 key: str = "STUDENTID",
+                 sink: Sink = None,
+                 precompile: bool = True,
+                 progress=None,
+                 cache=False):
+        self.xlsx_filename = xlsx_filename
+        self.template_filename = template_filename
+        self.worksheet = worksheet
+        self.output_filename = output_filename
+        self.validators = validators if validators is not None else {}
+        self.jinja_env = jinga_env if jinga_env is not None else core.default_jinja_env()
+        self.post_processing = post_processing
+        self.expected_vars = set(expected_vars or ()) | {key}
+        self.key = key
+        self.sink = sink if sink is not None else FileSink()
+        self.precompile = precompile
+        self.progress = progress
+        self.cache = resolve_cache(cache)
+
+        self.snapshot = {}
+        self._template = None
+        self._stamps = (None, None)
+
+    def _notify(self, event, stats, detail=None):
+        if self.progress is not None:
+            self.progress(event, stats, detail)
+
+    def load_template(self, stats: RunStats = None):
+        """(Re)load the template, its variables and post-processing, and forget the previous rows."""
+        stats = stats or RunStats()
+        with stats.time("template"):
+            template_class = CompiledTemplate if self.precompile else DocxTemplate
+            template = load_template(template_class, self.template_filename, self.cache)
+            template_vars = template_variables(template, self.template_filename, self.jinja_env, self.cache)
+            variables = expected_variables(template_vars, self.output_filename, self.validators,
+                                           self.expected_vars, self.jinja_env)
+            hook = prepare_post_processing(self.post_processing, self.template_filename, self.cache)
+        # only replaced once the new template has loaded, a template caught mid-save keeps the old one
+        self._template, self.variables, self._hook = template, variables, hook
+        self._columns = None
+        self._header = None
+        # every document depends on the template, so all are rendered again. The
+        # filenames are kept, so the documents of students removed since are deleted
+        self.snapshot = {key: (None, filename) for key, (_, filename) in self.snapshot.items()}
+
+    def _read(self, stats):
+        # the validated rows of the worksheet, reusing the column mapping while the header stays put
+        with stats.time("load"):
+            source = open_source(self.xlsx_filename, self.worksheet)
+            try:
+                rows = list(source.iter_rows(values_only=True))
+            finally:
+                source.close()
+        stats.rows_read += len(rows)
+
+        if self._header is None or self._header >= len(rows) or not _is_header(rows[self._header], self._columns):
+            with stats.time("columns"):
+                self._columns, _ = core.find_header(rows, self.variables)
+                self._header = next((i for i, row in enumerate(rows) if _is_header(row, self._columns)), None)
+            logging.debug(f"Watching columns: {self._columns}")
+
+        # process_rows takes the rows below the header, as find_header would return them
+        start = 0 if self._header is None else self._header + 1
+        return list(core.process_rows(iter(rows[start:]), self.variables, self.validators, stats,
+                                      batch_size=VALIDATION_BATCH_SIZE, columns=self._columns))
+
+    def update(self) -> RunStats:
+        """
+        Re-read the worksheet and regenerate the documents of students whose rows changed.
+
+        Students whose row data is the same as at the previous update are skipped. The
+        documents of students no longer in the worksheet, or whose output filename
+        changed, are removed when writing files.
+
+        A student whose document can't be generated is logged and not retried until
+        their row (or the template) changes, so one bad row doesn't make every poll
+        render it again. The snapshot is only replaced once the update completes.
+
+        Returns:
+            RunStats for this update: documents written, skipped and removed.
+        """
+        stats = RunStats()
+        if self._template is None:
+            self.load_template(stats)
+
+        rows = {}
+        for row_data in self._read(stats):
+            key = row_data.get(self.key)
+            if key in rows:
+                logging.warning(f"Duplicate {self.key} {key!r}, only its last row is used.")
+            rows[key] = (row_hash(row_data), row_data)
+
+        previous = self.snapshot
+        snapshot = {}
+        for key, (digest, row_data) in rows.items():
+            old = previous.get(key)
+            if old is not None and old[0] == digest:
+                snapshot[key] = old
+                stats.skipped += 1
+                continue
+
+            try:
+                with stats.time("filename"):
+                    filename = core.gen_filename(self.output_filename, row_data, self.jinja_env)
+                generate_doc(row_data, self._template, filename, jinja_env=self.jinja_env,
+                             post_processing=self._hook, sink=self.sink, stats=stats)
+            except Exception as e:
+                logging.warning(f"Could not generate the document for {self.key} {key!r}: {e}")
+                # recorded with this row's hash, keeping any previous document to remove later
+                snapshot[key] = (digest, old[1] if old is not None else None)
+                continue
+            snapshot[key] = (digest, filename)
+            self._notify("document", stats, filename)
+
+            if old is not None and old[1] not in (None, filename):
+                self._remove(old[1], stats)
+
+        for key in previous.keys() - rows.keys():
+            if previous[key][1] is not None:
+                self._remove(previous[key][1], stats)
+
+        self.snapshot = snapshot
+        self._notify("updated", stats)
+        return stats
+
+    def _remove(self, filename, stats):
+        if not isinstance(self.sink, FileSink):
+            return
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            logging.warning(f"Could not remove {filename}: {e}")
+            return
+        stats.removed += 1
+        self._notify("removed", stats, filename)
+
+    def poll(self) -> RunStats:
+        """
+        Update if the workbook or template has been saved since the last update.
+
+        Returns:
+            The RunStats of the update, or None if nothing changed or the workbook could
+            not be read yet, e.g. while it is being saved, in which case the next poll
+            tries again.
+        """
+        stamps = (_stamp(self.xlsx_filename), _stamp(self.template_filename))
+        if stamps == self._stamps or None in stamps:
+            return None
+
+        try:
+            if stamps[1] != self._stamps[1]:
+                self.load_template()
+            stats = self.update()
+        except Exception as e:
+            logging.warning(f"Could not update from {self.xlsx_filename}, retrying: {e}")
+            return None
+        self._stamps = stamps
+        return stats
+
+    def run(self, interval: float = 0.5, cancel=None):
+        """
+        Poll for changes every interval seconds until cancel is set or Ctrl-C is pressed.
+
+        Args:
+            interval: Seconds between checks of the files' modification times.
+            cancel: An optional threading.Event (or anything with is_set()) to stop watching.
+        """
+        try:
+            while cancel is None or not cancel.is_set():
+                self.poll()
+                if cancel is not None:
+                    cancel.wait(interval)
+                else:
+                    time.sleep(interval)
+        except KeyboardInterrupt:
+            logging.info("Stopped watching.")
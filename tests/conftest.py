@@ -0,0 +1,88 @@
+"""Shared fixtures for building small workbooks and feedback templates."""
+
+import openpyxl
+import pytest
+from docx import Document
+
+CATEGORIES = ["OUTSTANDING", "DISTINCTION", "GOOD", "PASS", "MARGINAL", "FAIL"]
+
+HEADER = ["NAME", "STUDENTID", "FEEDBACK", "LO2", "LO3"]
+
+ROWS = [
+    ["Ada Lovelace", 1234561, "Excellent work.", 85, 72],
+    ["Alan Turing", 1234562, "Good effort.", 65, 55],
+    ["Grace Hopper", 1234563, "Needs work.", 45, 30],
+    ["Not A Student", "n/a", "Should be rejected.", 50, 50],
+]
+
+
+def build_workbook(path, rows=ROWS, header=HEADER, worksheet="marks"):
+    """Write a workbook with a title row, a header row and the given data rows."""
+    wb = openpyxl.Workbook()
+    wb.active.title = "participants"
+    ws = wb.create_sheet(worksheet)
+    ws.append(["Module marks"])
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+    return path
+
+
+def build_template(path, learning_outcomes=("LO2", "LO3"), category_fields=False):
+    """
+    Write a WMG style template with a 9 cell grading table.
+
+    With category_fields the comments use the precomputed {{LO2_category}} fields
+    rather than the mark_category filter.
+    """
+    doc = Document()
+    doc.add_paragraph("Feedback for {{NAME}} ({{STUDENTID}})")
+    doc.add_paragraph("{{FEEDBACK}}")
+
+    table = doc.add_table(rows=1 + len(learning_outcomes), cols=9)
+    header = ["KSB", "Learning Outcome", "Comments"] + [c.title() for c in CATEGORIES]
+    for cell, text in zip(table.rows[0].cells, header):
+        cell.text = text
+
+    for row, lo in zip(table.rows[1:], learning_outcomes):
+        row.cells[1].text = lo
+        category = f"{lo}_category" if category_fields else f"{lo} | mark_category"
+        row.cells[2].text = f"Comments\nMark: {{{{{lo}}}}}\n{{{{{category}}}}}"
+        for cell, category in zip(row.cells[3:9], CATEGORIES):
+            cell.text = f"{category.title()} descriptor"
+
+    doc.save(path)
+    return path
+
+
+@pytest.fixture(autouse=True)
+def template_cache_dir(tmp_path, monkeypatch):
+    """Keep the template analysis cache of each test in its own directory."""
+    directory = tmp_path / "template_cache"
+    monkeypatch.setenv("WMG_FEEDBACK_CACHE", str(directory))
+    return directory
+
+
+@pytest.fixture
+def marks_workbook(tmp_path):
+    return build_workbook(tmp_path / "marks.xlsx")
+
+
+@pytest.fixture
+def feedback_template(tmp_path):
+    return build_template(tmp_path / "template.docx")
+
+
+def highlighted_categories(filename):
+    """Return the categories highlighted in the grading table of a document."""
+    found = []
+    for table in Document(filename).tables:
+        for row in table.rows:
+            if len(row.cells) != 9:
+                continue
+            for cell, category in zip(row.cells[3:9], CATEGORIES):
+                runs = [r for p in cell.paragraphs for r in p.runs]
+                if runs and all(r.font.highlight_color is not None for r in runs):
+                    found.append(category)
+    return found
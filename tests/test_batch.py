@@ -0,0 +1,84 @@
+"""Tests for batch generation over several worksheets, workbooks and templates."""
+
+import os
+
+import openpyxl
+
+import wmg_feedback_gen.batch as batch
+from wmg_feedback_gen.batch import BatchEntry, generate_batch
+from wmg_feedback_gen.compiled_template import CompiledTemplate
+
+from .conftest import HEADER, ROWS, build_template, build_workbook, highlighted_categories
+
+
+def _two_sheet_workbook(path):
+    wb = openpyxl.Workbook()
+    for name, rows in (("exam", ROWS[:2]), ("coursework", ROWS[2:])):
+        ws = wb.create_sheet(name)
+        ws.append(HEADER)
+        for row in rows:
+            ws.append(row)
+    wb.save(path)
+    return path
+
+
+def _entries(tmp_path, out):
+    modules = _two_sheet_workbook(tmp_path / "modules.xlsx")
+    marks = build_workbook(tmp_path / "marks.xlsx")
+    template = build_template(tmp_path / "template.docx")
+    other = build_template(tmp_path / "other.docx", learning_outcomes=("LO3",))
+    return [
+        (modules, "exam", template, str(out / "exam" / "{{STUDENTID}}.docx")),
+        (modules, "coursework", template, str(out / "coursework" / "{{STUDENTID}}.docx")),
+        BatchEntry(marks, "marks", other, str(out / "marks" / "{{STUDENTID}}.docx")),
+    ]
+
+
+def _outputs(out):
+    return sorted(os.path.relpath(os.path.join(d, f), out) for d, _, files in os.walk(out) for f in files)
+
+
+def test_generate_batch(tmp_path, monkeypatch):
+    loaded = []
+    opened = []
+
+    class CountingTemplate(CompiledTemplate):
+        def __init__(self, template_file, **kwargs):
+            loaded.append(template_file)
+            super().__init__(template_file, **kwargs)
+
+    def open_source(filename, *args, _open_source=batch.open_source):
+        opened.append(filename)
+        return _open_source(filename, *args)
+
+    monkeypatch.setattr(batch, "CompiledTemplate", CountingTemplate)
+    monkeypatch.setattr(batch, "open_source", open_source)
+
+    out = tmp_path / "out"
+    report = generate_batch(_entries(tmp_path, out))
+
+    assert len(loaded) == 2
+    assert len(opened) == 2
+    assert _outputs(out) == [os.path.join("coursework", "1234563.docx"),
+                             os.path.join("exam", "1234561.docx"),
+                             os.path.join("exam", "1234562.docx"),
+                             os.path.join("marks", "1234561.docx"),
+                             os.path.join("marks", "1234562.docx"),
+                             os.path.join("marks", "1234563.docx")]
+    assert [stats.documents_written for _, stats in report.entries] == [2, 1, 3]
+    assert report.total.documents_written == 6
+    # the three header rows, both "n/a" rows and the title row of marks.xlsx
+    assert report.total.rows_rejected == 6
+    assert highlighted_categories(out / "marks" / "1234561.docx") == ["DISTINCTION"]
+    assert "Documents per entry" in report.summary()
+
+
+def test_parallel_matches_serial(tmp_path):
+    serial = generate_batch(_entries(tmp_path, tmp_path / "serial"))
+    events = []
+    parallel = generate_batch(_entries(tmp_path, tmp_path / "parallel"), jobs=2,
+                              progress=lambda event, stats, detail: events.append(event))
+
+    assert _outputs(tmp_path / "serial") == _outputs(tmp_path / "parallel")
+    assert [s.documents_written for _, s in parallel.entries] == [s.documents_written for _, s in serial.entries]
+    assert events == ["document"] * 6 + ["finished"]
@@ -0,0 +1,106 @@
+"""Tests for the persistent template analysis cache."""
+
+import json
+import os
+
+from wmg_feedback_gen.cache import TemplateCache, _library_versions, default_cache_dir, template_key
+from wmg_feedback_gen.compiled_template import CompiledTemplate
+from wmg_feedback_gen.core import default_jinja_env
+from wmg_feedback_gen.document_generator import _index_template, generate
+
+from .conftest import build_template, highlighted_categories
+
+
+class TestTemplateCache:
+
+    def test_get_computes_once(self, tmp_path, feedback_template):
+        cache = TemplateCache(tmp_path / "cache")
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return ["A", "B"]
+
+        assert cache.get(feedback_template, "variables", compute) == ["A", "B"]
+        assert cache.get(feedback_template, "variables", compute) == ["A", "B"]
+        # a new cache, e.g. in a later run, reads the stored value
+        assert TemplateCache(tmp_path / "cache").get(feedback_template, "variables", compute) == ["A", "B"]
+        assert len(calls) == 1
+
+    def test_invalidated_by_template_change(self, tmp_path):
+        cache = TemplateCache(tmp_path / "cache")
+        template = build_template(tmp_path / "template.docx")
+        before = template_key(template)
+        assert cache.get(template, "value", lambda: 1) == 1
+
+        build_template(template, learning_outcomes=("LO2",))
+        assert template_key(template) != before
+        assert cache.get(template, "value", lambda: 2) == 2
+
+    def test_key_includes_versions(self, monkeypatch, feedback_template):
+        before = template_key(feedback_template)
+        for module in ("wmg_feedback_gen", "docxtpl", "docx"):
+            # an upgrade of any of them may change the analysis
+            _library_versions.cache_clear()
+            monkeypatch.setattr(f"{module}.__version__", "0.0.0-test")
+            assert template_key(feedback_template) != before
+            monkeypatch.undo()
+        _library_versions.cache_clear()
+        assert template_key(feedback_template) == before
+
+    def test_unreadable_cache_ignored(self, tmp_path, feedback_template):
+        cache = TemplateCache(tmp_path / "cache")
+        os.makedirs(cache.directory)
+        with open(cache.path(template_key(feedback_template)), "w") as f:
+            f.write("{not json")
+        assert cache.get(feedback_template, "value", lambda: 3) == 3
+
+    def test_default_dir(self, template_cache_dir):
+        assert default_cache_dir() == str(template_cache_dir)
+
+
+def test_compiled_template_from_cache(tmp_path, feedback_template):
+    cache = TemplateCache(tmp_path / "cache")
+    row_data = {"NAME": "Ada", "STUDENTID": 1234561, "FEEDBACK": "Well done.", "LO2": 85, "LO3": 72}
+    env = default_jinja_env()
+
+    rendered = []
+    for _ in range(2): # computes, then reads the analysis back from disk
+        tpl = CompiledTemplate(feedback_template, cache=TemplateCache(cache.directory))
+        tpl.render(row_data, jinja_env=env)
+        rendered.append([p.text for p in tpl.docx.paragraphs])
+
+    assert rendered[0] == rendered[1]
+    assert "Feedback for Ada (1234561)" in rendered[1]
+
+
+def test_grading_index_from_cache(tmp_path, feedback_template):
+    cache = TemplateCache(tmp_path / "cache")
+    first = _index_template(feedback_template, cache=cache).index
+    second = _index_template(feedback_template, cache=TemplateCache(cache.directory)).index
+    assert second.items == first.items
+    assert second.shape == first.shape
+
+
+def test_generate_uses_cache(tmp_path, marks_workbook, feedback_template, template_cache_dir):
+    output = str(tmp_path / "out" / "feedback_{{STUDENTID}}.docx")
+    generate(marks_workbook, feedback_template, output_filename=output, cache=True)
+
+    [entry] = os.listdir(template_cache_dir)
+    with open(template_cache_dir / entry) as f:
+        analysis = json.load(f)
+    assert {"compiled_template", "grading_rows"} <= set(analysis)
+    variables = [value for name, value in analysis.items() if name.startswith("variables")]
+    assert variables == [["FEEDBACK", "LO2", "LO3", "NAME", "STUDENTID"]]
+
+    # a second run, from the cache, gives the same documents
+    generate(marks_workbook, feedback_template, output_filename=output, cache=True)
+    assert highlighted_categories(tmp_path / "out" / "feedback_1234561.docx") == ["OUTSTANDING", "DISTINCTION"]
+
+    generate(marks_workbook, feedback_template, output_filename=output, cache=False)
+    assert len(os.listdir(template_cache_dir)) == 1
+
+
+def test_not_used_by_default(tmp_path, marks_workbook, feedback_template, template_cache_dir):
+    generate(marks_workbook, feedback_template, output_filename=str(tmp_path / "out" / "{{STUDENTID}}.docx"))
+    assert not os.path.exists(template_cache_dir)
@@ -0,0 +1,81 @@
+"""Tests for the wmg-feedback command line interface."""
+
+import os
+import zipfile
+
+import pytest
+
+from wmg_feedback_gen.cli import main
+
+from .conftest import highlighted_categories
+
+
+def _run(tmp_path, marks_workbook, feedback_template, *args):
+    output = str(tmp_path / "out" / "feedback_{{STUDENTID}}.docx")
+    return main([str(marks_workbook), str(feedback_template), "-o", output, *args])
+
+
+def test_generate(tmp_path, marks_workbook, feedback_template, capsys):
+    assert _run(tmp_path, marks_workbook, feedback_template) == 0
+    assert sorted(os.listdir(tmp_path / "out")) == \
+        ["feedback_1234561.docx", "feedback_1234562.docx", "feedback_1234563.docx"]
+    assert highlighted_categories(tmp_path / "out" / "feedback_1234561.docx") == ["OUTSTANDING", "DISTINCTION"]
+    assert "Generated 3 documents" in capsys.readouterr().out
+
+
+def test_options(tmp_path, marks_workbook, feedback_template):
+    assert _run(tmp_path, marks_workbook, feedback_template,
+                "--no-validators", "--no-highlight", "--jobs", "2", "--no-cache", "-q") == 0
+    # without validators the title, header and n/a rows give documents too
+    assert len(os.listdir(tmp_path / "out")) == 6
+    assert highlighted_categories(tmp_path / "out" / "feedback_1234561.docx") == []
+
+
+def test_zip(tmp_path, marks_workbook, feedback_template):
+    archive = tmp_path / "feedback.zip"
+    main([str(marks_workbook), str(feedback_template), "--zip", str(archive), "-q"])
+    with zipfile.ZipFile(archive) as z:
+        assert sorted(z.namelist()) == ["feedback/feedback_1234561.docx", "feedback/feedback_1234562.docx",
+                                        "feedback/feedback_1234563.docx"]
+
+
+
+def test_combined(tmp_path, marks_workbook, feedback_template):
+    combined = tmp_path / "moderation.docx"
+    assert main([str(marks_workbook), str(feedback_template), "--combined", str(combined), "-q"]) == 0
+    assert highlighted_categories(combined) == ["OUTSTANDING", "DISTINCTION", "GOOD", "PASS", "MARGINAL", "FAIL"]
+
+
+def test_combined_without_writers(tmp_path, marks_workbook, feedback_template):
+    with pytest.raises(SystemExit) as e:
+        main([str(marks_workbook), str(feedback_template), "--combined", str(tmp_path / "all.docx"),
+              "--writers", "2"])
+    assert e.value.code == 2
+
+
+@pytest.mark.parametrize("option", [["--merge-shards", "0"], ["--merge-shards", "-1"], ["--jobs", "-2"],
+                                    ["--writers", "-1"], ["--writers", "two"]])
+def test_rejects_bad_counts(tmp_path, marks_workbook, feedback_template, option):
+    with pytest.raises(SystemExit) as e:
+        main([str(marks_workbook), str(feedback_template), "-o", str(tmp_path / "out" / "{{STUDENTID}}.docx")]
+             + option)
+    assert e.value.code == 2
+    assert not (tmp_path / "out").exists()
+
+
+def test_profile(tmp_path, marks_workbook, feedback_template, capsys):
+    profile = tmp_path / "run.prof"
+    assert _run(tmp_path, marks_workbook, feedback_template, "--profile", "--cprofile", str(profile)) == 0
+    out = capsys.readouterr().out
+    assert "Time per stage" in out
+    assert "render" in out
+    assert "cumulative" in out
+    assert profile.exists()
+
+
+def test_errors(tmp_path, feedback_template, capsys):
+    assert main([str(tmp_path / "missing.xlsx"), str(feedback_template)]) == 1
+    assert "wmg-feedback: error" in capsys.readouterr().err
+
+    with pytest.raises(SystemExit):
+        main([])
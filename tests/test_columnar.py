@@ -0,0 +1,96 @@
+"""Tests for columnar worksheet data and vectorised grade categories."""
+
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from wmg_feedback_gen.columnar import (
+    Columns,
+    category_columns,
+    mark_categories,
+    read_columns,
+    to_array
+)
+from wmg_feedback_gen.core import mark_category, process_rows
+from wmg_feedback_gen.document_generator import generate
+from wmg_feedback_gen.stats import RunStats
+
+from .conftest import HEADER, ROWS, build_template, highlighted_categories
+
+EXPECTED = ["NAME", "STUDENTID", "FEEDBACK", "LO2", "LO3"]
+
+
+def _rows():
+    return [("Module marks",), tuple(HEADER)] + [tuple(row) for row in ROWS]
+
+
+class TestMarkCategories:
+
+    def test_matches_mark_category(self):
+        marks = [100, 80, 79.9, 70, 65, 60, 55, 50, 45, 40, 39, 0, -5, "72", "n/a", None]
+        assert mark_categories(marks).tolist() == [mark_category(m) for m in marks]
+
+    def test_typed_arrays(self):
+        assert mark_categories(np.array([85, 35])).tolist() == ["OUTSTANDING", "FAIL"]
+        assert mark_categories(np.array([np.nan, 50.5])).tolist() == ["", "PASS"]
+
+
+class TestToArray:
+
+    def test_types(self):
+        assert to_array([1, 2]).dtype == np.int64
+        assert to_array([1.5, 2.0]).dtype == np.float64
+        assert to_array([1, 2.5]).dtype == object
+        assert to_array(["a", None]).dtype == object
+
+    def test_values_round_trip(self):
+        for values in ([1, 2], [1.5, 2.0], [1, 2.5], ["a", None]):
+            assert to_array(values).tolist() == values
+
+
+class TestReadColumns:
+
+    def test_matches_process_rows(self):
+        data = read_columns(_rows(), EXPECTED)
+        assert list(data.rows()) == list(process_rows(_rows(), EXPECTED))
+        assert len(data) == 3
+        assert data["LO2"].dtype == np.int64
+
+    def test_rejections(self):
+        stats = RunStats()
+        read_columns(_rows(), EXPECTED, stats=stats)
+        assert stats.rows_read == 6
+        # the title, header and "n/a" rows
+        assert stats.rows_rejected == 3
+        assert stats.rejected[-1][1] == "Invalid STUDENTID: 'n/a'"
+
+    def test_add_categories(self):
+        data = read_columns(_rows(), EXPECTED)
+        data.add_categories(["LO2", "LO3"])
+        assert data["LO2_category"].tolist() == ["OUTSTANDING", "GOOD", "MARGINAL"]
+        assert next(data.rows())["LO3_category"] == "DISTINCTION"
+
+    def test_empty(self):
+        data = Columns({})
+        assert len(data) == 0
+        assert list(data.rows()) == []
+
+
+def test_category_columns():
+    columns, derived = category_columns({"STUDENTID", "LO2", "LO3_category", "_category"})
+    assert columns == {"STUDENTID", "LO2", "LO3", "_category"}
+    assert derived == {"LO3_category": "LO3"}
+
+
+def test_generate(tmp_path, marks_workbook):
+    template = build_template(tmp_path / "template.docx", category_fields=True)
+    stats = generate(marks_workbook, template,
+                     output_filename=str(tmp_path / "out" / "feedback_{{STUDENTID}}.docx"),
+                     columnar_data=True)
+
+    assert stats.documents_written == 3
+    assert sorted(os.listdir(tmp_path / "out")) == \
+        ["feedback_1234561.docx", "feedback_1234562.docx", "feedback_1234563.docx"]
+    assert highlighted_categories(tmp_path / "out" / "feedback_1234562.docx") == ["GOOD", "PASS"]
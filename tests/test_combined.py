@@ -0,0 +1,177 @@
+"""Tests for generating every student into one combined document."""
+
+import struct
+import threading
+import zipfile
+import zlib
+
+import pytest
+
+from docx import Document
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls, qn
+from wmg_feedback_gen.combined import CombinedSink
+from wmg_feedback_gen.document_generator import default_hightlight, generate, in_memory
+from wmg_feedback_gen.sinks import CallbackSink
+
+from .conftest import build_template, highlighted_categories
+
+NAMES = ["Ada Lovelace", "Alan Turing", "Grace Hopper"]
+HIGHLIGHTED = ["OUTSTANDING", "DISTINCTION", "GOOD", "PASS", "MARGINAL", "FAIL"]
+
+
+def _png():
+    # a 1x1 white PNG
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(b"\x00\xff\xff\xff")) + chunk(b"IEND", b""))
+
+
+@pytest.fixture
+def logo_template(tmp_path):
+    """The feedback template with a logo above the text."""
+    path = build_template(tmp_path / "template.docx")
+    (tmp_path / "logo.png").write_bytes(_png())
+    doc = Document(path)
+    doc.paragraphs[0].insert_paragraph_before().add_run().add_picture(str(tmp_path / "logo.png"))
+    doc.save(path)
+    return path
+
+
+@pytest.fixture
+def header_template(tmp_path):
+    """The feedback template with the student ID in its header and "Page N of M" in its footer."""
+    path = build_template(tmp_path / "template.docx")
+    doc = Document(path)
+    section = doc.sections[0]
+    section.header.paragraphs[0].text = "Feedback for {{STUDENTID}}"
+    section.footer.paragraphs[0]._p.append(parse_xml(
+        f'<w:fldSimple {nsdecls("w")} w:instr=" NUMPAGES "><w:r><w:t>1</w:t></w:r></w:fldSimple>'))
+    doc.save(path)
+    return path
+
+
+def _names(path):
+    return [name for p in Document(path).paragraphs for name in NAMES if name in p.text]
+
+
+def _sections(path):
+    return len(Document(path).sections)
+
+
+@pytest.mark.parametrize("precompile", [True, False])
+def test_combined(tmp_path, marks_workbook, logo_template, precompile):
+    combined = tmp_path / "out" / "all.docx"
+    with CombinedSink(combined) as sink:
+        stats = generate(marks_workbook, logo_template, sink=sink, precompile=precompile)
+
+    assert stats.documents_written == sink.documents == 3
+    assert _names(combined) == NAMES
+    assert _sections(combined) == 3
+    assert highlighted_categories(combined) == HIGHLIGHTED
+
+    with zipfile.ZipFile(combined) as archive:
+        assert len([name for name in archive.namelist() if name.startswith("word/media/")]) == 1
+    document = Document(combined)
+    ids = [e.get("id") for e in document.element.body.iter("{*}docPr")]
+    assert len(ids) == 3 and len(set(ids)) == 3
+
+
+def test_smaller_than_separate_documents(tmp_path, marks_workbook, logo_template):
+    generate(marks_workbook, logo_template, output_filename=str(tmp_path / "separate" / "{{STUDENTID}}.docx"))
+    separate = sum(f.stat().st_size for f in (tmp_path / "separate").iterdir())
+
+    with CombinedSink(tmp_path / "all.docx") as sink:
+        generate(marks_workbook, logo_template, sink=sink)
+    assert (tmp_path / "all.docx").stat().st_size < separate
+
+
+def test_parallel(tmp_path, marks_workbook, logo_template):
+    with CombinedSink(tmp_path / "all.docx") as sink:
+        generate(marks_workbook, logo_template, sink=sink, jobs=2)
+
+    assert sorted(_names(tmp_path / "all.docx")) == NAMES
+    assert sorted(highlighted_categories(tmp_path / "all.docx")) == sorted(HIGHLIGHTED)
+    with zipfile.ZipFile(tmp_path / "all.docx") as archive:
+        assert len([name for name in archive.namelist() if name.startswith("word/media/")]) == 1
+
+
+def test_writers_keep_order(tmp_path, marks_workbook, logo_template):
+    with CombinedSink(tmp_path / "all.docx") as sink:
+        stats = generate(marks_workbook, logo_template, sink=sink, writers=4)
+    assert stats.documents_written == 3
+    assert _names(tmp_path / "all.docx") == NAMES
+
+
+def test_write_from_threads(tmp_path, marks_workbook, logo_template):
+    documents = []
+    generate(marks_workbook, logo_template, sink=CallbackSink(lambda filename, data: documents.append(data)))
+
+    with CombinedSink(tmp_path / "all.docx") as sink:
+        threads = [threading.Thread(target=sink.write, args=("", data)) for data in documents * 10]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert sink.documents == 30
+    assert _sections(tmp_path / "all.docx") == 30
+    ids = [e.get("id") for e in Document(tmp_path / "all.docx").element.body.iter("{*}docPr")]
+    assert len(ids) == len(set(ids)) == 30
+
+
+def test_filename_post_processing(tmp_path, marks_workbook, feedback_template):
+    def mark(row_data, filename):
+        document = Document(filename)
+        document.add_paragraph(f"Checked {row_data['STUDENTID']}")
+        document.save(filename)
+
+    with CombinedSink(tmp_path / "all.docx") as sink:
+        generate(marks_workbook, feedback_template, sink=sink, post_processing=mark)
+
+    texts = [p.text for p in Document(tmp_path / "all.docx").paragraphs if p.text.startswith("Checked")]
+    assert texts == ["Checked 1234561", "Checked 1234562", "Checked 1234563"]
+
+
+def test_in_memory_post_processing_gets_student_body(tmp_path, marks_workbook, feedback_template):
+    seen = []
+
+    @in_memory
+    def count_tables(row_data, document):
+        seen.append(len(document.tables))
+        default_hightlight(row_data, document)
+
+    with CombinedSink(tmp_path / "all.docx") as sink:
+        generate(marks_workbook, feedback_template, sink=sink, post_processing=count_tables)
+    assert seen == [1, 1, 1]
+    assert highlighted_categories(tmp_path / "all.docx") == HIGHLIGHTED
+
+
+@pytest.mark.parametrize("precompile", [True, False])
+def test_headers_per_student(tmp_path, marks_workbook, header_template, precompile):
+    with CombinedSink(tmp_path / "all.docx") as sink:
+        generate(marks_workbook, header_template, sink=sink, precompile=precompile)
+
+    sections = Document(tmp_path / "all.docx").sections
+    assert [s.header.paragraphs[0].text for s in sections] == \
+        ["Feedback for 1234561", "Feedback for 1234562", "Feedback for 1234563"]
+    assert [s._sectPr.find(qn("w:pgNumType")).get(qn("w:start")) for s in sections] == ["1"] * 3
+
+    # the footer is the same for everyone so stored once, counting the student's pages
+    footers = {s.footer.part.partname for s in sections}
+    assert len(footers) == 1
+    assert sections[0].footer._element.xpath("string(.//w:fldSimple/@w:instr)") == " SECTIONPAGES "
+    with zipfile.ZipFile(tmp_path / "all.docx") as archive:
+        assert len([name for name in archive.namelist() if name.startswith("word/header")]) == 3
+
+
+def test_nothing_to_combine(tmp_path):
+    with CombinedSink(tmp_path / "all.docx"):
+        pass
+    assert not (tmp_path / "all.docx").exists()
+
+
+def test_incremental_needs_files(tmp_path, marks_workbook, feedback_template):
+    with pytest.raises(ValueError):
+        generate(marks_workbook, feedback_template, sink=CombinedSink(tmp_path / "all.docx"), incremental=True)
@@ -0,0 +1,93 @@
+"""Tests for the pre-compiled template engine."""
+
+from io import BytesIO
+
+import pytest
+from docx import Document
+from docxtpl import DocxTemplate
+from wmg_feedback_gen.compiled_template import CompiledTemplate
+from wmg_feedback_gen.core import default_jinja_env
+
+from .conftest import build_template
+
+CONTEXT = {"NAME": "Ada Lovelace", "STUDENTID": 1234561, "FEEDBACK": "First line\nSecond & last",
+           "LO2": 85, "LO3": 72}
+
+
+def _render(template, context=CONTEXT):
+    template.render(context, jinja_env=default_jinja_env())
+    buffer = BytesIO()
+    template.save(buffer)
+    buffer.seek(0)
+    return Document(buffer)
+
+
+def _text(document):
+    paragraphs = [p.text for p in document.paragraphs]
+    cells = [c.text for t in document.tables for r in t.rows for c in r.cells]
+    headers = [p.text for s in document.sections for p in s.header.paragraphs]
+    return paragraphs + cells + headers
+
+
+@pytest.fixture
+def template_with_header(tmp_path):
+    path = build_template(tmp_path / "template.docx")
+    document = Document(path)
+    document.sections[0].header.paragraphs[0].text = "Student {{STUDENTID}}"
+    document.core_properties.title = "Feedback for {{NAME}}"
+    document.save(path)
+    return path
+
+
+class TestCompiledTemplate:
+    """Test CompiledTemplate against DocxTemplate."""
+
+    def test_matches_docxtemplate(self, template_with_header):
+        expected = _render(DocxTemplate(template_with_header))
+        result = _render(CompiledTemplate(template_with_header))
+
+        assert _text(result) == _text(expected)
+        assert "Student 1234561" in _text(result)
+        assert result.core_properties.title == "Feedback for Ada Lovelace"
+
+    def test_repeated_renders(self, feedback_template):
+        template = CompiledTemplate(feedback_template)
+        first = _render(template)
+        second = _render(template, dict(CONTEXT, NAME="Alan Turing", STUDENTID=1234562))
+
+        assert "Feedback for Ada Lovelace (1234561)" in _text(first)
+        assert "Feedback for Alan Turing (1234562)" in _text(second)
+
+    def test_post_processing_document(self, feedback_template):
+        template = CompiledTemplate(feedback_template)
+        template.render(CONTEXT, jinja_env=default_jinja_env())
+        template.docx.add_paragraph("post-processed")
+
+        buffer = BytesIO()
+        template.save(buffer)
+        buffer.seek(0)
+        assert Document(buffer).paragraphs[-1].text == "post-processed"
+
+        # the next render starts from the template again
+        assert _render(template).paragraphs[-1].text != "post-processed"
+
+    def test_body_document(self, feedback_template):
+        template = CompiledTemplate(feedback_template)
+        template.render(CONTEXT, jinja_env=default_jinja_env())
+        template.body_document().tables[0].cell(0, 0).paragraphs[0].add_run("highlighted")
+        assert template._docx is None
+
+        buffer = BytesIO()
+        template.save(buffer)
+        buffer.seek(0)
+        assert Document(buffer).tables[0].cell(0, 0).text.endswith("highlighted")
+        assert not _render(template).tables[0].cell(0, 0).text.endswith("highlighted")
+
+    def test_compiled_once_per_environment(self, feedback_template):
+        template = CompiledTemplate(feedback_template)
+        env = default_jinja_env()
+        assert template.compile(env) is template.compile(env)
+
+    def test_save_before_render(self, feedback_template):
+        with pytest.raises(RuntimeError):
+            CompiledTemplate(feedback_template).save(BytesIO())
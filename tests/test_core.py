@@ -1,9 +1,17 @@
 """Tests for core functionality."""
 
+import openpyxl
 import pytest
 from wmg_feedback_gen.core import (
     category,
+    compile_filename,
+    compile_validators,
+    default_jinja_env,
+    extract_row_data,
     find_columns,
+    process_rows,
+    process_to_dicts,
+    validate_columns,
     validate_row_data,
     gen_filename,
     default_validators
@@ -58,6 +66,45 @@ class TestValidateRowData:
             validate_row_data(row_data)
 
 
+class TestCompiledValidators:
+    """Test compiled and column-wise validation."""
+
+    def test_compiled_matches_rejection_reason(self):
+        check = compile_validators(default_validators, ["STUDENTID"])
+        assert check({"STUDENTID": "1234567"}) is None
+        assert check({"STUDENTID": "123"}) == "Invalid STUDENTID: '123'"
+
+    def test_checked_upfront(self):
+        with pytest.raises(ValueError, match="Validator 'STUDENTID' not found"):
+            compile_validators(default_validators, ["OTHER"])
+        with pytest.raises(ValueError, match="not callable"):
+            compile_validators({"OTHER": "nope"}, ["OTHER"])
+
+    def test_validate_columns(self):
+        validators = {
+            "STUDENTID": default_validators["STUDENTID"],
+            "MARK": lambda x: 0 <= int(x) <= 100,
+        }
+        data = {"STUDENTID": ["1234567", "bad", "7654321"], "MARK": [50, "not checked", 150]}
+        assert validate_columns(data, validators) == [None, "Invalid STUDENTID: 'bad'", "Invalid MARK: 150"]
+
+    def test_batches_match_rows(self):
+        rows = [("STUDENTID", "MARK")] + [(str(1000000 + i) if i % 3 else "x", i) for i in range(10)]
+        expected = list(process_rows(rows, ["STUDENTID", "MARK"]))
+        assert list(process_rows(rows, ["STUDENTID", "MARK"], batch_size=4)) == expected
+        assert len(expected) == 6
+
+    def test_batches_compiled_once(self, monkeypatch):
+        import wmg_feedback_gen.core as core
+
+        calls = []
+        compile_once = core.compile_validators
+        monkeypatch.setattr(core, "compile_validators", lambda *args: calls.append(args) or compile_once(*args))
+        rows = [("STUDENTID",)] + [(str(1000000 + i),) for i in range(10)]
+        assert len(list(process_rows(rows, ["STUDENTID"], batch_size=3))) == 10
+        assert len(calls) == 1
+
+
 class TestGenFilename:
     """Test the gen_filename function."""
 
@@ -76,3 +123,54 @@ class TestGenFilename:
         }
         result = gen_filename(template, row_data)
         assert result == "PMA_feedback_1234567_DrCroft.docx"
+
+    def test_custom_filter(self):
+        template = "{{LO2 | mark_category}}_{{STUDENTID}}.docx"
+        row_data = {"STUDENTID": "1234567", "LO2": 72}
+        result = gen_filename(template, row_data, default_jinja_env())
+        assert result == "DISTINCTION_1234567.docx"
+
+    def test_compiled_once(self):
+        env = default_jinja_env()
+        compile_filename.cache_clear()
+        for student in ("1234567", "7654321"):
+            gen_filename("feedback_{{STUDENTID}}.docx", {"STUDENTID": student}, env)
+        assert compile_filename.cache_info().misses == 1
+        assert compile_filename.cache_info().hits == 1
+
+
+class TestProcessRows:
+    """Test single pass row processing."""
+
+    def test_matches_two_pass(self, marks_workbook):
+        expected = ["NAME", "STUDENTID", "LO2"]
+        sheet = openpyxl.load_workbook(marks_workbook)["marks"]
+
+        columns = find_columns(sheet, expected)
+        two_pass = [extract_row_data(row, columns) for row in sheet.iter_rows(values_only=True)]
+        two_pass = [row for row in two_pass if validate_row_data(row)]
+
+        assert list(process_to_dicts(sheet, expected)) == two_pass
+        assert [row["STUDENTID"] for row in two_pass] == [1234561, 1234562, 1234563]
+
+    def test_read_only_worksheet(self, marks_workbook):
+        expected = ["NAME", "STUDENTID", "LO2"]
+        normal = openpyxl.load_workbook(marks_workbook, data_only=True)["marks"]
+        workbook = openpyxl.load_workbook(marks_workbook, data_only=True, read_only=True)
+        try:
+            assert list(process_to_dicts(workbook["marks"], expected)) == \
+                list(process_to_dicts(normal, expected))
+        finally:
+            workbook.close()
+
+    def test_header_split_across_rows(self):
+        rows = [
+            ("STUDENTID", None),
+            (None, "MARK"),
+            ("1234567", 50),
+        ]
+        assert list(process_rows(rows, ["STUDENTID", "MARK"])) == [{"STUDENTID": "1234567", "MARK": 50}]
+
+    def test_short_rows(self):
+        rows = [("STUDENTID", "MARK"), ("1234567",)]
+        assert list(process_rows(rows, ["STUDENTID", "MARK"])) == [{"STUDENTID": "1234567", "MARK": None}]
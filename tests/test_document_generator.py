@@ -1,7 +1,23 @@
 """Tests for document generator functionality."""
 
+import os
+import threading
+
 import pytest
-from wmg_feedback_gen.document_generator import category
+from docx import Document
+from docxtpl import DocxTemplate
+from wmg_feedback_gen.document_generator import (
+    default_hightlight,
+    default_workers,
+    generate,
+    generate_doc,
+    in_memory
+)
+from wmg_feedback_gen.core import category, default_jinja_env
+
+from wmg_feedback_gen.manifest import MANIFEST_NAME
+
+from .conftest import ROWS, build_template, build_workbook, highlighted_categories
 
 
 class TestDocumentGenerator:
@@ -15,3 +31,223 @@ class TestDocumentGenerator:
         assert category(55) == "PASS"
         assert category(45) == "MARGINAL"
         assert category(35) == "FAIL"
+
+
+def _document_text(filename):
+    doc = Document(filename)
+    paragraphs = [p.text for p in doc.paragraphs]
+    cells = [c.text for t in doc.tables for r in t.rows for c in r.cells]
+    return paragraphs + cells
+
+
+class TestGenerate:
+    """Test end-to-end generation from a workbook and template."""
+
+    def test_serial(self, tmp_path, marks_workbook, feedback_template):
+        generate(marks_workbook, feedback_template,
+                 output_filename=str(tmp_path / "out" / "feedback_{{STUDENTID}}.docx"))
+
+        files = sorted(os.listdir(tmp_path / "out"))
+        assert files == ["feedback_1234561.docx", "feedback_1234562.docx", "feedback_1234563.docx"]
+        assert highlighted_categories(tmp_path / "out" / "feedback_1234561.docx") == ["OUTSTANDING", "DISTINCTION"]
+
+    def test_parallel_matches_serial(self, tmp_path, marks_workbook, feedback_template):
+        generate(marks_workbook, feedback_template,
+                 output_filename=str(tmp_path / "serial" / "feedback_{{STUDENTID}}.docx"))
+        generate(marks_workbook, feedback_template,
+                 output_filename=str(tmp_path / "parallel" / "feedback_{{STUDENTID}}.docx"),
+                 jobs=2)
+
+        serial = sorted(os.listdir(tmp_path / "serial"))
+        assert serial == sorted(os.listdir(tmp_path / "parallel"))
+        for name in serial:
+            assert _document_text(tmp_path / "serial" / name) == _document_text(tmp_path / "parallel" / name)
+            assert highlighted_categories(tmp_path / "serial" / name) == \
+                highlighted_categories(tmp_path / "parallel" / name)
+
+    def test_docxtemplate(self, tmp_path, marks_workbook, feedback_template):
+        generate(marks_workbook, feedback_template,
+                 output_filename=str(tmp_path / "compiled" / "feedback_{{STUDENTID}}.docx"))
+        generate(marks_workbook, feedback_template,
+                 output_filename=str(tmp_path / "docxtpl" / "feedback_{{STUDENTID}}.docx"),
+                 precompile=False)
+
+        for name in os.listdir(tmp_path / "compiled"):
+            assert _document_text(tmp_path / "compiled" / name) == _document_text(tmp_path / "docxtpl" / name)
+            assert highlighted_categories(tmp_path / "compiled" / name) == \
+                highlighted_categories(tmp_path / "docxtpl" / name)
+
+    def test_full_workbook(self, tmp_path, marks_workbook, feedback_template):
+        generate(marks_workbook, feedback_template,
+                 output_filename=str(tmp_path / "out" / "feedback_{{STUDENTID}}.docx"),
+                 read_only=False)
+
+        assert len(os.listdir(tmp_path / "out")) == 3
+
+    def test_filename_uses_jinja_env(self, tmp_path, marks_workbook, feedback_template):
+        generate(marks_workbook, feedback_template,
+                 output_filename=str(tmp_path / "out" / "{{LO2 | mark_category}}_{{STUDENTID}}.docx"),
+                 jinga_env=default_jinja_env())
+
+        assert sorted(os.listdir(tmp_path / "out")) == \
+            ["GOOD_1234562.docx", "MARGINAL_1234563.docx", "OUTSTANDING_1234561.docx"]
+
+    def test_incremental(self, tmp_path, feedback_template):
+        output = str(tmp_path / "out" / "feedback_{{STUDENTID}}.docx")
+        rows = [list(row) for row in ROWS]
+        build_workbook(tmp_path / "marks.xlsx", rows)
+
+        report = generate(tmp_path / "marks.xlsx", feedback_template, output_filename=output, incremental=True)
+        assert (report.skipped, report.documents_written, report.removed) == (0, 3, 0)
+
+        # change one student, remove another
+        rows[0][2] = "Updated feedback."
+        del rows[1]
+        build_workbook(tmp_path / "marks.xlsx", rows)
+
+        report = generate(tmp_path / "marks.xlsx", feedback_template, output_filename=output, incremental=True)
+        assert (report.skipped, report.documents_written, report.removed) == (1, 1, 1)
+        assert sorted(os.listdir(tmp_path / "out")) == \
+            [MANIFEST_NAME, "feedback_1234561.docx", "feedback_1234563.docx"]
+        assert "Updated feedback." in _document_text(tmp_path / "out" / "feedback_1234561.docx")
+
+        # missing outputs are regenerated
+        os.remove(tmp_path / "out" / "feedback_1234563.docx")
+        report = generate(tmp_path / "marks.xlsx", feedback_template, output_filename=output,
+                          incremental=True, jobs=2)
+        assert (report.skipped, report.documents_written, report.removed) == (1, 1, 0)
+
+    def test_stats_and_progress(self, tmp_path, marks_workbook, feedback_template):
+        events = []
+        stats = generate(marks_workbook, feedback_template,
+                         output_filename=str(tmp_path / "out" / "feedback_{{STUDENTID}}.docx"),
+                         progress=lambda event, stats, detail: events.append((event, detail)))
+
+        assert stats.rows_read == 6
+        assert stats.rows_rejected == 3
+        assert stats.rejected[-1] == (
+            {"NAME": "Not A Student", "STUDENTID": "n/a", "FEEDBACK": "Should be rejected.", "LO2": 50, "LO3": 50},
+            "Invalid STUDENTID: 'n/a'")
+        assert stats.documents_written == 3
+        assert stats.bytes_written == sum(f.stat().st_size for f in (tmp_path / "out").iterdir())
+        assert {"load", "template", "columns", "validation", "filename", "render", "post_processing", "save"} \
+            <= set(stats.timings)
+
+        # rows are streamed, so the total isn't known up front
+        assert [event for event, _ in events] == ["document"] * 3 + ["finished"]
+        assert events[0][1].endswith("feedback_1234561.docx")
+
+    def test_count_first(self, tmp_path, marks_workbook, feedback_template):
+        events = []
+        generate(marks_workbook, feedback_template, output_filename=str(tmp_path / "out" / "{{STUDENTID}}.docx"),
+                 count_first=True, progress=lambda event, stats, detail: events.append((event, detail)))
+        assert events[0] == ("total", 3)
+        assert [event for event, _ in events[1:]] == ["document"] * 3 + ["finished"]
+
+    def test_parallel_stats(self, tmp_path, marks_workbook, feedback_template):
+        events = []
+        stats = generate(marks_workbook, feedback_template,
+                         output_filename=str(tmp_path / "out" / "feedback_{{STUDENTID}}.docx"),
+                         jobs=2, progress=lambda event, stats, detail: events.append((event, detail)))
+
+        assert stats.documents_written == 3
+        assert stats.timings["render"] > 0
+        assert events[0] == ("total", 3)
+        assert [event for event, _ in events[1:]] == ["document"] * 3 + ["finished"]
+
+    def test_total_counts_skipped(self, tmp_path, marks_workbook, feedback_template):
+        output = str(tmp_path / "out" / "feedback_{{STUDENTID}}.docx")
+        generate(marks_workbook, feedback_template, output_filename=output, incremental=True)
+
+        for jobs in (1, 2):
+            events = []
+            generate(marks_workbook, feedback_template, output_filename=output, incremental=True,
+                     jobs=jobs, count_first=True, progress=lambda event, stats, detail: events.append(event))
+            assert events == ["total"] + ["skipped"] * 3 + ["finished"]
+
+    def test_default_workers(self):
+        assert default_workers() >= 1
+
+    def test_cancel_after_current_document(self, tmp_path, marks_workbook, feedback_template):
+        cancel = threading.Event()
+
+        def progress(event, stats, detail):
+            if event == "document":
+                cancel.set()
+
+        stats = generate(marks_workbook, feedback_template, progress=progress, cancel=cancel,
+                         output_filename=str(tmp_path / "out" / "feedback_{{STUDENTID}}.docx"))
+
+        assert stats.cancelled
+        assert stats.documents_written == 1
+        assert os.listdir(tmp_path / "out") == ["feedback_1234561.docx"]
+
+    def test_cancel_parallel(self, tmp_path, marks_workbook, feedback_template):
+        cancel = threading.Event()
+        cancel.set()
+        stats = generate(marks_workbook, feedback_template, jobs=2, cancel=cancel,
+                         output_filename=str(tmp_path / "out" / "feedback_{{STUDENTID}}.docx"))
+        assert stats.cancelled
+        assert stats.documents_written == 0
+
+    def test_cancel_incremental_keeps_previous(self, tmp_path, marks_workbook, feedback_template):
+        output = str(tmp_path / "out" / "feedback_{{STUDENTID}}.docx")
+        generate(marks_workbook, feedback_template, output_filename=output, incremental=True)
+
+        # the template changes, and the rebuild is cancelled after one document
+        build_template(feedback_template, learning_outcomes=("LO3", "LO2"))
+        cancel = threading.Event()
+        stats = generate(marks_workbook, feedback_template, output_filename=output, incremental=True,
+                         cancel=cancel, progress=lambda event, stats, detail: cancel.set())
+        assert stats.cancelled
+        assert stats.removed == 0
+        assert len(os.listdir(tmp_path / "out")) == 4 # 3 documents and the manifest
+
+        # the next run rebuilds the rest
+        stats = generate(marks_workbook, feedback_template, output_filename=output, incremental=True)
+        assert (stats.skipped, stats.documents_written) == (1, 2)
+
+
+class TestPostProcessing:
+    """Test how post-processing functions are called by generate_doc."""
+
+    def test_in_memory_hook_gets_document(self, tmp_path, feedback_template):
+        seen = []
+
+        @in_memory
+        def hook(row_data, document):
+            seen.append(document)
+            document.add_paragraph("post-processed")
+
+        output = tmp_path / "out.docx"
+        generate_doc({"NAME": "A", "STUDENTID": 1234567, "FEEDBACK": "", "LO2": 50, "LO3": 50},
+                     DocxTemplate(feedback_template), output, jinja_env=default_jinja_env(), post_processing=hook)
+
+        assert not isinstance(seen[0], (str, os.PathLike))
+        assert Document(output).paragraphs[-1].text == "post-processed"
+
+    def test_filename_hook_gets_saved_file(self, tmp_path, feedback_template):
+        seen = []
+
+        def hook(row_data, filename):
+            seen.append(filename)
+            assert os.path.exists(filename)
+
+        output = tmp_path / "out.docx"
+        generate_doc({"NAME": "A", "STUDENTID": 1234567, "FEEDBACK": "", "LO2": 50, "LO3": 50},
+                     DocxTemplate(feedback_template), output, jinja_env=default_jinja_env(), post_processing=hook)
+
+        # a temporary file next to the output, renamed to it once the hook returns
+        [filename] = seen
+        assert os.path.dirname(filename) == str(tmp_path)
+        assert os.path.basename(filename).startswith(".out.") and filename.endswith(".docx")
+        assert os.path.exists(output) and not os.path.exists(filename)
+
+    def test_default_highlight_accepts_filename(self, tmp_path, feedback_template):
+        output = tmp_path / "out.docx"
+        generate_doc({"NAME": "A", "STUDENTID": 1234567, "FEEDBACK": "", "LO2": 65, "LO3": 35},
+                     DocxTemplate(feedback_template), output, jinja_env=default_jinja_env(), post_processing=None)
+        assert highlighted_categories(output) == []
+
+        default_hightlight({}, str(output))
+        assert highlighted_categories(output) == ["GOOD", "FAIL"]
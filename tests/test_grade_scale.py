@@ -0,0 +1,104 @@
+"""Tests for configurable grade scales."""
+
+import pickle
+
+import numpy as np
+import pytest
+from docx import Document
+
+from wmg_feedback_gen.columnar import mark_categories
+from wmg_feedback_gen.core import default_jinja_env, mark_category
+from wmg_feedback_gen.document_generator import GradeHighlight, generate
+from wmg_feedback_gen.grade_scale import WMG_SCALE, GradeScale
+from wmg_feedback_gen.grading import CATEGORIES
+
+from .conftest import build_workbook, highlighted_categories
+
+# a scale with multi-word categories, for the six band WMG table layout
+DEGREE = GradeScale([(70, "FIRST"), (60, "UPPER SECOND"), (50, "LOWER SECOND"), (40, "THIRD"),
+                     (30, "MARGINAL FAIL"), (None, "FAIL")])
+
+MARKS = [100, 80, 79.9, 70, 65, 60, 55, 50, 45, 40, 39, 0, -5, "72", "n/a", None]
+
+
+def _wmg_chain(mark):
+    # the bands mark_category used before grade scales
+    try:
+        mark = float(mark)
+    except (TypeError, ValueError):
+        return ""
+    for bound, category in [(80, "OUTSTANDING"), (70, "DISTINCTION"), (60, "GOOD"), (50, "PASS"), (40, "MARGINAL")]:
+        if mark >= bound:
+            return category
+    return "FAIL"
+
+
+def _degree_template(path):
+    doc = Document()
+    doc.add_paragraph("{{STUDENTID}}")
+    table = doc.add_table(rows=2, cols=9)
+    table.rows[0].cells[2].text = "Comments"
+    for row, lo in zip(table.rows[1:], ["LO2"]):
+        row.cells[1].text = lo
+        row.cells[2].text = f"Comments\n{{{{{lo} | mark_category}}}}"
+        for cell, category in zip(row.cells[3:9], DEGREE.categories):
+            cell.text = f"{category.title()} descriptor"
+    doc.save(path)
+    return path
+
+
+class TestGradeScale:
+
+    def test_wmg_matches_previous_bands(self):
+        assert [WMG_SCALE.category(m) for m in MARKS] == [_wmg_chain(m) for m in MARKS]
+        assert [mark_category(m) for m in MARKS] == [_wmg_chain(m) for m in MARKS]
+        assert WMG_SCALE.categories == CATEGORIES
+
+    def test_batch_matches_scalar(self):
+        expected = [DEGREE(m) for m in MARKS]
+        assert DEGREE.categorise(MARKS) == expected
+        assert DEGREE.categorise(np.array(MARKS, dtype=object)).tolist() == expected
+        assert DEGREE.categorise(np.array([72.5, np.nan, 25])).tolist() == ["FIRST", "", "FAIL"]
+        assert mark_categories(["65", "n/a"], DEGREE).tolist() == ["UPPER SECOND", ""]
+
+    def test_table_order_and_open_bottom(self):
+        scale = GradeScale([(40, "PASS"), (70, "MERIT")])
+        assert scale.categories == ["MERIT", "PASS"]
+        assert scale.boundaries == [40.0, 70.0]
+        # without a (None, ...) band marks below the lowest band have no category
+        assert [scale(m) for m in [39, 40, 69.9, 70]] == ["", "PASS", "PASS", "MERIT"]
+
+    def test_invalid_tables(self):
+        with pytest.raises(ValueError):
+            GradeScale([(None, "FAIL"), (None, "REFER")])
+        with pytest.raises(ValueError):
+            GradeScale([(40, "PASS"), (40, "MERIT")])
+
+    def test_equality_and_pickle(self):
+        assert pickle.loads(pickle.dumps(DEGREE)) == DEGREE
+        assert DEGREE != WMG_SCALE
+        assert eval(repr(DEGREE)) == DEGREE
+
+
+def test_jinja_filter():
+    template = default_jinja_env(DEGREE).from_string("{{ mark | mark_category }}")
+    assert template.render(mark=62) == "UPPER SECOND"
+    assert default_jinja_env().from_string("{{ mark | mark_category }}").render(mark=62) == "GOOD"
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_generate_with_scale(tmp_path, jobs):
+    template = _degree_template(tmp_path / "degree.docx")
+    workbook = build_workbook(tmp_path / "marks.xlsx", rows=[[1234561, 65], [1234562, 35]],
+                              header=["STUDENTID", "LO2"])
+    output = str(tmp_path / "out" / "{{STUDENTID}}.docx")
+    generate(workbook, template, output_filename=output, jinga_env=default_jinja_env(DEGREE),
+             post_processing=GradeHighlight(DEGREE), jobs=jobs)
+
+    # the table columns are the degree bands, named here by their position in CATEGORIES
+    highlighted = [DEGREE.categories[CATEGORIES.index(c)]
+                   for c in highlighted_categories(tmp_path / "out" / "1234561.docx")]
+    assert highlighted == ["UPPER SECOND"]
+    highlighted = [DEGREE.categories[CATEGORIES.index(c)]
+                   for c in highlighted_categories(tmp_path / "out" / "1234562.docx")]
+    assert highlighted == ["MARGINAL FAIL"]
@@ -0,0 +1,107 @@
+"""Tests for the template grading table index."""
+
+from docx import Document
+
+from wmg_feedback_gen.core import default_jinja_env
+from wmg_feedback_gen.document_generator import (
+    default_hightlight,
+    for_template,
+    generate,
+    in_memory
+)
+from wmg_feedback_gen.grading import GradingIndex
+from wmg_feedback_gen.compiled_template import CompiledTemplate
+
+from .conftest import CATEGORIES, ROWS, build_template, highlighted_categories
+
+
+def _highlighted(cell):
+    runs = [r for p in cell.paragraphs for r in p.runs]
+    return bool(runs) and all(r.font.highlight_color is not None for r in runs)
+
+
+def _render(template, row_data):
+    tpl = CompiledTemplate(template)
+    tpl.render(row_data, jinja_env=default_jinja_env())
+    return tpl.docx
+
+
+def _row_data(row):
+    return dict(zip(["NAME", "STUDENTID", "FEEDBACK", "LO2", "LO3"], row))
+
+
+def _column_template(path, marks=("LO2", "LO3")):
+    doc = Document()
+    table = doc.add_table(rows=1 + len(CATEGORIES), cols=1 + len(marks))
+    for cell, mark in zip(table.rows[0].cells[1:], marks):
+        cell.text = mark
+    for row, category in zip(table.rows[1:], CATEGORIES):
+        row.cells[0].text = category
+        for cell in row.cells[1:]:
+            cell.text = f"{category.title()} descriptor"
+    doc.save(path)
+    return path
+
+
+class TestFromRows:
+
+    def test_index(self, feedback_template):
+        index = GradingIndex.from_rows(Document(feedback_template))
+        # the header row and one row per learning outcome
+        assert len(index.items) == 3
+        assert index.items[1].comments == (1, 2)
+        assert index.items[1].cells["OUTSTANDING"] == (1, 3)
+
+    def test_matches_scan(self, tmp_path, feedback_template):
+        index = GradingIndex.from_rows(Document(feedback_template))
+        for row in ROWS[:3]:
+            indexed = _render(feedback_template, _row_data(row))
+            index.highlight(_row_data(row), indexed)
+            indexed.save(tmp_path / "indexed.docx")
+
+            scanned = _render(feedback_template, _row_data(row))
+            default_hightlight(_row_data(row), scanned)
+            scanned.save(tmp_path / "scanned.docx")
+
+            assert highlighted_categories(tmp_path / "indexed.docx") \
+                == highlighted_categories(tmp_path / "scanned.docx")
+
+    def test_other_template_reindexed(self, tmp_path, feedback_template):
+        index = GradingIndex.from_rows(Document(feedback_template))
+        other = build_template(tmp_path / "other.docx", learning_outcomes=("LO2", "LO3", "LO2"))
+
+        document = _render(other, _row_data(ROWS[0]))
+        assert not index.matches(document.tables)
+        index.highlight(_row_data(ROWS[0]), document)
+        document.save(tmp_path / "out.docx")
+        assert highlighted_categories(tmp_path / "out.docx") == ["OUTSTANDING", "DISTINCTION", "OUTSTANDING"]
+
+
+def test_from_columns(tmp_path):
+    document = Document(_column_template(tmp_path / "columns.docx"))
+    index = GradingIndex.from_columns(document, ["LO2", "LO3"], CATEGORIES)
+    index.highlight({"LO2": 65, "LO3": "n/a"}, document)
+
+    table = document.tables[0]
+    highlighted = [(r, c) for r, row in enumerate(table.rows) for c, cell in enumerate(row.cells)
+                   if _highlighted(cell)]
+    assert highlighted == [(1 + CATEGORIES.index("GOOD"), 1)]
+
+
+def test_generate_prepares_once(tmp_path, marks_workbook, feedback_template):
+    calls = []
+
+    def factory(template_file):
+        calls.append(template_file)
+        return GradingIndex.from_rows(Document(template_file)).highlighter()
+
+    @for_template(factory)
+    @in_memory
+    def highlight(row_data, document):
+        raise AssertionError("generate() should use the prepared function")
+
+    generate(marks_workbook, feedback_template, post_processing=highlight,
+             output_filename=str(tmp_path / "out" / "feedback_{{STUDENTID}}.docx"))
+
+    assert calls == [feedback_template]
+    assert highlighted_categories(tmp_path / "out" / "feedback_1234563.docx") == ["MARGINAL", "FAIL"]
@@ -0,0 +1,48 @@
+"""Tests that importing the package doesn't load its heavy dependencies."""
+
+import json
+import subprocess
+import sys
+
+HEAVY = ["openpyxl", "docxtpl", "docx", "jinja2", "lxml", "numpy"]
+
+
+def _loaded(code):
+    """The heavy modules loaded after running code in a fresh interpreter."""
+    probe = f"{code}\nimport json, sys\nprint(json.dumps([m for m in {HEAVY!r} if m in sys.modules]))"
+    out = subprocess.run([sys.executable, "-c", probe], check=True, capture_output=True, text=True).stdout
+    return json.loads(out.splitlines()[-1])
+
+
+def test_import_is_light():
+    assert _loaded("import wmg_feedback_gen") == []
+    assert _loaded("from wmg_feedback_gen import validate_row_data, RunStats, preflight") == []
+
+
+def test_dependencies_loaded_on_use():
+    code = "import wmg_feedback_gen as w\nw.gen_filename('{{STUDENTID}}.docx', {'STUDENTID': 1})"
+    assert _loaded(code) == ["jinja2"]
+    loaded = _loaded("from wmg_feedback_gen import generate")
+    assert "docxtpl" in loaded
+    # NumPy is only needed for columnar_data=True
+    assert "numpy" not in loaded
+
+
+def test_optional_modules_loaded_on_use():
+    probe = ("from wmg_feedback_gen import generate\nimport json, sys\n"
+             "print(json.dumps(sorted(m for m in sys.modules if m.startswith('wmg_feedback_gen.'))))")
+    out = subprocess.run([sys.executable, "-c", probe], check=True, capture_output=True, text=True).stdout
+    loaded = json.loads(out.splitlines()[-1])
+    for module in ("columnar", "combined", "shards", "journal"):
+        assert f"wmg_feedback_gen.{module}" not in loaded
+
+
+def test_lazy_exports():
+    import wmg_feedback_gen
+    from wmg_feedback_gen.document_generator import generate
+
+    assert wmg_feedback_gen.generate is generate
+    assert set(wmg_feedback_gen.__all__) <= set(dir(wmg_feedback_gen))
+    for name in wmg_feedback_gen.__all__:
+        assert getattr(wmg_feedback_gen, name) is not None
+    assert callable(wmg_feedback_gen.preflight)
@@ -0,0 +1,136 @@
+"""Tests for atomic writes and resuming interrupted runs."""
+
+import os
+import threading
+import zipfile
+
+import pytest
+from docxtpl import DocxTemplate
+
+from wmg_feedback_gen.core import default_jinja_env
+from wmg_feedback_gen.document_generator import default_hightlight, generate, generate_doc, in_memory
+from wmg_feedback_gen.journal import JOURNAL_NAME, Journal
+from wmg_feedback_gen.sinks import FileSink, ZipSink
+
+from .conftest import highlighted_categories
+
+ROW = {"NAME": "A", "STUDENTID": 1234567, "FEEDBACK": "", "LO2": 65, "LO3": 35}
+
+
+class Crash(Exception):
+    pass
+
+
+class TestAtomicWrites:
+
+    def test_failed_save_leaves_nothing(self, tmp_path):
+        class Broken:
+            def save(self, filename):
+                with open(filename, "wb") as f:
+                    f.write(b"half a document")
+                raise Crash()
+
+        with pytest.raises(Crash):
+            FileSink().save(str(tmp_path / "out.docx"), Broken())
+        assert os.listdir(tmp_path) == []
+
+    def test_replaces_existing_file(self, tmp_path):
+        output = tmp_path / "out.docx"
+        output.write_bytes(b"old")
+        FileSink().write(str(output), b"new")
+        assert output.read_bytes() == b"new"
+        assert os.listdir(tmp_path) == ["out.docx"]
+
+    def test_failed_post_processing_leaves_nothing(self, tmp_path, feedback_template):
+        def hook(row_data, filename):
+            raise Crash()
+
+        with pytest.raises(Crash):
+            generate_doc(ROW, DocxTemplate(feedback_template), str(tmp_path / "out" / "out.docx"),
+                         jinja_env=default_jinja_env(), post_processing=hook)
+        assert os.listdir(tmp_path / "out") == []
+
+    def test_zip_renamed_on_close(self, tmp_path):
+        archive = tmp_path / "feedback.zip"
+        with ZipSink(archive) as sink:
+            sink.write("a.docx", b"data")
+            assert not archive.exists()
+        with zipfile.ZipFile(archive) as z:
+            assert z.namelist() == ["a.docx"]
+        assert os.listdir(tmp_path) == ["feedback.zip"]
+
+
+def _crash_after(count):
+    """A highlighting post-processing function that crashes the run after count documents."""
+    done = []
+
+    @in_memory
+    def highlight(row_data, document):
+        if len(done) == count:
+            raise Crash()
+        done.append(row_data["STUDENTID"])
+        default_hightlight(row_data, document)
+
+    return highlight
+
+
+class TestResume:
+
+    def test_resume_after_crash(self, tmp_path, marks_workbook, feedback_template):
+        output = str(tmp_path / "out" / "feedback_{{STUDENTID}}.docx")
+        with pytest.raises(Crash):
+            generate(marks_workbook, feedback_template, output_filename=output, resume=True,
+                     post_processing=_crash_after(1))
+        assert os.path.exists(tmp_path / "out" / JOURNAL_NAME)
+        assert sorted(os.listdir(tmp_path / "out")) == [JOURNAL_NAME, "feedback_1234561.docx"]
+
+        written = []
+        # the same post-processing function, which the journal checks, without the crash
+        stats = generate(marks_workbook, feedback_template, output_filename=output, resume=True,
+                         post_processing=_crash_after(3),
+                         progress=lambda event, stats, detail: written.append((event, os.path.basename(detail or ""))))
+        assert written[0] == ("skipped", "feedback_1234561.docx")
+        assert stats.resumed == 1 and stats.documents_written == 2
+        # finished, so the journal is removed
+        assert sorted(os.listdir(tmp_path / "out")) == \
+            ["feedback_1234561.docx", "feedback_1234562.docx", "feedback_1234563.docx"]
+        assert highlighted_categories(tmp_path / "out" / "feedback_1234563.docx") == ["MARGINAL", "FAIL"]
+
+    @pytest.mark.parametrize("options", [{"writers": 2}, {"jobs": 2}])
+    def test_resume_after_cancel(self, tmp_path, marks_workbook, feedback_template, options):
+        output = str(tmp_path / "out" / "feedback_{{STUDENTID}}.docx")
+        cancel = threading.Event()
+        cancel.set()
+        stats = generate(marks_workbook, feedback_template, output_filename=output, resume=True,
+                         cancel=cancel, **options)
+        assert stats.cancelled
+        assert os.path.exists(tmp_path / "out" / JOURNAL_NAME)
+
+        stats = generate(marks_workbook, feedback_template, output_filename=output, resume=True, **options)
+        assert stats.resumed + stats.documents_written == 3
+        assert not os.path.exists(tmp_path / "out" / JOURNAL_NAME)
+
+    def test_changed_rows_and_template(self, tmp_path, feedback_template):
+        path = str(tmp_path / JOURNAL_NAME)
+        (tmp_path / "a.docx").write_bytes(b"done")
+        journal = Journal.open(path, feedback_template, default_hightlight)
+        journal.record(tmp_path / "a.docx", ROW)
+        journal.close(complete=False)
+
+        # a torn last line from a crash is ignored
+        with open(path, "a") as f:
+            f.write('{"file": "b.docx", "ro')
+
+        journal = Journal.open(path, feedback_template, default_hightlight)
+        assert journal.is_complete(tmp_path / "a.docx", ROW)
+        assert not journal.is_complete(tmp_path / "a.docx", dict(ROW, LO2=70))
+        journal.close(complete=False)
+
+        journal = Journal.open(path, feedback_template, None)
+        assert not journal.is_complete(tmp_path / "a.docx", ROW)
+        journal.close()
+        assert not os.path.exists(path)
+
+    def test_needs_files(self, tmp_path, marks_workbook, feedback_template):
+        with pytest.raises(ValueError):
+            generate(marks_workbook, feedback_template, resume=True, sink=ZipSink(tmp_path / "out.zip"))
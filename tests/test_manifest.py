@@ -0,0 +1,76 @@
+"""Tests for the incremental generation manifest."""
+
+import os
+
+from wmg_feedback_gen.document_generator import GradeHighlight
+from wmg_feedback_gen.grade_scale import GradeScale
+from wmg_feedback_gen.manifest import Manifest, callable_identity, row_hash
+
+
+class TestRowHash:
+    """Test the row_hash function."""
+
+    def test_order_independent(self):
+        assert row_hash({"A": 1, "B": "x"}) == row_hash({"B": "x", "A": 1})
+
+    def test_changes_with_data(self):
+        assert row_hash({"A": 1}) != row_hash({"A": 2})
+
+
+class TestManifest:
+    """Test the Manifest class."""
+
+    def test_round_trip(self, tmp_path, feedback_template):
+        path = tmp_path / "manifest.json"
+        output = tmp_path / "a.docx"
+        output.write_bytes(b"")
+
+        manifest = Manifest.load(path, feedback_template, None)
+        assert not manifest.is_current(output, {"A": 1})
+        manifest.record(output, {"A": 1})
+        assert manifest.finish() == {"skipped": 0, "rebuilt": 1, "removed": 0}
+
+        manifest = Manifest.load(path, feedback_template, None)
+        assert manifest.is_current(output, {"A": 1})
+        assert not manifest.is_current(output, {"A": 2})
+
+    def test_post_processing_change(self, tmp_path, feedback_template):
+        path = tmp_path / "manifest.json"
+        output = tmp_path / "a.docx"
+        output.write_bytes(b"")
+
+        manifest = Manifest.load(path, feedback_template, None)
+        manifest.record(output, {"A": 1})
+        manifest.finish()
+
+        manifest = Manifest.load(path, feedback_template, print)
+        assert not manifest.is_current(output, {"A": 1})
+
+    def test_removes_stale_outputs(self, tmp_path, feedback_template):
+        path = tmp_path / "manifest.json"
+        output = tmp_path / "a.docx"
+        output.write_bytes(b"")
+
+        manifest = Manifest.load(path, feedback_template, None)
+        manifest.record(output, {"A": 1})
+        manifest.finish()
+
+        manifest = Manifest.load(path, feedback_template, None)
+        assert manifest.finish() == {"skipped": 0, "rebuilt": 0, "removed": 1}
+        assert not os.path.exists(output)
+
+    def test_callable_identity(self):
+        assert callable_identity(None) is None
+        assert callable_identity(row_hash) == "wmg_feedback_gen.manifest.row_hash"
+
+    def test_callable_identity_attribute(self):
+        class Scaled:
+            identity = "Scaled(2)"
+
+            def __call__(self, row_data, document):
+                pass
+
+        assert callable_identity(Scaled()) == f"{__name__}.Scaled(2)"
+        pass_fail = GradeScale([(50, "PASS"), (None, "FAIL")])
+        assert callable_identity(GradeHighlight()) != callable_identity(GradeHighlight(pass_fail))
+        assert callable_identity(GradeHighlight(pass_fail)) == callable_identity(GradeHighlight(pass_fail))
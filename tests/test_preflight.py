@@ -0,0 +1,61 @@
+"""Tests for checking a run without rendering any documents."""
+
+import os
+
+from wmg_feedback_gen.cli import main
+from wmg_feedback_gen.preflight import preflight
+
+from .conftest import ROWS, build_workbook
+
+
+def test_preflight(tmp_path, marks_workbook, feedback_template):
+    output = str(tmp_path / "out" / "feedback_{{STUDENTID}}.docx")
+    report = preflight(marks_workbook, feedback_template, output_filename=output)
+
+    assert report.ok
+    assert report.planned == 3
+    assert report.variables == {"NAME", "STUDENTID", "FEEDBACK", "LO2", "LO3"}
+    assert report.outputs[0] == str(tmp_path / "out" / "feedback_1234561.docx")
+    assert "Invalid STUDENTID: 'n/a'" in [reason for _, reason in report.stats.rejected]
+    # nothing rendered or written
+    assert not os.path.exists(tmp_path / "out")
+    assert report.stats.documents_written == 0
+
+
+def test_missing_columns(tmp_path, feedback_template):
+    workbook = build_workbook(tmp_path / "marks.xlsx", rows=[row[:4] for row in ROWS],
+                              header=["NAME", "STUDENTID", "FEEDBACK", "LO2"])
+    report = preflight(workbook, feedback_template, output_filename=str(tmp_path / "{{STUDENTID}}.docx"))
+    assert report.missing == ["LO3"]
+    assert report.planned == 3
+    assert not report.ok
+    assert "Missing columns: LO3" in report.summary()
+
+
+def test_missing_validator_column(tmp_path, feedback_template):
+    workbook = build_workbook(tmp_path / "marks.xlsx", rows=[[r[0], r[2], r[3], r[4]] for r in ROWS],
+                              header=["NAME", "FEEDBACK", "LO2", "LO3"])
+    # generate() raises ValueError here, preflight reports it and checks the remaining rows
+    report = preflight(workbook, feedback_template, output_filename=str(tmp_path / "{{NAME}}.docx"))
+    assert report.missing == ["STUDENTID"]
+    assert not report.ok
+
+
+def test_collisions(tmp_path, marks_workbook, feedback_template):
+    report = preflight(marks_workbook, feedback_template, output_filename=str(tmp_path / "{{LO3 > 0}}.docx"))
+    assert report.planned == 3
+    assert list(report.collisions) == [str(tmp_path / "True.docx")]
+    assert [row["NAME"] for row in report.collisions[str(tmp_path / "True.docx")]] == \
+        ["Ada Lovelace", "Alan Turing", "Grace Hopper"]
+    assert "would be written by 3 rows" in report.summary()
+
+
+def test_cli_dry_run(tmp_path, marks_workbook, feedback_template, capsys):
+    output = str(tmp_path / "out" / "feedback_{{STUDENTID}}.docx")
+    assert main([str(marks_workbook), str(feedback_template), "-o", output, "--dry-run"]) == 0
+    assert "Documents planned: 3" in capsys.readouterr().out
+    assert not os.path.exists(tmp_path / "out")
+
+    output = str(tmp_path / "out" / "feedback.docx")
+    assert main([str(marks_workbook), str(feedback_template), "-o", output, "--dry-run", "-q"]) == 2
+    assert "Preflight found problems." in capsys.readouterr().out
@@ -0,0 +1,110 @@
+"""Tests for splitting a run into shards."""
+
+import json
+import os
+
+import pytest
+
+from wmg_feedback_gen.cli import main
+from wmg_feedback_gen.document_generator import generate
+from wmg_feedback_gen.preflight import preflight
+from wmg_feedback_gen.shards import check_shard, merge_shards, shard_name, shard_of
+
+from .conftest import build_workbook
+
+# enough students that every shard gets some
+STUDENTS = [[f"Student {i}", 1234500 + i, "Feedback.", 40 + i, 80 - i] for i in range(12)]
+
+
+@pytest.fixture
+def cohort(tmp_path):
+    return build_workbook(tmp_path / "cohort.xlsx", rows=STUDENTS)
+
+
+def _output(tmp_path):
+    return str(tmp_path / "out" / "feedback_{{STUDENTID}}.docx")
+
+
+def test_shard_of():
+    assert shard_of("out/a.docx", 4) == shard_of("out/a.docx", 4)
+    assert {shard_of(f"out/{i}.docx", 4) for i in range(100)} == {0, 1, 2, 3}
+    assert shard_of("out/a.docx", 1) == 0
+
+
+def test_check_shard():
+    assert check_shard(("1", "3")) == (1, 3)
+    for shard in [(3, 3), (-1, 3), (0, 0), 5]:
+        with pytest.raises(ValueError):
+            check_shard(shard)
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_shards_cover_run(tmp_path, cohort, feedback_template, jobs):
+    output = _output(tmp_path)
+    written = []
+    for index in range(3):
+        stats = generate(cohort, feedback_template, output_filename=output, shard=(index, 3), jobs=jobs)
+        written.append(stats.documents_written)
+
+    assert sum(written) == len(STUDENTS)
+    assert len([f for f in os.listdir(tmp_path / "out") if f.endswith(".docx")]) == len(STUDENTS)
+
+    merge = merge_shards(tmp_path / "out", 3)
+    assert merge.ok, merge.summary()
+    assert merge.expected == len(STUDENTS)
+    expected = preflight(cohort, feedback_template, output_filename=output).outputs
+    assert merge_shards(tmp_path / "out", 3, expected=expected).ok
+
+
+def test_merge_finds_problems(tmp_path, cohort, feedback_template):
+    output = _output(tmp_path)
+    generate(cohort, feedback_template, output_filename=output, shard=(0, 2))
+
+    merge = merge_shards(tmp_path / "out", 2)
+    assert merge.missing_shards == [1]
+    assert not merge.ok
+
+    # a shard run with other inputs, and twice the same document
+    generate(build_workbook(tmp_path / "other.xlsx", rows=STUDENTS[:6]), feedback_template,
+             output_filename=output, shard=(1, 2))
+    path = tmp_path / "out" / shard_name(1, 2)
+    data = json.loads(path.read_text())
+    data["outputs"].append(json.loads((tmp_path / "out" / shard_name(0, 2)).read_text())["outputs"][0])
+    path.write_text(json.dumps(data))
+
+    merge = merge_shards(tmp_path / "out", 2)
+    assert merge.mismatched and len(merge.duplicates) == 1
+    assert "Shards do not cover the run exactly once." in merge.summary()
+
+    expected = preflight(cohort, feedback_template, output_filename=output).outputs
+    merge = merge_shards(tmp_path / "out", 2, expected=expected)
+    assert merge.mismatched == [1]
+    assert merge.missing
+
+
+def test_incremental_shards(tmp_path, cohort, feedback_template):
+    output = _output(tmp_path)
+    for index in range(2):
+        generate(cohort, feedback_template, output_filename=output, shard=(index, 2), incremental=True)
+    # a second run skips every document and removes nothing written by the other shard
+    skipped = 0
+    for index in range(2):
+        stats = generate(cohort, feedback_template, output_filename=output, shard=(index, 2), incremental=True)
+        assert stats.documents_written == 0 and stats.removed == 0
+        skipped += stats.skipped
+    assert skipped == len(STUDENTS)
+    assert merge_shards(tmp_path / "out", 2).ok
+
+
+def test_cli(tmp_path, cohort, feedback_template, capsys):
+    args = [str(cohort), str(feedback_template), "-o", _output(tmp_path), "-q"]
+    for shard in ["0/2", "1/2"]:
+        assert main(args + ["--shard", shard]) == 0
+    assert main(args[:-1] + ["--merge-shards", "2"]) == 0
+    assert "All shards merged." in capsys.readouterr().out
+
+    os.remove(tmp_path / "out" / shard_name(1, 2))
+    assert main(args + ["--merge-shards", "2"]) == 2
+
+    with pytest.raises(SystemExit):
+        main(args + ["--shard", "2/2"])
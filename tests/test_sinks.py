@@ -0,0 +1,131 @@
+"""Tests for the output sinks."""
+
+import os
+import pickle
+import zipfile
+from io import BytesIO
+
+import pytest
+
+from docx import Document
+from wmg_feedback_gen.document_generator import generate
+from wmg_feedback_gen.sinks import CallbackSink, FileSink, QueuedSink, Sink, ZipSink
+
+from .conftest import highlighted_categories
+
+EXPECTED = ["feedback_1234561.docx", "feedback_1234562.docx", "feedback_1234563.docx"]
+
+
+def test_sink_needs_write():
+    class NoWrite(Sink):
+        pass
+
+    # fails on creation rather than with the first document
+    with pytest.raises(TypeError):
+        NoWrite()
+
+
+class TestFileSink:
+    """Test the FileSink class."""
+
+    def test_creates_directories(self, tmp_path):
+        FileSink().write(str(tmp_path / "a" / "b" / "out.docx"), b"data")
+        assert (tmp_path / "a" / "b" / "out.docx").read_bytes() == b"data"
+
+    def test_counts_bytes_from_writer_threads(self, tmp_path):
+        file_sink = FileSink()
+        with QueuedSink(file_sink, writers=4) as sink:
+            for i in range(100):
+                sink.write(str(tmp_path / f"doc{i}.docx"), b"x" * 10)
+        assert file_sink.bytes_written == 1000
+
+    def test_picklable(self):
+        # passed to worker processes
+        assert pickle.loads(pickle.dumps(FileSink(fsync=True))).fsync
+
+
+class TestZipSink:
+    """Test generating into a zip archive."""
+
+    def test_serial(self, tmp_path, marks_workbook, feedback_template):
+        with ZipSink(tmp_path / "feedback.zip") as sink:
+            generate(marks_workbook, feedback_template,
+                     output_filename="feedback_{{STUDENTID}}.docx", sink=sink)
+
+        with zipfile.ZipFile(tmp_path / "feedback.zip") as archive:
+            assert sorted(archive.namelist()) == EXPECTED
+            document = BytesIO(archive.read("feedback_1234561.docx"))
+            assert highlighted_categories(document) == ["OUTSTANDING", "DISTINCTION"]
+
+    def test_parallel(self, tmp_path, marks_workbook, feedback_template):
+        with ZipSink(tmp_path / "feedback.zip") as sink:
+            generate(marks_workbook, feedback_template,
+                     output_filename="feedback_{{STUDENTID}}.docx", sink=sink, jobs=2)
+
+        with zipfile.ZipFile(tmp_path / "feedback.zip") as archive:
+            assert sorted(archive.namelist()) == EXPECTED
+
+    def test_filename_post_processing(self, tmp_path, marks_workbook, feedback_template):
+        def stamp(row_data, filename):
+            document = Document(filename)
+            document.add_paragraph("stamped")
+            document.save(filename)
+
+        with ZipSink(tmp_path / "feedback.zip") as sink:
+            generate(marks_workbook, feedback_template,
+                     output_filename="feedback_{{STUDENTID}}.docx", sink=sink, post_processing=stamp)
+
+        with zipfile.ZipFile(tmp_path / "feedback.zip") as archive:
+            document = Document(BytesIO(archive.read("feedback_1234562.docx")))
+            assert document.paragraphs[-1].text == "stamped"
+
+
+class TestCallbackSink:
+    """Test handing documents to a callback."""
+
+    def test_receives_bytes(self, marks_workbook, feedback_template):
+        received = {}
+        generate(marks_workbook, feedback_template,
+                 output_filename="feedback_{{STUDENTID}}.docx",
+                 sink=CallbackSink(received.__setitem__))
+
+        assert sorted(received) == EXPECTED
+        assert all(data.startswith(b"PK") for data in received.values())
+
+
+class TestQueuedSink:
+    """Test writing documents from background threads."""
+
+    def test_writes_everything(self):
+        received = {}
+        with QueuedSink(CallbackSink(received.__setitem__), writers=3, queue_size=2) as sink:
+            for i in range(20):
+                sink.write(f"doc{i}", bytes([i]))
+
+        assert received == {f"doc{i}": bytes([i]) for i in range(20)}
+        assert sink.bytes_written == 20
+
+    def test_write_errors_reach_caller(self):
+        def fail(filename, data):
+            raise OSError("network drive went away")
+
+        sink = QueuedSink(CallbackSink(fail), writers=2)
+        sink.write("doc", b"data")
+        with pytest.raises(OSError, match="network drive"):
+            sink.close()
+
+    def test_generate(self, tmp_path, marks_workbook, feedback_template):
+        stats = generate(marks_workbook, feedback_template,
+                         output_filename=str(tmp_path / "out" / "feedback_{{STUDENTID}}.docx"), writers=2)
+
+        assert sorted(os.listdir(tmp_path / "out")) == EXPECTED
+        assert stats.bytes_written == sum(f.stat().st_size for f in (tmp_path / "out").iterdir())
+        assert highlighted_categories(tmp_path / "out" / "feedback_1234561.docx") == ["OUTSTANDING", "DISTINCTION"]
+
+    def test_generate_write_error(self, tmp_path, marks_workbook, feedback_template):
+        def fail(filename, data):
+            raise OSError("disk full")
+
+        with pytest.raises(OSError, match="disk full"):
+            generate(marks_workbook, feedback_template,
+                     output_filename="feedback_{{STUDENTID}}.docx", sink=CallbackSink(fail), writers=2)
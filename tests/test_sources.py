@@ -0,0 +1,109 @@
+"""Tests for CSV, JSON-lines and worksheet row sources."""
+
+import csv
+import json
+import os
+
+import pytest
+
+from wmg_feedback_gen.core import process_to_dicts
+from wmg_feedback_gen.document_generator import generate
+from wmg_feedback_gen.sources import (
+    CsvSource,
+    JsonLinesSource,
+    RowSource,
+    WorksheetSource,
+    convert_value,
+    open_source
+)
+
+from .conftest import HEADER, ROWS, highlighted_categories
+
+EXPECTED = ["NAME", "STUDENTID", "LO2", "LO3"]
+
+
+def build_csv(path, rows=ROWS, header=HEADER):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Module marks"])
+        writer.writerow(header)
+        writer.writerows(rows)
+    return path
+
+
+def build_jsonl(path, rows=ROWS, header=HEADER, records=False):
+    with open(path, "w") as f:
+        if not records:
+            f.write(json.dumps(header) + "\n")
+        for row in rows:
+            f.write(json.dumps(dict(zip(header, row)) if records else row) + "\n\n")
+    return path
+
+
+def test_convert_value():
+    assert convert_value("") is None
+    assert convert_value("85") == 85
+    assert convert_value("-3") == -3
+    assert convert_value("72.5") == 72.5
+    assert convert_value(".5") == 0.5
+    assert convert_value("0012345") == "0012345"
+    assert convert_value("n/a") == "n/a"
+    # Excel stores exponent notation as numbers, with or without a point
+    assert convert_value("1e5") == 100000.0
+    assert convert_value("2E3") == 2000.0
+    assert convert_value("-1.5e-2") == -0.015
+    assert convert_value("1e") == "1e"
+    assert convert_value("e5") == "e5"
+
+
+class TestSources:
+
+    def _rows(self, source):
+        return list(process_to_dicts(source, EXPECTED))
+
+    def test_csv_matches_worksheet(self, tmp_path, marks_workbook):
+        with WorksheetSource(marks_workbook) as sheet:
+            expected = self._rows(sheet)
+        assert self._rows(CsvSource(build_csv(tmp_path / "marks.csv"))) == expected
+        assert len(expected) == 3
+
+    def test_jsonl_matches_worksheet(self, tmp_path, marks_workbook):
+        with WorksheetSource(marks_workbook) as sheet:
+            expected = self._rows(sheet)
+        assert self._rows(JsonLinesSource(build_jsonl(tmp_path / "rows.jsonl"))) == expected
+        assert self._rows(JsonLinesSource(build_jsonl(tmp_path / "records.jsonl", records=True))) == expected
+
+    def test_jsonl_missing_keys(self, tmp_path):
+        path = tmp_path / "records.jsonl"
+        path.write_text('{"STUDENTID": 1234561, "LO2": 85}\n{"STUDENTID": 1234562, "extra": 1}\n')
+        assert list(JsonLinesSource(path).iter_rows()) == \
+            [("STUDENTID", "LO2"), (1234561, 85), (1234562, None)]
+
+    def test_open_source(self, tmp_path, marks_workbook):
+        assert isinstance(open_source(tmp_path / "a.csv"), CsvSource)
+        assert isinstance(open_source(tmp_path / "a.NDJSON"), JsonLinesSource)
+        with open_source(marks_workbook) as source:
+            assert isinstance(source, WorksheetSource)
+        with pytest.raises(KeyError):
+            open_source(marks_workbook, worksheet="missing")
+
+
+@pytest.mark.parametrize("build", [build_csv, build_jsonl])
+def test_generate(tmp_path, feedback_template, build):
+    data = build(tmp_path / ("marks.csv" if build is build_csv else "marks.jsonl"))
+    stats = generate(data, feedback_template,
+                     output_filename=str(tmp_path / "out" / "feedback_{{STUDENTID}}.docx"))
+
+    assert stats.documents_written == 3
+    assert stats.rows_rejected == stats.rows_read - 3
+    assert sorted(os.listdir(tmp_path / "out")) == \
+        ["feedback_1234561.docx", "feedback_1234562.docx", "feedback_1234563.docx"]
+    assert highlighted_categories(tmp_path / "out" / "feedback_1234561.docx") == ["OUTSTANDING", "DISTINCTION"]
+
+
+def test_source_needs_iter_rows():
+    class NoRows(RowSource):
+        pass
+
+    with pytest.raises(TypeError):
+        NoRows()
@@ -0,0 +1,54 @@
+"""Tests for run statistics."""
+
+import time
+
+from wmg_feedback_gen.core import find_header
+from wmg_feedback_gen.stats import RunStats, timed
+
+
+class TestRunStats:
+    """Test the RunStats class."""
+
+    def test_time(self):
+        stats = RunStats()
+        with stats.time("render"):
+            pass
+        with timed(stats, "render"):
+            pass
+        with timed(None, "render"):
+            pass
+        assert list(stats.timings) == ["render"]
+
+    def test_merge(self):
+        stats = RunStats(documents_written=1, timings={"render": 1.0})
+        worker = RunStats(documents_written=2, bytes_written=10, timings={"render": 0.5, "save": 0.25})
+        worker.reject({"STUDENTID": "x"}, "Invalid STUDENTID: 'x'")
+        stats.merge(worker)
+
+        assert stats.documents_written == 3
+        assert stats.bytes_written == 10
+        assert stats.rows_rejected == 1
+        assert stats.timings == {"render": 1.5, "save": 0.25}
+
+    def test_summary(self):
+        summary = RunStats(rows_read=5, timings={"save": 0.5, "load": 1.0}).summary()
+        assert "Rows read:         5" in summary
+        assert summary.index("load") < summary.index("save")
+
+
+def test_stages_not_counted_twice(monkeypatch):
+    # a clock that only moves on while a row is being read
+    clock = [0.0]
+    monkeypatch.setattr(time, "perf_counter", lambda: clock[0])
+
+    def slow_rows():
+        for row in [("Title",), ("STUDENTID", "MARK"), ("1234567", 50)]:
+            clock[0] += 1.0
+            yield row
+
+    stats = RunStats()
+    columns, rows = find_header(slow_rows(), ["STUDENTID", "MARK"], stats)
+    list(rows)
+    # reading the rows is "load", only searching them is "columns"
+    assert stats.timings["load"] == 3.0
+    assert stats.timings["columns"] == 0.0
@@ -0,0 +1,141 @@
+"""Tests for regenerating feedback as the workbook changes."""
+
+import os
+import threading
+
+from wmg_feedback_gen.watch import Watcher
+
+from .conftest import ROWS, build_template, build_workbook, highlighted_categories
+
+
+def _watcher(tmp_path, workbook, template, events=None):
+    progress = None if events is None else lambda event, stats, detail: events.append((event, detail))
+    return Watcher(workbook, template, output_filename=str(tmp_path / "out" / "feedback_{{STUDENTID}}.docx"),
+                   progress=progress)
+
+
+def _touch_later(path):
+    # make sure the modification time moves on, however coarse the filesystem's clock
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+
+def test_only_changed_rows_rendered(tmp_path, marks_workbook, feedback_template):
+    events = []
+    watcher = _watcher(tmp_path, marks_workbook, feedback_template, events)
+    stats = watcher.poll()
+    assert stats.documents_written == 3
+    assert watcher.poll() is None # nothing saved since
+
+    rows = [list(row) for row in ROWS]
+    rows[1][3] = 85 # Alan's LO2 mark
+    del rows[2] # Grace removed
+    rows.append(["Ada Byron", 1234564, "New student.", 70, 70])
+    build_workbook(marks_workbook, rows=rows)
+    _touch_later(marks_workbook)
+    events.clear()
+
+    stats = watcher.poll()
+    assert stats.documents_written == 2 and stats.skipped == 1 and stats.removed == 1
+    assert sorted(os.path.basename(detail) for event, detail in events if event == "document") == \
+        ["feedback_1234562.docx", "feedback_1234564.docx"]
+    assert sorted(os.listdir(tmp_path / "out")) == \
+        ["feedback_1234561.docx", "feedback_1234562.docx", "feedback_1234564.docx"]
+    assert highlighted_categories(tmp_path / "out" / "feedback_1234562.docx") == ["OUTSTANDING", "PASS"]
+
+
+def test_template_change_renders_all(tmp_path, marks_workbook, feedback_template):
+    watcher = _watcher(tmp_path, marks_workbook, feedback_template)
+    watcher.poll()
+
+    build_template(feedback_template, learning_outcomes=("LO3",))
+    _touch_later(feedback_template)
+    stats = watcher.poll()
+    assert stats.documents_written == 3
+    assert highlighted_categories(tmp_path / "out" / "feedback_1234561.docx") == ["DISTINCTION"]
+
+
+def test_moved_columns(tmp_path, marks_workbook, feedback_template):
+    watcher = _watcher(tmp_path, marks_workbook, feedback_template)
+    watcher.update()
+
+    # a column inserted before the others, the header is found again
+    header = ["NOTES", "NAME", "STUDENTID", "FEEDBACK", "LO2", "LO3"]
+    build_workbook(marks_workbook, rows=[[""] + list(row) for row in ROWS], header=header)
+    stats = watcher.update()
+    assert stats.documents_written == 0 and stats.skipped == 3
+
+
+def test_unreadable_workbook_retried(tmp_path, marks_workbook, feedback_template):
+    watcher = _watcher(tmp_path, marks_workbook, feedback_template)
+    watcher.poll()
+
+    content = marks_workbook.read_bytes()
+    marks_workbook.write_bytes(content[:100]) # as if caught mid-save
+    _touch_later(marks_workbook)
+    assert watcher.poll() is None
+
+    marks_workbook.write_bytes(content)
+    _touch_later(marks_workbook)
+    _touch_later(marks_workbook)
+    stats = watcher.poll()
+    assert stats is not None and stats.skipped == 3
+
+
+def test_run_until_cancelled(tmp_path, marks_workbook, feedback_template):
+    cancel = threading.Event()
+    events = []
+    watcher = _watcher(tmp_path, marks_workbook, feedback_template, events)
+
+    def progress(event, stats, detail):
+        if event == "updated":
+            cancel.set()
+
+    watcher.progress = progress
+    watcher.run(interval=0.01, cancel=cancel)
+    assert len(os.listdir(tmp_path / "out")) == 3
+
+
+def test_failing_student_not_retried(tmp_path, marks_workbook, feedback_template):
+    attempts = []
+
+    def fail_for_alan(row_data, document):
+        attempts.append(row_data["STUDENTID"])
+        if row_data["STUDENTID"] == 1234562:
+            raise ValueError("broken row")
+    fail_for_alan.in_memory = True
+
+    watcher = _watcher(tmp_path, marks_workbook, feedback_template)
+    watcher.post_processing = fail_for_alan
+    stats = watcher.update()
+    assert stats.documents_written == 2
+    assert sorted(os.listdir(tmp_path / "out")) == ["feedback_1234561.docx", "feedback_1234563.docx"]
+
+    # the failure is remembered until the row changes
+    attempts.clear()
+    assert watcher.update().skipped == 3 and attempts == []
+
+    rows = [list(row) for row in ROWS]
+    rows[1][3] = 85
+    build_workbook(marks_workbook, rows=rows)
+    watcher.update()
+    assert attempts == [1234562]
+
+
+def test_removed_after_failed_update(tmp_path, marks_workbook, feedback_template):
+    watcher = _watcher(tmp_path, marks_workbook, feedback_template)
+    watcher.poll()
+
+    # the template is saved while the workbook can't be read, then Grace is removed
+    content = marks_workbook.read_bytes()
+    marks_workbook.write_bytes(content[:100])
+    _touch_later(marks_workbook)
+    _touch_later(feedback_template)
+    assert watcher.poll() is None
+
+    build_workbook(marks_workbook, rows=ROWS[:2])
+    _touch_later(marks_workbook)
+    _touch_later(marks_workbook)
+    stats = watcher.poll()
+    assert stats.documents_written == 2 and stats.removed == 1
+    assert sorted(os.listdir(tmp_path / "out")) == ["feedback_1234561.docx", "feedback_1234562.docx"]